@@ -0,0 +1,67 @@
+"""
+Measures persist time, load time and file size of each state serializer as the
+number of entities (cases plus jobs) grows. "pretty_json" is the previous format.
+"open" is the time for JsonStateManager to load the file: the full decode for
+every format except "indexed", which decodes sections on first access.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_state_serializers.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from bench_state_transactions import build_state
+from mqi_communicator.infrastructure.state.serializers import get_serializer, load_state, open_state, orjson
+
+SERIALIZERS = ["pretty_json", "json", "orjson", "pickle5", "marshal", "indexed"]
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(name: str, state: dict, path: Path, repeat: int) -> tuple[float, float, float, int]:
+    serializer = get_serializer(name)
+
+    def persist():
+        with path.open("wb") as f:
+            serializer.dump(state, f)
+
+    def load():
+        with path.open("rb") as f:
+            load_state(f.read())
+
+    persist_time = best_of(persist, repeat)
+    load_time = best_of(load, repeat)
+    open_time = best_of(lambda: open_state(path), repeat)
+    return persist_time, load_time, open_time, path.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = [name for name in SERIALIZERS if name != "orjson" or orjson is not None]
+    print(f"{'entities':>9} | {'serializer':>11} | {'persist':>10} | {'load':>10} | {'open':>10} | {'size':>10}")
+    for size in args.sizes:
+        state = build_state(size // 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in names:
+                persist_time, load_time, open_time, file_size = bench(name, state, Path(tmp) / name, args.repeat)
+                print(
+                    f"{size:>9} | {name:>11} | {persist_time * 1e3:>7.1f} ms | "
+                    f"{load_time * 1e3:>7.1f} ms | {open_time * 1e3:>7.1f} ms | {file_size / 2**20:>7.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
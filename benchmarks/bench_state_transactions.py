@@ -0,0 +1,111 @@
+"""
+Measures the cost of a single state transaction as the number of cases grows.
+
+Persistence is stubbed out so the numbers show the in-memory transaction cost only
+(copying, change tracking and commit). The "deepcopy" column reproduces the previous
+implementation, which copied the entire state on every transaction.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_state_transactions.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import copy
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+
+
+class InMemoryStateManager(JsonStateManager):
+    """JsonStateManager with persistence disabled."""
+
+    def _write(self, state, changes, fsync):
+        pass
+
+
+class DeepCopyStateManager(InMemoryStateManager):
+    """The previous transaction strategy: deep copy the state, always commit."""
+
+    @contextmanager
+    def transaction(self, read_only: bool = False):
+        with self._lock.write():
+            temp_state = copy.deepcopy(self._state)
+
+            class TransactionContext:
+                def get_state(self):
+                    return temp_state
+
+            yield TransactionContext()
+            self._state = temp_state
+
+
+def build_state(case_count: int) -> dict:
+    cases = {
+        f"case-{i:06d}": {
+            "case_id": f"case-{i:06d}",
+            "status": "completed",
+            "beam_count": 4,
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00",
+            "metadata": {"room": "G1", "files": 120},
+        }
+        for i in range(case_count)
+    }
+    jobs = {
+        f"job-{i:06d}": {
+            "job_id": f"job-{i:06d}",
+            "case_id": f"case-{i:06d}",
+            "status": "completed",
+            "gpu_allocation": [0],
+            "priority": 1,
+            "created_at": "2024-01-01T00:00:00",
+        }
+        for i in range(case_count)
+    }
+    return {"cases": cases, "jobs": jobs, "resources": {"allocated_gpus": []}}
+
+
+def time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench(manager_class, state: dict, repeat: int) -> tuple[float, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = manager_class(Path(tmp) / "state.json")
+        manager._state = state
+
+        def read(i):
+            with manager.transaction(read_only=True) as tx:
+                tx.get_state()["cases"].get("case-000000")
+
+        def write(i):
+            with manager.transaction() as tx:
+                tx.get_state()["cases"][f"new-{i}"] = {"case_id": f"new-{i}", "status": "new"}
+
+        return time_per_call(read, repeat), time_per_call(write, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'cases':>8} | {'cow read':>12} | {'cow write':>12} | {'deepcopy read':>14} | {'deepcopy write':>14}")
+    for size in args.sizes:
+        state = build_state(size)
+        cow_read, cow_write = bench(InMemoryStateManager, state, args.repeat)
+        old_read, old_write = bench(DeepCopyStateManager, state, max(1, args.repeat // 10))
+        print(
+            f"{size:>8} | {cow_read * 1e6:>9.1f} us | {cow_write * 1e6:>9.1f} us | "
+            f"{old_read * 1e3:>11.1f} ms | {old_write * 1e3:>11.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,36 @@
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
 from dependency_injector import containers, providers
 
 from mqi_communicator.infrastructure.config.loader import ConfigLoader
+from mqi_communicator.infrastructure.state.interfaces import Durability
 from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+from mqi_communicator.infrastructure.state.journaled_state_manager import JournaledStateManager
+from mqi_communicator.infrastructure.state.sharded_state_manager import ShardedJsonStateManager
 from mqi_communicator.infrastructure.connection.ssh_connection_pool import SSHConnectionPool
 from mqi_communicator.infrastructure.executors.local_executor import LocalExecutor
 from mqi_communicator.infrastructure.executors.remote_executor import RemoteExecutor
-from mqi_communicator.domain.repositories.json_repositories import CaseRepository, JobRepository, IResourceRepository # IResourceRepository needs an impl
-from mqi_communicator.services.case_service import CaseService, FileSystem
+from mqi_communicator.infrastructure.watch.inotify_watcher import InotifyWatcher, inotify_available
+from mqi_communicator.domain.repositories.json_repositories import CaseRepository, JobRepository, TaskRepository, IResourceRepository # IResourceRepository needs an impl
+from mqi_communicator.domain.repositories.archive import CaseArchive
+from mqi_communicator.domain.repositories.sqlite_repositories import (
+    SqliteCaseRepository, SqliteJobRepository, SqliteResourceRepository, SqliteTaskRepository,
+    open_sqlite_state
+)
+from mqi_communicator.services.case_manifest import ManifestBuilder
+from mqi_communicator.services.case_metadata import CaseMetadataPipeline
+from mqi_communicator.services.case_readiness import CaseReadinessTracker
+from mqi_communicator.services.case_service import CaseService, FileSystem, ScanRoot
 from mqi_communicator.services.resource_service import ResourceService
 from mqi_communicator.services.job_service import JobService
 from mqi_communicator.services.transfer_service import TransferService
+from mqi_communicator.services.retention_service import RetentionService
 from mqi_communicator.domain.system_monitor import SystemMonitor
+from mqi_communicator.domain.models import TaskType
 from mqi_communicator.domain.task_scheduler import TaskScheduler
+from mqi_communicator.domain.task_worker_pool import TaskWorkerPool
 from mqi_communicator.domain.workflow_orchestrator import WorkflowOrchestrator
 from mqi_communicator.controllers.lifecycle_manager import LifecycleManager
 from mqi_communicator.controllers.application import Application
@@ -34,14 +53,147 @@ class ResourceRepository(IResourceRepository):
             state = tx.get_state()
             state["resources"]["allocated_gpus"] = gpu_ids
 
+def _archive_dir(state_file: str, archive_dir: Optional[str]) -> Path:
+    return Path(archive_dir) if archive_dir else Path(state_file).parent / "archive"
+
+def _scan_roots(scan_roots: Optional[List[dict]], local_logdata: str) -> List[ScanRoot]:
+    if not scan_roots:
+        return [ScanRoot(local_logdata)]
+    return [
+        ScanRoot(
+            path=root["path"],
+            name=root.get("name"),
+            weight=float(root.get("weight", 1.0)),
+            scan_interval=root.get("scan_interval_seconds"),
+            priority=int(root.get("priority", 1)),
+        )
+        for root in scan_roots
+    ]
+
+def _case_watcher(case_discovery: str, scan_roots: List[ScanRoot]) -> Optional[InotifyWatcher]:
+    if case_discovery != "inotify":
+        return None
+    if not inotify_available():
+        # Log that inotify is not available on this platform, so new cases are found by polling.
+        return None
+    return InotifyWatcher([root.path for root in scan_roots])
+
+def _case_readiness(
+    file_system: FileSystem, scan_path: str, quiet_period: int, marker_file: Optional[str]
+) -> Optional[CaseReadinessTracker]:
+    if not quiet_period and not marker_file:
+        return None
+    return CaseReadinessTracker(
+        file_system, scan_path, quiet_period=int(quiet_period) or None, marker_file=marker_file
+    )
+
+def _task_limits(transfer: int, interpret: int, beam_calc: int, convert: int) -> Dict[TaskType, int]:
+    return {
+        TaskType.UPLOAD: int(transfer),
+        TaskType.DOWNLOAD: int(transfer),
+        TaskType.INTERPRET: int(interpret),
+        TaskType.BEAM_CALC: int(beam_calc),
+        TaskType.CONVERT: int(convert),
+    }
+
+def _scan_interval(
+    watcher: Optional[InotifyWatcher], scan_roots: List[ScanRoot], scan_interval: int, reconcile_interval: int
+) -> int:
+    # With a watcher, scanning only reconciles missed events.
+    if watcher is not None:
+        return int(reconcile_interval)
+    # Scan often enough for the root with the shortest interval.
+    return int(min([scan_interval] + [root.scan_interval for root in scan_roots if root.scan_interval]))
+
 class Container(containers.DeclarativeContainer):
     """
     The main dependency injection container for the application.
     """
-    config = providers.Configuration()
+    config = providers.Configuration(default={
+        "state": {
+            "backend": "json",
+            "journal_compact_threshold_bytes": 4 * 1024 * 1024,
+            "shard_entity_sections": [],
+            "shard_multi_process": False,
+            "sqlite_file": None,
+            "write_behind": False,
+            "flush_interval_ms": 50,
+            "flush_max_commits": 100,
+            "durability": "none",
+            "serializer": "json",
+        },
+        "processing": {
+            "case_discovery": "poll",
+            "reconcile_interval_seconds": 600,
+            "case_quiet_period_seconds": 60,
+            "case_ready_marker": None,
+            "manifest_workers": 4,
+            "metadata_workers": 2,
+            "scan_workers": 4,
+            "scan_timeout_seconds": 5.0,
+            "transfer_workers": 4,
+            "interpret_workers": 2,
+            "convert_workers": 2,
+            "priority_aging_seconds": 300,
+        },
+        "paths": {
+            "scan_roots": [],
+        },
+        "resources": {
+            "max_concurrent_jobs": 10,
+            "gpu_busy_load_percent": 30.0,
+            "gpu_telemetry_ttl_seconds": 5.0,
+            "beam_gpu_share": 1.0,
+            "beam_memory_mb": 0,
+        },
+        "retention": {
+            "enabled": False,
+            "max_age_days": 30,
+            "maintenance_interval_seconds": 3600,
+            "batch_size": 500,
+            "archive_dir": None,
+            "max_segment_bytes": 64 * 1024 * 1024,
+        },
+    })
 
     # Infrastructure Layer
-    state_manager = providers.Singleton(JsonStateManager, state_file=config.paths.state_file)
+    state_manager = providers.Selector(
+        config.state.backend,
+        json=providers.Singleton(
+            JsonStateManager,
+            state_file=config.paths.state_file.as_(Path),
+            write_behind=config.state.write_behind.as_(bool),
+            flush_interval=config.state.flush_interval_ms.as_(lambda ms: int(ms) / 1000),
+            flush_max_commits=config.state.flush_max_commits.as_(int),
+            durability=config.state.durability.as_(Durability),
+            serializer=config.state.serializer,
+        ),
+        journal=providers.Singleton(
+            JournaledStateManager,
+            state_file=config.paths.state_file.as_(Path),
+            compact_threshold_bytes=config.state.journal_compact_threshold_bytes.as_(int),
+            write_behind=config.state.write_behind.as_(bool),
+            flush_interval=config.state.flush_interval_ms.as_(lambda ms: int(ms) / 1000),
+            flush_max_commits=config.state.flush_max_commits.as_(int),
+            durability=config.state.durability.as_(Durability),
+            serializer=config.state.serializer,
+        ),
+        sharded=providers.Singleton(
+            ShardedJsonStateManager,
+            state_file=config.paths.state_file.as_(Path),
+            entity_sections=config.state.shard_entity_sections,
+            multi_process=config.state.shard_multi_process.as_(bool),
+            write_behind=config.state.write_behind.as_(bool),
+            flush_interval=config.state.flush_interval_ms.as_(lambda ms: int(ms) / 1000),
+            flush_max_commits=config.state.flush_max_commits.as_(int),
+            durability=config.state.durability.as_(Durability),
+        ),
+        sqlite=providers.Singleton(
+            open_sqlite_state,
+            state_file=config.paths.state_file.as_(Path),
+            db_file=config.state.sqlite_file.as_(lambda path: Path(path) if path else None),
+        ),
+    )
 
     ssh_pool = providers.Singleton(
         SSHConnectionPool,
@@ -52,30 +204,116 @@ class Container(containers.DeclarativeContainer):
     local_executor = providers.Singleton(LocalExecutor)
     remote_executor = providers.Singleton(RemoteExecutor, connection_pool=ssh_pool)
     file_system = providers.Singleton(FileSystem)
+    scan_roots = providers.Singleton(
+        _scan_roots,
+        scan_roots=config.paths.scan_roots,
+        local_logdata=config.paths.local_logdata,
+    )
+    case_watcher = providers.Singleton(
+        _case_watcher,
+        case_discovery=config.processing.case_discovery,
+        scan_roots=scan_roots,
+    )
+    case_readiness = providers.Singleton(
+        _case_readiness,
+        file_system=file_system,
+        scan_path=config.paths.local_logdata,
+        quiet_period=config.processing.case_quiet_period_seconds,
+        marker_file=config.processing.case_ready_marker,
+    )
+    manifest_builder = providers.Singleton(
+        ManifestBuilder,
+        max_workers=config.processing.manifest_workers.as_int(),
+    )
+    metadata_pipeline = providers.Singleton(
+        CaseMetadataPipeline,
+        max_workers=config.processing.metadata_workers.as_int(),
+    )
 
     # Repository Layer
-    case_repository = providers.Singleton(CaseRepository, state_manager=state_manager)
-    job_repository = providers.Singleton(JobRepository, state_manager=state_manager)
-    resource_repository = providers.Singleton(ResourceRepository, state_manager=state_manager)
+    # The json, journal and sharded backends share the same state-manager-based repositories.
+    json_case_repository = providers.Singleton(CaseRepository, state_manager=state_manager)
+    json_job_repository = providers.Singleton(JobRepository, state_manager=state_manager)
+    json_resource_repository = providers.Singleton(ResourceRepository, state_manager=state_manager)
+    json_task_repository = providers.Singleton(TaskRepository, state_manager=state_manager)
+
+    case_repository = providers.Selector(
+        config.state.backend,
+        json=json_case_repository,
+        journal=json_case_repository,
+        sharded=json_case_repository,
+        sqlite=providers.Singleton(SqliteCaseRepository, state_manager=state_manager),
+    )
+    job_repository = providers.Selector(
+        config.state.backend,
+        json=json_job_repository,
+        journal=json_job_repository,
+        sharded=json_job_repository,
+        sqlite=providers.Singleton(SqliteJobRepository, state_manager=state_manager),
+    )
+    resource_repository = providers.Selector(
+        config.state.backend,
+        json=json_resource_repository,
+        journal=json_resource_repository,
+        sharded=json_resource_repository,
+        sqlite=providers.Singleton(SqliteResourceRepository, state_manager=state_manager),
+    )
+    task_repository = providers.Selector(
+        config.state.backend,
+        json=json_task_repository,
+        journal=json_task_repository,
+        sharded=json_task_repository,
+        sqlite=providers.Singleton(SqliteTaskRepository, state_manager=state_manager),
+    )
+
+    case_archive = providers.Singleton(
+        CaseArchive,
+        archive_dir=providers.Callable(_archive_dir, config.paths.state_file, config.retention.archive_dir),
+        max_segment_bytes=config.retention.max_segment_bytes.as_int(),
+    )
 
     # Service Layer
+    # Defined ahead of the domain layer: GPU placement uses its telemetry.
+    system_monitor = providers.Singleton(SystemMonitor)
     resource_service = providers.Singleton(
         ResourceService,
         resource_repository=resource_repository,
         total_gpu_count=config.resources.total_gpu_count.as_int(),
-        min_disk_space_gb=config.resources.min_disk_space_gb.as_int()
+        min_disk_space_gb=config.resources.min_disk_space_gb.as_int(),
+        system_monitor=system_monitor,
+        busy_load_percent=config.resources.gpu_busy_load_percent.as_(float),
+        telemetry_ttl=config.resources.gpu_telemetry_ttl_seconds.as_(float),
     )
     case_service = providers.Singleton(
         CaseService,
         case_repository=case_repository,
         file_system=file_system,
-        scan_path=config.paths.local_logdata
+        scan_roots=scan_roots,
+        watcher=case_watcher,
+        readiness=case_readiness,
+        manifest_builder=manifest_builder,
+        metadata_pipeline=metadata_pipeline,
+        max_scan_workers=config.processing.scan_workers.as_int(),
+        scan_timeout=config.processing.scan_timeout_seconds.as_(float),
+        archive=case_archive,
     )
     job_service = providers.Singleton(
         JobService,
         job_repository=job_repository,
         resource_service=resource_service
     )
+    retention_service = providers.Selector(
+        config.retention.enabled.as_(lambda enabled: "enabled" if enabled else "disabled"),
+        enabled=providers.Singleton(
+            RetentionService,
+            case_repository=case_repository,
+            job_repository=job_repository,
+            archive=case_archive,
+            max_age=config.retention.max_age_days.as_(lambda days: timedelta(days=int(days))),
+            batch_size=config.retention.batch_size.as_int(),
+        ),
+        disabled=providers.Object(None),
+    )
     transfer_service = providers.Singleton(
         TransferService,
         remote_executor=remote_executor,
@@ -84,11 +322,22 @@ class Container(containers.DeclarativeContainer):
     )
 
     # Domain Layer
-    system_monitor = providers.Singleton(SystemMonitor)
     task_scheduler = providers.Singleton(
         TaskScheduler,
         case_service=case_service,
-        job_service=job_service
+        job_service=job_service,
+        aging_interval=config.processing.priority_aging_seconds.as_(float),
+        task_repository=task_repository,
+    )
+    task_worker_pool = providers.Singleton(
+        TaskWorkerPool,
+        limits=providers.Callable(
+            _task_limits,
+            transfer=config.processing.transfer_workers,
+            interpret=config.processing.interpret_workers,
+            beam_calc=config.resources.max_concurrent_jobs,
+            convert=config.processing.convert_workers,
+        ),
     )
     workflow_orchestrator = providers.Singleton(
         WorkflowOrchestrator,
@@ -97,7 +346,20 @@ class Container(containers.DeclarativeContainer):
         task_scheduler=task_scheduler,
         transfer_service=transfer_service,
         system_monitor=system_monitor,
-        scan_interval=config.processing.scan_interval_seconds.as_int()
+        scan_interval=providers.Callable(
+            _scan_interval,
+            case_watcher,
+            scan_roots,
+            config.processing.scan_interval_seconds,
+            config.processing.reconcile_interval_seconds,
+        ),
+        state_manager=state_manager,
+        retention_service=retention_service,
+        maintenance_interval=config.retention.maintenance_interval_seconds.as_int(),
+        worker_pool=task_worker_pool,
+        resource_service=resource_service,
+        beam_gpu_share=config.resources.beam_gpu_share.as_(float),
+        beam_memory_mb=config.resources.beam_memory_mb.as_(float),
     )
 
     # Application Layer
@@ -1,5 +1,5 @@
-from typing import Protocol, List, Optional
-from mqi_communicator.domain.models import Task
+from typing import Callable, Dict, Iterable, Protocol, List, Optional
+from mqi_communicator.domain.models import Task, TaskType
 from dataclasses import dataclass
 
 @dataclass
@@ -7,6 +7,7 @@ class GPUStatus:
     id: int
     load: float
     memory_usage: float
+    memory_total: Optional[float] = None
 
 @dataclass
 class DiskUsage:
@@ -30,14 +31,44 @@ class ITaskScheduler(Protocol):
         """Generates and schedules a list of tasks required to process a case."""
         ...
 
-    def get_next_task(self) -> Optional[Task]:
-        """Retrieves the next task to be executed from the queue."""
+    def schedule_cases(self, case_ids: List[str]) -> Dict[str, List[Task]]:
+        """Schedules several cases, creating their jobs in a single transaction."""
+        ...
+
+    def get_next_task(
+        self, task_types: Optional[Iterable[TaskType]] = None, job_id: Optional[str] = None
+    ) -> Optional[Task]:
+        """Retrieves the next task whose dependencies have all completed, optionally of the given types or job."""
+        ...
+
+    def update_task(self, task: Task) -> None:
+        """Saves changes to the parameters of a running task."""
+        ...
+
+    def requeue_task(self, task_id: str) -> None:
+        """Puts a task handed out by get_next_task back among the ready tasks."""
         ...
 
     def complete_task(self, task_id: str) -> None:
         """Marks a task as complete."""
         ...
 
+    def fail_task(self, task_id: str) -> List[Task]:
+        """Marks a task as failed, along with the tasks that depend on it."""
+        ...
+
+    def bump_case_priority(self, case_id: str, priority: int) -> bool:
+        """Changes the priority of a queued case."""
+        ...
+
+    def recover(
+        self,
+        reconcile: Optional[Callable[[Task], bool]] = None,
+        release: Optional[Callable[[Task], None]] = None,
+    ) -> List[Task]:
+        """Restores the tasks left unfinished by a previous run."""
+        ...
+
 class IWorkflowOrchestrator(Protocol):
     """
     Interface for the main workflow orchestrator.
@@ -60,3 +60,11 @@ class Task:
     type: TaskType
     status: TaskStatus
     parameters: Dict[str, Any] = field(default_factory=dict)
+    # IDs of the tasks that must complete before this one can run.
+    dependencies: List[str] = field(default_factory=list)
+
+@dataclass
+class ArchivedCase:
+    case: Case
+    jobs: List[Job]
+    archived_at: datetime
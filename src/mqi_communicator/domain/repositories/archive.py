@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from mqi_communicator.domain.models import ArchivedCase, Case, Job
+from mqi_communicator.domain.repositories.codec import codec_for
+from mqi_communicator.domain.repositories.interfaces import ICaseArchive
+
+_INDEX = "index.jsonl"
+
+
+def _encode(archived: ArchivedCase) -> Dict[str, Any]:
+    return {
+        "case": codec_for(Case).encode(archived.case),
+        "jobs": [codec_for(Job).encode(job) for job in archived.jobs],
+        "archived_at": archived.archived_at.isoformat(),
+    }
+
+
+def _decode(data: Dict[str, Any]) -> ArchivedCase:
+    return ArchivedCase(
+        case=codec_for(Case).decode(data["case"]),
+        jobs=[codec_for(Job).decode(job) for job in data["jobs"]],
+        archived_at=datetime.fromisoformat(data["archived_at"]),
+    )
+
+
+class CaseArchive(ICaseArchive):
+    """
+    Stores archived cases in compressed, append-only segment files.
+
+    Each case is written as its own gzip member, so a segment is a valid
+    multi-member gzip file and any single record can be read back by seeking
+    to its offset. An append-only index maps case IDs to (segment, offset,
+    length) and is loaded into memory on startup. Records are fsynced before
+    their index lines, so an index entry never points at missing data; a
+    record whose index line was lost is simply archived again later.
+    Segments are rolled once they reach `max_segment_bytes`.
+    """
+
+    def __init__(self, archive_dir: Path, max_segment_bytes: int = 64 * 1024 * 1024):
+        self._dir = archive_dir
+        self._max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[str, int, int]] = {}
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._index_file = self._dir / _INDEX
+        self._load_index()
+        segments = sorted(self._dir.glob("segment-*.gz"))
+        self._segment_number = int(segments[-1].name[len("segment-"):-len(".gz")]) if segments else 1
+
+    def _load_index(self):
+        if not self._index_file.exists():
+            return
+        valid_bytes = 0
+        with self._index_file.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._index[entry["case_id"]] = (entry["segment"], entry["offset"], entry["length"])
+                valid_bytes += len(line)
+        if valid_bytes != self._index_file.stat().st_size:
+            # Drop a torn final line so that new entries start on a clean line.
+            with self._index_file.open("r+b") as f:
+                f.truncate(valid_bytes)
+
+    def _segment_path(self) -> Path:
+        return self._dir / f"segment-{self._segment_number:06d}.gz"
+
+    def append(self, archived: List[ArchivedCase]) -> None:
+        if not archived:
+            return
+        with self._lock:
+            entries = []
+            segment = self._segment_path()
+            f = segment.open("ab")
+            try:
+                for record in archived:
+                    if f.tell() >= self._max_segment_bytes:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        self._segment_number += 1
+                        segment = self._segment_path()
+                        f = segment.open("ab")
+                    member = gzip.compress(json.dumps(_encode(record), separators=(",", ":")).encode())
+                    entries.append((record.case.case_id, segment.name, f.tell(), len(member)))
+                    f.write(member)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+
+            with self._index_file.open("a") as index:
+                for case_id, segment_name, offset, length in entries:
+                    index.write(json.dumps({
+                        "case_id": case_id, "segment": segment_name, "offset": offset, "length": length
+                    }) + "\n")
+                index.flush()
+                os.fsync(index.fileno())
+            for case_id, segment_name, offset, length in entries:
+                self._index[case_id] = (segment_name, offset, length)
+
+    def get(self, case_id: str) -> Optional[ArchivedCase]:
+        with self._lock:
+            location = self._index.get(case_id)
+        if location is None:
+            return None
+        segment_name, offset, length = location
+        with (self._dir / segment_name).open("rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return _decode(json.loads(gzip.decompress(member)))
+
+    def contains(self, case_id: str) -> bool:
+        with self._lock:
+            return case_id in self._index
+
+    def case_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._index)
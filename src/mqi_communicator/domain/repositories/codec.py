@@ -0,0 +1,146 @@
+import copy
+import threading
+import typing
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Generic, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+
+def _unwrap_optional(hint: Any) -> Any:
+    """Returns X for Optional[X], otherwise the hint itself."""
+    if typing.get_origin(hint) is typing.Union:
+        args = [a for a in typing.get_args(hint) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return hint
+
+
+def _decoder_for(hint: Any) -> Callable[[Any], Any]:
+    hint = _unwrap_optional(hint)
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        return hint
+    if hint is datetime:
+        return datetime.fromisoformat
+    # Containers are copied so a decoded model never shares them with the stored state.
+    return copy.deepcopy
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return copy.deepcopy(value)
+
+
+class ModelCodec(Generic[T]):
+    """
+    Converts a domain dataclass to and from the plain JSON-compatible dict it is
+    stored as. Enums are stored by value and datetimes as ISO 8601 strings;
+    both are restored to their declared types on decode.
+    """
+
+    def __init__(self, model_class: Type[T]):
+        self._model_class = model_class
+        hints = typing.get_type_hints(model_class)
+        self._fields: Tuple[Tuple[str, Callable[[Any], Any]], ...] = tuple(
+            (f.name, _decoder_for(hints[f.name])) for f in fields(model_class)
+        )
+
+    def encode(self, model: T) -> Dict[str, Any]:
+        return {name: _encode_value(getattr(model, name)) for name, _ in self._fields}
+
+    def decode(self, data: Dict[str, Any]) -> T:
+        kwargs = {}
+        for name, decoder in self._fields:
+            if name not in data:
+                # Let the dataclass default apply to fields missing from older records.
+                continue
+            value = data[name]
+            kwargs[name] = None if value is None else decoder(value)
+        return self._model_class(**kwargs)
+
+    def copy(self, model: T) -> T:
+        """
+        Returns a copy of `model` with its own dicts, lists and sets, so that
+        fields can be set or those containers edited without affecting it.
+        """
+        clone = copy.copy(model)
+        for name, _ in self._fields:
+            value = getattr(model, name)
+            if isinstance(value, (dict, list, set)):
+                setattr(clone, name, copy.copy(value))
+        return clone
+
+
+_codecs: Dict[type, ModelCodec] = {}
+
+
+def codec_for(model_class: Type[T]) -> ModelCodec[T]:
+    """Returns the shared codec for a domain dataclass."""
+    codec = _codecs.get(model_class)
+    if codec is None:
+        if not is_dataclass(model_class):
+            raise TypeError(f"{model_class.__name__} is not a dataclass")
+        codec = _codecs[model_class] = ModelCodec(model_class)
+    return codec
+
+
+class IdentityMap(Generic[T]):
+    """
+    A bounded, least-recently-used map from entity id to its decoded model.
+
+    Each entry remembers the stored dict it was decoded from. Committed state
+    is never modified in place, so an entry is only reused while the stored
+    dict is the very same object; anything else counts as a miss. Saves also
+    evict their entity explicitly.
+
+    Callers get copies of the cached model, so an entity edited but not saved
+    does not change what other readers see. Containers nested inside a
+    container field are still shared and must be replaced, not edited.
+    """
+
+    def __init__(self, codec: ModelCodec[T], max_size: int = 1024):
+        self._codec = codec
+        self._max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Any, T]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, entity_id: str, data: Optional[Dict[str, Any]]) -> Optional[T]:
+        """Returns the model for `data`, decoding it only if it is not cached."""
+        if data is None:
+            self.invalidate(entity_id)
+            return None
+        with self._lock:
+            entry = self._entries.get(entity_id)
+            if entry is not None and entry[0] is data:
+                self._entries.move_to_end(entity_id)
+                self.hits += 1
+                return self._codec.copy(entry[1])
+            self.misses += 1
+        model = self._codec.decode(data)
+        if self._max_size > 0:
+            with self._lock:
+                self._entries[entity_id] = (data, model)
+                self._entries.move_to_end(entity_id)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+            return self._codec.copy(model)
+        return model
+
+    def invalidate(self, entity_id: str) -> None:
+        with self._lock:
+            self._entries.pop(entity_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
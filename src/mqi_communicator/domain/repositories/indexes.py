@@ -0,0 +1,99 @@
+import bisect
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterable, Iterator, Mapping, Optional
+
+
+def _normalize(value: Any) -> Any:
+    """Maps enums and datetimes to the plain values they are stored as."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class EntityIndex:
+    """
+    In-memory secondary indexes over the raw entity dicts of one state section.
+
+    Keeps, for each indexed field, a map from value to the set of entity ids,
+    plus a list of (timestamp, id) pairs sorted by `order_by`. Lookups cost
+    O(result) instead of a scan over every entity. The index is not thread-safe;
+    the owning repository updates it under its own lock after each commit.
+    """
+
+    def __init__(self, fields: Iterable[str], order_by: str):
+        self._fields = tuple(fields)
+        self._order_by = order_by
+        self._by_field: dict[str, dict[Any, set[str]]] = {f: {} for f in self._fields}
+        self._keys: dict[str, tuple[Any, ...]] = {}
+        self._ordered: list[tuple[str, str]] = []
+
+    def rebuild(self, entities: Mapping[str, Mapping[str, Any]]) -> None:
+        """Discards the index and rebuilds it from a full section."""
+        self._by_field = {f: {} for f in self._fields}
+        self._keys = {}
+        self._ordered = []
+        for entity_id, data in entities.items():
+            self._add(entity_id, data)
+        self._ordered.sort()
+
+    def update(self, entity_id: str, data: Optional[Mapping[str, Any]]) -> None:
+        """Re-indexes one entity. Passing None removes it."""
+        self._remove(entity_id)
+        if data is not None:
+            self._add(entity_id, data, keep_sorted=True)
+
+    def _add(self, entity_id: str, data: Mapping[str, Any], keep_sorted: bool = False) -> None:
+        values = tuple(_normalize(data.get(f)) for f in self._fields)
+        order_value = _normalize(data.get(self._order_by)) or ""
+        self._keys[entity_id] = values + (order_value,)
+        for f, value in zip(self._fields, values):
+            self._by_field[f].setdefault(value, set()).add(entity_id)
+        if keep_sorted:
+            bisect.insort(self._ordered, (order_value, entity_id))
+        else:
+            self._ordered.append((order_value, entity_id))
+
+    def _remove(self, entity_id: str) -> None:
+        keys = self._keys.pop(entity_id, None)
+        if keys is None:
+            return
+        for f, value in zip(self._fields, keys):
+            ids = self._by_field[f].get(value)
+            if ids is not None:
+                ids.discard(entity_id)
+                if not ids:
+                    del self._by_field[f][value]
+        position = bisect.bisect_left(self._ordered, (keys[-1], entity_id))
+        if position < len(self._ordered) and self._ordered[position] == (keys[-1], entity_id):
+            del self._ordered[position]
+
+    def ids(self, field: str, value: Any) -> set[str]:
+        """Returns the ids of entities whose `field` equals `value`."""
+        return set(self._by_field[field].get(_normalize(value), ()))
+
+    def count(self, field: str, value: Any) -> int:
+        return len(self._by_field[field].get(_normalize(value), ()))
+
+    def ids_before(self, cutoff: Any) -> Iterator[str]:
+        """Yields ids ordered by `order_by`, oldest first, for values before `cutoff`."""
+        end = bisect.bisect_left(self._ordered, (_normalize(cutoff),))
+        for _, entity_id in self._ordered[:end]:
+            yield entity_id
+
+    def count_before(self, cutoff: Any) -> int:
+        return bisect.bisect_left(self._ordered, (_normalize(cutoff),))
+
+    def ids_matching_before(self, field: str, value: Any, cutoff: Any) -> list[str]:
+        """
+        Returns ids whose `field` equals `value` and whose `order_by` value is
+        before `cutoff`, oldest first. Walks whichever candidate set is smaller.
+        """
+        matching = self._by_field[field].get(_normalize(value), set())
+        cutoff = _normalize(cutoff)
+        if len(matching) <= self.count_before(cutoff):
+            found = [(self._keys[i][-1], i) for i in matching if self._keys[i][-1] < cutoff]
+            return [entity_id for _, entity_id in sorted(found)]
+        return [i for i in self.ids_before(cutoff) if i in matching]
@@ -1,5 +1,6 @@
+from datetime import timedelta
 from typing import Protocol, List, Optional
-from mqi_communicator.domain.models import Case, Job
+from mqi_communicator.domain.models import ArchivedCase, Case, CaseStatus, Job, JobStatus, Task
 
 class ICaseRepository(Protocol):
     """
@@ -9,18 +10,38 @@ class ICaseRepository(Protocol):
         """Saves a case object (creates or updates)."""
         ...
 
+    def save_many(self, cases: List[Case]) -> None:
+        """Saves several cases in a single transaction."""
+        ...
+
     def get(self, case_id: str) -> Optional[Case]:
         """Retrieves a case by its ID."""
         ...
 
+    def delete_many(self, case_ids: List[str]) -> None:
+        """Removes several cases in a single transaction."""
+        ...
+
     def get_all(self) -> List[Case]:
         """Retrieves all cases."""
         ...
 
+    def get_many(self, case_ids: List[str]) -> List[Case]:
+        """Retrieves the cases with the given IDs, skipping unknown ones."""
+        ...
+
     def get_all_case_ids(self) -> List[str]:
         """Retrieves all case IDs."""
         ...
 
+    def find_by_status(self, status: CaseStatus) -> List[Case]:
+        """Finds all cases with the given status."""
+        ...
+
+    def count_by_status(self, status: CaseStatus) -> int:
+        """Counts the cases with the given status."""
+        ...
+
 
 class IJobRepository(Protocol):
     """
@@ -30,10 +51,18 @@ class IJobRepository(Protocol):
         """Saves a job object (creates or updates)."""
         ...
 
+    def save_many(self, jobs: List[Job]) -> None:
+        """Saves several jobs in a single transaction."""
+        ...
+
     def get(self, job_id: str) -> Optional[Job]:
         """Retrieves a job by its ID."""
         ...
 
+    def delete_many(self, job_ids: List[str]) -> None:
+        """Removes several jobs in a single transaction."""
+        ...
+
     def get_all(self) -> List[Job]:
         """Retrieves all jobs."""
         ...
@@ -42,6 +71,39 @@ class IJobRepository(Protocol):
         """Finds all jobs associated with a given case ID."""
         ...
 
+    def find_by_status(self, status: JobStatus) -> List[Job]:
+        """Finds all jobs with the given status."""
+        ...
+
+    def find_running_older_than(self, max_age: timedelta) -> List[Job]:
+        """Finds running jobs created more than `max_age` ago, oldest first."""
+        ...
+
+    def count_by_status(self, status: JobStatus) -> int:
+        """Counts the jobs with the given status."""
+        ...
+
+
+class ITaskRepository(Protocol):
+    """
+    Interface for a repository that manages the unfinished Tasks of the scheduler.
+    """
+    def save_many(self, tasks: List[Task]) -> None:
+        """Saves several tasks in a single transaction."""
+        ...
+
+    def get(self, task_id: str) -> Optional[Task]:
+        """Retrieves a task by its ID."""
+        ...
+
+    def get_all(self) -> List[Task]:
+        """Retrieves all tasks."""
+        ...
+
+    def delete_many(self, task_ids: List[str]) -> None:
+        """Removes several tasks in a single transaction."""
+        ...
+
 
 class IResourceRepository(Protocol):
     """
@@ -54,3 +116,25 @@ class IResourceRepository(Protocol):
     def set_allocated_gpus(self, gpu_ids: List[int]) -> None:
         """Sets the list of allocated GPU IDs."""
         ...
+
+
+class ICaseArchive(Protocol):
+    """
+    Interface for append-only storage of cases (with their jobs) that have
+    been evicted from the live state.
+    """
+    def append(self, archived: List[ArchivedCase]) -> None:
+        """Durably appends archived cases."""
+        ...
+
+    def get(self, case_id: str) -> Optional[ArchivedCase]:
+        """Retrieves the most recently archived record for a case."""
+        ...
+
+    def contains(self, case_id: str) -> bool:
+        """Returns True if the case has been archived."""
+        ...
+
+    def case_ids(self) -> List[str]:
+        """Returns the IDs of all archived cases."""
+        ...
@@ -1,85 +1,297 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
 from typing import List, Optional
 
-from mqi_communicator.domain.models import Case, Job
-from mqi_communicator.domain.repositories.interfaces import ICaseRepository, IJobRepository
+from mqi_communicator.domain.models import Case, CaseStatus, Job, JobStatus, Task
+from mqi_communicator.domain.repositories.interfaces import ICaseRepository, IJobRepository, ITaskRepository
+from mqi_communicator.domain.repositories.codec import IdentityMap, codec_for
+from mqi_communicator.domain.repositories.indexes import EntityIndex
 from mqi_communicator.infrastructure.state.interfaces import IStateManager
 
-# Pydantic is often used for this to handle the dict -> model conversion robustly.
-# Since I can't add dependencies and test, I'll do a manual conversion.
-# This assumes the data in the state manager is already dict-serialized.
-def _dict_to_model(model_class, data):
-    if data is None:
-        return None
-    return model_class(**data)
-
 class CaseRepository(ICaseRepository):
     """
     A repository for Cases that persists data to a JSON file via a StateManager.
+
+    Keeps in-memory secondary indexes (status, created_at ordering) that are
+    built by the first query and updated after each successful commit, so
+    constructing the repository does not read every case.
+    Decoded cases are kept in a bounded identity map, so repeated reads of an
+    unchanged case return the same object without decoding it again.
     """
-    def __init__(self, state_manager: IStateManager):
+    def __init__(self, state_manager: IStateManager, cache_size: int = 1024):
         self._sm = state_manager
+        self._cache = IdentityMap(codec_for(Case), max_size=cache_size)
+        # Serializes commits with their index updates so both stay in step.
+        self._lock = threading.RLock()
+        self._index = EntityIndex(fields=("status",), order_by="created_at")
         # Ensure the 'cases' key exists in the state
         with self._sm.transaction() as tx:
             state = tx.get_state()
             if "cases" not in state:
                 state["cases"] = {}
+        # Changes reloaded from other processes, applied to the index lazily.
+        self._reloads: deque = deque()
+        add_reload_listener = getattr(self._sm, "add_reload_listener", None)
+        if add_reload_listener is not None:
+            add_reload_listener(self._reloads.append)
+        self._index_ready = False
+
+    def _rebuild_index(self) -> None:
+        with self._lock:
+            # Anything queued so far is covered by the snapshot taken below.
+            self._reloads.clear()
+            with self._sm.transaction(read_only=True) as tx:
+                self._index.rebuild(tx.get_state()["cases"])
+            self._index_ready = True
+
+    def _apply_reloads(self) -> None:
+        """
+        Builds the index on first use and re-indexes cases changed by other
+        processes. Must be called with the lock held.
+        """
+        if not self._index_ready:
+            self._rebuild_index()
+            return
+        # The read-only transaction picks up outside commits, queueing their changes.
+        with self._sm.transaction(read_only=True) as tx:
+            if not self._reloads:
+                return
+            cases = tx.get_state()["cases"]
+            changed = set()
+            while self._reloads:
+                keys = self._reloads.popleft().get("cases", set())
+                changed = None if keys is None or changed is None else changed | keys
+            if changed is None:
+                self._index.rebuild(cases)
+            else:
+                for case_id in changed:
+                    self._index.update(case_id, cases.get(case_id))
+
+    def get_many(self, case_ids: List[str]) -> List[Case]:
+        with self._sm.transaction(read_only=True) as tx:
+            cases = tx.get_state()["cases"]
+            return [self._cache.get(i, cases[i]) for i in case_ids if i in cases]
 
     def save(self, case: Case) -> None:
-        with self._sm.transaction() as tx:
-            state = tx.get_state()
-            state["cases"][case.case_id] = case.model_dump(mode='json')
+        self.save_many([case])
+
+    def save_many(self, cases: List[Case]) -> None:
+        encoded = [(case.case_id, codec_for(Case).encode(case)) for case in cases]
+        if not encoded:
+            return
+        with self._lock:
+            with self._sm.transaction() as tx:
+                stored = tx.get_state()["cases"]
+                for case_id, data in encoded:
+                    stored[case_id] = data
+            for case_id, data in encoded:
+                if self._index_ready:
+                    self._index.update(case_id, data)
+                self._cache.invalidate(case_id)
+
+    def delete_many(self, case_ids: List[str]) -> None:
+        with self._lock:
+            with self._sm.transaction() as tx:
+                stored = tx.get_state()["cases"]
+                for case_id in case_ids:
+                    if case_id in stored:
+                        del stored[case_id]
+            for case_id in case_ids:
+                if self._index_ready:
+                    self._index.update(case_id, None)
+                self._cache.invalidate(case_id)
 
     def get(self, case_id: str) -> Optional[Case]:
-        # Get is read-only, so a transaction isn't strictly necessary
-        # but using it ensures we get a consistent view of the state.
-        with self._sm.transaction() as tx:
+        # A read-only transaction gives a consistent view of the state
+        # without copying or persisting it.
+        with self._sm.transaction(read_only=True) as tx:
             state = tx.get_state()
-            case_data = state["cases"].get(case_id)
-            return _dict_to_model(Case, case_data)
+            return self._cache.get(case_id, state["cases"].get(case_id))
 
     def get_all(self) -> List[Case]:
-        with self._sm.transaction() as tx:
+        with self._sm.transaction(read_only=True) as tx:
             state = tx.get_state()
-            return [_dict_to_model(Case, data) for data in state["cases"].values()]
+            return [self._cache.get(i, data) for i, data in state["cases"].items()]
 
     def get_all_case_ids(self) -> List[str]:
-        with self._sm.transaction() as tx:
+        with self._sm.transaction(read_only=True) as tx:
             return list(tx.get_state()["cases"].keys())
 
+    def find_by_status(self, status: CaseStatus) -> List[Case]:
+        with self._lock:
+            self._apply_reloads()
+            case_ids = self._index.ids("status", status)
+        return self.get_many(case_ids)
+
+    def count_by_status(self, status: CaseStatus) -> int:
+        with self._lock:
+            self._apply_reloads()
+            return self._index.count("status", status)
+
 
 class JobRepository(IJobRepository):
     """
     A repository for Jobs that persists data to a JSON file via a StateManager.
+
+    Keeps in-memory secondary indexes (case_id, status, created_at ordering)
+    that are built by the first query and updated after each successful commit.
+    Decoded jobs are kept in a bounded identity map, as in CaseRepository.
     """
-    def __init__(self, state_manager: IStateManager):
+    def __init__(self, state_manager: IStateManager, cache_size: int = 1024):
         self._sm = state_manager
+        self._cache = IdentityMap(codec_for(Job), max_size=cache_size)
+        # Serializes commits with their index updates so both stay in step.
+        self._lock = threading.RLock()
+        self._index = EntityIndex(fields=("case_id", "status"), order_by="created_at")
         # Ensure the 'jobs' key exists in the state
         with self._sm.transaction() as tx:
             state = tx.get_state()
             if "jobs" not in state:
                 state["jobs"] = {}
+        # Changes reloaded from other processes, applied to the index lazily.
+        self._reloads: deque = deque()
+        add_reload_listener = getattr(self._sm, "add_reload_listener", None)
+        if add_reload_listener is not None:
+            add_reload_listener(self._reloads.append)
+        self._index_ready = False
+
+    def _rebuild_index(self) -> None:
+        with self._lock:
+            # Anything queued so far is covered by the snapshot taken below.
+            self._reloads.clear()
+            with self._sm.transaction(read_only=True) as tx:
+                self._index.rebuild(tx.get_state()["jobs"])
+            self._index_ready = True
+
+    def _apply_reloads(self) -> None:
+        """
+        Builds the index on first use and re-indexes jobs changed by other
+        processes. Must be called with the lock held.
+        """
+        if not self._index_ready:
+            self._rebuild_index()
+            return
+        # The read-only transaction picks up outside commits, queueing their changes.
+        with self._sm.transaction(read_only=True) as tx:
+            if not self._reloads:
+                return
+            jobs = tx.get_state()["jobs"]
+            changed = set()
+            while self._reloads:
+                keys = self._reloads.popleft().get("jobs", set())
+                changed = None if keys is None or changed is None else changed | keys
+            if changed is None:
+                self._index.rebuild(jobs)
+            else:
+                for job_id in changed:
+                    self._index.update(job_id, jobs.get(job_id))
+
+    def _get_many(self, job_ids) -> List[Job]:
+        with self._sm.transaction(read_only=True) as tx:
+            jobs = tx.get_state()["jobs"]
+            return [self._cache.get(i, jobs[i]) for i in job_ids if i in jobs]
 
     def save(self, job: Job) -> None:
-        with self._sm.transaction() as tx:
-            state = tx.get_state()
-            state["jobs"][job.job_id] = job.model_dump(mode='json')
+        self.save_many([job])
+
+    def save_many(self, jobs: List[Job]) -> None:
+        encoded = [(job.job_id, codec_for(Job).encode(job)) for job in jobs]
+        if not encoded:
+            return
+        with self._lock:
+            with self._sm.transaction() as tx:
+                stored = tx.get_state()["jobs"]
+                for job_id, data in encoded:
+                    stored[job_id] = data
+            for job_id, data in encoded:
+                if self._index_ready:
+                    self._index.update(job_id, data)
+                self._cache.invalidate(job_id)
+
+    def delete_many(self, job_ids: List[str]) -> None:
+        with self._lock:
+            with self._sm.transaction() as tx:
+                stored = tx.get_state()["jobs"]
+                for job_id in job_ids:
+                    if job_id in stored:
+                        del stored[job_id]
+            for job_id in job_ids:
+                if self._index_ready:
+                    self._index.update(job_id, None)
+                self._cache.invalidate(job_id)
 
     def get(self, job_id: str) -> Optional[Job]:
-        with self._sm.transaction() as tx:
+        with self._sm.transaction(read_only=True) as tx:
             state = tx.get_state()
-            job_data = state["jobs"].get(job_id)
-            return _dict_to_model(Job, job_data)
+            return self._cache.get(job_id, state["jobs"].get(job_id))
 
     def get_all(self) -> List[Job]:
-        with self._sm.transaction() as tx:
+        with self._sm.transaction(read_only=True) as tx:
             state = tx.get_state()
-            return [_dict_to_model(Job, data) for data in state["jobs"].values()]
+            return [self._cache.get(i, data) for i, data in state["jobs"].items()]
 
     def find_by_case_id(self, case_id: str) -> List[Job]:
+        with self._lock:
+            self._apply_reloads()
+            job_ids = self._index.ids("case_id", case_id)
+        return self._get_many(job_ids)
+
+    def find_by_status(self, status: JobStatus) -> List[Job]:
+        with self._lock:
+            self._apply_reloads()
+            job_ids = self._index.ids("status", status)
+        return self._get_many(job_ids)
+
+    def find_running_older_than(self, max_age: timedelta) -> List[Job]:
+        cutoff = datetime.utcnow() - max_age
+        with self._lock:
+            self._apply_reloads()
+            job_ids = self._index.ids_matching_before("status", JobStatus.RUNNING, cutoff)
+        return self._get_many(job_ids)
+
+    def count_by_status(self, status: JobStatus) -> int:
+        with self._lock:
+            self._apply_reloads()
+            return self._index.count("status", status)
+
+
+class TaskRepository(ITaskRepository):
+    """
+    A repository for the scheduler's unfinished Tasks that persists them via a
+    StateManager, so the task queue survives a restart.
+    """
+    def __init__(self, state_manager: IStateManager):
+        self._sm = state_manager
+        # Ensure the 'tasks' key exists in the state
         with self._sm.transaction() as tx:
             state = tx.get_state()
-            return [
-                _dict_to_model(Job, data)
-                for data in state["jobs"].values()
-                if data["case_id"] == case_id
-            ]
+            if "tasks" not in state:
+                state["tasks"] = {}
+
+    def save_many(self, tasks: List[Task]) -> None:
+        encoded = [(task.task_id, codec_for(Task).encode(task)) for task in tasks]
+        if not encoded:
+            return
+        with self._sm.transaction() as tx:
+            stored = tx.get_state()["tasks"]
+            for task_id, data in encoded:
+                stored[task_id] = data
+
+    def get(self, task_id: str) -> Optional[Task]:
+        with self._sm.transaction(read_only=True) as tx:
+            data = tx.get_state()["tasks"].get(task_id)
+            return codec_for(Task).decode(data) if data is not None else None
+
+    def get_all(self) -> List[Task]:
+        with self._sm.transaction(read_only=True) as tx:
+            return [codec_for(Task).decode(data) for data in tx.get_state()["tasks"].values()]
+
+    def delete_many(self, task_ids: List[str]) -> None:
+        if not task_ids:
+            return
+        with self._sm.transaction() as tx:
+            stored = tx.get_state()["tasks"]
+            for task_id in task_ids:
+                if task_id in stored:
+                    del stored[task_id]
@@ -0,0 +1,334 @@
+import json
+from datetime import datetime, timedelta
+from enum import Enum
+from pathlib import Path
+from typing import Any, List, Optional
+
+from mqi_communicator.domain.models import Case, CaseStatus, Job, JobStatus, Task
+from mqi_communicator.domain.repositories.interfaces import (
+    ICaseRepository, IJobRepository, IResourceRepository, ITaskRepository
+)
+from mqi_communicator.domain.repositories.codec import codec_for
+from mqi_communicator.infrastructure.state.serializers import CorruptStateError, load_state
+from mqi_communicator.infrastructure.state.sqlite_state_manager import SqliteStateManager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cases_status ON cases (status);
+CREATE INDEX IF NOT EXISTS idx_cases_created_at ON cases (created_at);
+CREATE INDEX IF NOT EXISTS idx_cases_updated_at ON cases (updated_at);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    case_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    started_at TEXT,
+    completed_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_case_id ON jobs (case_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS allocated_gpus (
+    gpu_id INTEGER PRIMARY KEY
+);
+"""
+
+# Marks a database that has already absorbed a legacy state.json.
+_MIGRATION_KEY = "__migrated_from_json__"
+
+
+def create_schema(state_manager: SqliteStateManager) -> None:
+    """Creates the entity tables and their indexes if they do not exist."""
+    with state_manager.connection(write=True) as conn:
+        for statement in _SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _column(value: Any) -> Any:
+    """Converts a field value to what is stored in an indexed column."""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _dump(data: dict[str, Any]) -> str:
+    return json.dumps(data, default=_json_default, separators=(",", ":"))
+
+
+def _case_row(data: dict[str, Any]) -> tuple:
+    return (
+        data["case_id"], _column(data["status"]), _column(data.get("created_at")),
+        _column(data.get("updated_at")), _dump(data),
+    )
+
+
+def _task_row(data: dict[str, Any]) -> tuple:
+    return (data["task_id"], data["job_id"], _column(data["status"]), _dump(data))
+
+
+def _job_row(data: dict[str, Any]) -> tuple:
+    return (
+        data["job_id"], data["case_id"], _column(data["status"]),
+        _column(data.get("created_at")), _column(data.get("started_at")),
+        _column(data.get("completed_at")), _dump(data),
+    )
+
+
+class SqliteCaseRepository(ICaseRepository):
+    """
+    A repository for Cases that stores one row per case in SQLite.
+    """
+    def __init__(self, state_manager: SqliteStateManager):
+        self._sm = state_manager
+        create_schema(self._sm)
+
+    def save(self, case: Case) -> None:
+        self.save_many([case])
+
+    def save_many(self, cases: List[Case]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cases (case_id, status, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [_case_row(codec_for(Case).encode(case)) for case in cases],
+            )
+
+    def delete_many(self, case_ids: List[str]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.executemany("DELETE FROM cases WHERE case_id = ?", [(case_id,) for case_id in case_ids])
+
+    def get(self, case_id: str) -> Optional[Case]:
+        with self._sm.connection() as conn:
+            row = conn.execute("SELECT data FROM cases WHERE case_id = ?", (case_id,)).fetchone()
+        return codec_for(Case).decode(json.loads(row[0])) if row else None
+
+    def get_all(self) -> List[Case]:
+        with self._sm.connection() as conn:
+            rows = conn.execute("SELECT data FROM cases").fetchall()
+        return [codec_for(Case).decode(json.loads(row[0])) for row in rows]
+
+    def get_many(self, case_ids: List[str]) -> List[Case]:
+        cases = []
+        with self._sm.connection() as conn:
+            # Stay well under SQLite's limit on bound parameters.
+            for start in range(0, len(case_ids), 500):
+                chunk = case_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT data FROM cases WHERE case_id IN ({placeholders})", chunk
+                ).fetchall()
+                cases.extend(codec_for(Case).decode(json.loads(row[0])) for row in rows)
+        return cases
+
+    def get_all_case_ids(self) -> List[str]:
+        with self._sm.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT case_id FROM cases")]
+
+    def find_by_status(self, status: CaseStatus) -> List[Case]:
+        with self._sm.connection() as conn:
+            rows = conn.execute(
+                "SELECT data FROM cases WHERE status = ?", (_column(status),)
+            ).fetchall()
+        return [codec_for(Case).decode(json.loads(row[0])) for row in rows]
+
+    def count_by_status(self, status: CaseStatus) -> int:
+        with self._sm.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM cases WHERE status = ?", (_column(status),)
+            ).fetchone()[0]
+
+
+class SqliteJobRepository(IJobRepository):
+    """
+    A repository for Jobs that stores one row per job in SQLite.
+    """
+    def __init__(self, state_manager: SqliteStateManager):
+        self._sm = state_manager
+        create_schema(self._sm)
+
+    def save(self, job: Job) -> None:
+        self.save_many([job])
+
+    def save_many(self, jobs: List[Job]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO jobs "
+                "(job_id, case_id, status, created_at, started_at, completed_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [_job_row(codec_for(Job).encode(job)) for job in jobs],
+            )
+
+    def delete_many(self, job_ids: List[str]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._sm.connection() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return codec_for(Job).decode(json.loads(row[0])) if row else None
+
+    def get_all(self) -> List[Job]:
+        with self._sm.connection() as conn:
+            rows = conn.execute("SELECT data FROM jobs").fetchall()
+        return [codec_for(Job).decode(json.loads(row[0])) for row in rows]
+
+    def find_by_case_id(self, case_id: str) -> List[Job]:
+        with self._sm.connection() as conn:
+            rows = conn.execute("SELECT data FROM jobs WHERE case_id = ?", (case_id,)).fetchall()
+        return [codec_for(Job).decode(json.loads(row[0])) for row in rows]
+
+    def find_by_status(self, status: JobStatus) -> List[Job]:
+        with self._sm.connection() as conn:
+            rows = conn.execute(
+                "SELECT data FROM jobs WHERE status = ?", (_column(status),)
+            ).fetchall()
+        return [codec_for(Job).decode(json.loads(row[0])) for row in rows]
+
+    def find_running_older_than(self, max_age: timedelta) -> List[Job]:
+        cutoff = datetime.utcnow() - max_age
+        with self._sm.connection() as conn:
+            rows = conn.execute(
+                "SELECT data FROM jobs WHERE status = ? AND created_at < ? ORDER BY created_at",
+                (JobStatus.RUNNING.value, cutoff.isoformat()),
+            ).fetchall()
+        return [codec_for(Job).decode(json.loads(row[0])) for row in rows]
+
+    def count_by_status(self, status: JobStatus) -> int:
+        with self._sm.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (_column(status),)
+            ).fetchone()[0]
+
+
+class SqliteTaskRepository(ITaskRepository):
+    """
+    A repository for the scheduler's unfinished Tasks that stores one row per task in SQLite.
+    """
+    def __init__(self, state_manager: SqliteStateManager):
+        self._sm = state_manager
+        create_schema(self._sm)
+
+    def save_many(self, tasks: List[Task]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tasks (task_id, job_id, status, data) VALUES (?, ?, ?, ?)",
+                [_task_row(codec_for(Task).encode(task)) for task in tasks],
+            )
+
+    def get(self, task_id: str) -> Optional[Task]:
+        with self._sm.connection() as conn:
+            row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return codec_for(Task).decode(json.loads(row[0])) if row else None
+
+    def get_all(self) -> List[Task]:
+        with self._sm.connection() as conn:
+            rows = conn.execute("SELECT data FROM tasks").fetchall()
+        return [codec_for(Task).decode(json.loads(row[0])) for row in rows]
+
+    def delete_many(self, task_ids: List[str]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.executemany("DELETE FROM tasks WHERE task_id = ?", [(task_id,) for task_id in task_ids])
+
+
+class SqliteResourceRepository(IResourceRepository):
+    """
+    A repository for system resources that stores one row per allocated GPU in SQLite.
+    """
+    def __init__(self, state_manager: SqliteStateManager):
+        self._sm = state_manager
+        create_schema(self._sm)
+
+    def get_allocated_gpus(self) -> List[int]:
+        with self._sm.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT gpu_id FROM allocated_gpus ORDER BY gpu_id")]
+
+    def set_allocated_gpus(self, gpu_ids: List[int]) -> None:
+        with self._sm.connection(write=True) as conn:
+            conn.execute("DELETE FROM allocated_gpus")
+            conn.executemany("INSERT INTO allocated_gpus (gpu_id) VALUES (?)", [(i,) for i in gpu_ids])
+
+
+def migrate_json_state(state_manager: SqliteStateManager, state_file: Path) -> bool:
+    """
+    Copies the contents of a JsonStateManager state file into the SQLite tables.
+
+    Cases, jobs, tasks and allocated GPUs go to their entity tables; any other top-level
+    keys are stored through the state manager. The migration runs once: the
+    database records that it has been done, and the JSON file is left untouched.
+
+    Returns:
+        True if data was migrated, False if there was nothing to do.
+    """
+    if state_manager.get(_MIGRATION_KEY) is not None or not state_file.exists():
+        return False
+
+    try:
+        state = load_state(state_file.read_bytes())
+    except CorruptStateError:
+        state = {}
+
+    create_schema(state_manager)
+    with state_manager.connection(write=True) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO cases (case_id, status, created_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [_case_row(data) for data in state.get("cases", {}).values()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO jobs "
+            "(job_id, case_id, status, created_at, started_at, completed_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [_job_row(data) for data in state.get("jobs", {}).values()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO tasks (task_id, job_id, status, data) VALUES (?, ?, ?, ?)",
+            [_task_row(data) for data in state.get("tasks", {}).values()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO allocated_gpus (gpu_id) VALUES (?)",
+            [(i,) for i in state.get("resources", {}).get("allocated_gpus", [])],
+        )
+
+    with state_manager.transaction() as tx:
+        new_state = tx.get_state()
+        for key, value in state.items():
+            if key not in ("cases", "jobs", "tasks", "resources"):
+                new_state[key] = value
+        new_state[_MIGRATION_KEY] = str(state_file)
+    return True
+
+
+def open_sqlite_state(state_file: Path, db_file: Optional[Path] = None) -> SqliteStateManager:
+    """
+    Opens the SQLite state database, migrating `state_file` into it on first use.
+    By default the database lives next to the JSON state file with a '.db' suffix.
+    """
+    state_manager = SqliteStateManager(db_file or state_file.with_suffix(".db"))
+    create_schema(state_manager)
+    migrate_json_state(state_manager, state_file)
+    return state_manager
@@ -28,7 +28,7 @@ class SystemMonitor(ISystemMonitor):
         Returns the status of all available NVIDIA GPUs by calling nvidia-smi.
         Returns an empty list if nvidia-smi is not found or fails.
         """
-        command = "nvidia-smi --query-gpu=index,utilization.gpu,memory.used --format=csv,noheader,nounits"
+        command = "nvidia-smi --query-gpu=index,utilization.gpu,memory.used,memory.total --format=csv,noheader,nounits"
         statuses = []
         try:
             result = subprocess.run(
@@ -41,11 +41,12 @@ class SystemMonitor(ISystemMonitor):
             output = result.stdout.strip()
             for line in output.splitlines():
                 parts = line.split(', ')
-                if len(parts) == 3:
+                if len(parts) in (3, 4):
                     statuses.append(GPUStatus(
                         id=int(parts[0]),
                         load=float(parts[1]),
-                        memory_usage=float(parts[2])
+                        memory_usage=float(parts[2]),
+                        memory_total=float(parts[3]) if len(parts) == 4 else None,
                     ))
             return statuses
         except (subprocess.CalledProcessError, FileNotFoundError, Exception):
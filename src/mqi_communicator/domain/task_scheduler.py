@@ -1,22 +1,101 @@
-from typing import List, Optional
-from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import heapq
+import itertools
+import threading
+import time
 import uuid
 
-from mqi_communicator.domain.models import Task, TaskType, TaskStatus
+from mqi_communicator.domain.models import CaseStatus, Job, JobStatus, Task, TaskType, TaskStatus
+from mqi_communicator.domain.repositories.interfaces import ITaskRepository
 from mqi_communicator.services.interfaces import ICaseService, IJobService
 from .interfaces import ITaskScheduler
 
+# The standard workflow of a case; each stage depends on the one before it.
+# BEAM_CALC is expanded into one task per beam, all of which CONVERT waits for.
+WORKFLOW = [
+    TaskType.UPLOAD,
+    TaskType.INTERPRET,
+    TaskType.BEAM_CALC,
+    TaskType.CONVERT,
+    TaskType.DOWNLOAD,
+]
+
+# Priority of tasks whose job the scheduler does not know.
+DEFAULT_PRIORITY = 1
+# Superseded heap entries are only dropped once they reach the top; a heap is
+# rebuilt when more than half of it (and at least this many entries) is stale.
+_MIN_STALE_TO_COMPACT = 64
+
 class TaskScheduler(ITaskScheduler):
     """
     Schedules and manages tasks for processing cases.
-    This is a simple in-memory implementation. A more robust implementation
-    might use a persistent message queue.
+
+    Tasks form a dependency graph: each task lists the tasks it waits for in
+    `Task.dependencies`, and becomes ready once they have all completed. Ready
+    tasks of any case can be handed out, so one case's transfers can run
+    while another case computes, and the stages of each case still run in order.
+
+    Ready tasks are served by job priority (higher first) with aging: each
+    task is keyed by the time it became ready minus its priority times
+    `aging_interval`, so a task that has waited `aging_interval` seconds is
+    on par with one of the next higher priority that just arrived, and low
+    priority cases cannot starve. Keys never change while a task waits, so
+    the ready queues are plain heaps: handing out a task and changing a
+    case's priority (`bump_case_priority`) take O(log n). A bumped task is
+    pushed again under its new key and its old heap entry is left behind as
+    stale, to be skipped when it reaches the top.
+
+    A case's BEAM_CALC stage runs as one task per beam, so its beams can be
+    calculated on several GPUs at once. Each beam task carries its `beam` (1
+    to `beam_count`) in its parameters. Scheduling never waits for metadata
+    extraction: the beam count is the one the case service already knows, and
+    a case still being counted gets a single BEAM_CALC task with a
+    `beam_count` of None. That task is held back once its dependencies are
+    done, and fanned out into one task per beam as soon as `get_next_task`
+    finds the count known. A case whose beams could not be counted gets a
+    single BEAM_CALC task.
+
+    With a `task_repository`, every unfinished task is saved, along with its
+    status, and removed once it has completed or failed. After a restart,
+    `recover` restores the queue from it; completed stages are not redone.
+    Each case's status follows its job: QUEUED when scheduled, then COMPLETED
+    or FAILED once its last task has finished.
     """
-    def __init__(self, case_service: ICaseService, job_service: IJobService):
+    def __init__(
+        self,
+        case_service: ICaseService,
+        job_service: IJobService,
+        aging_interval: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        task_repository: Optional[ITaskRepository] = None,
+    ):
         self._case_service = case_service
         self._job_service = job_service
-        self._task_queue: deque[Task] = deque()
+        self._task_repository = task_repository
+        self._aging_interval = aging_interval
+        self._clock = clock
+        # Ready tasks per type as heaps of [key, sequence, task or None if stale, ready since].
+        self._ready: Dict[TaskType, List[list]] = {task_type: [] for task_type in TaskType}
+        self._ready_order = itertools.count()
+        self._ready_entries: Dict[str, list] = {}
+        self._ready_by_job: Dict[str, Set[str]] = {}
+        self._stale: Dict[TaskType, int] = {task_type: 0 for task_type in TaskType}
+        # Priorities of the jobs with unfinished tasks, and which case each job is for.
+        self._job_priorities: Dict[str, int] = {}
+        self._job_cases: Dict[str, str] = {}
+        self._case_jobs: Dict[str, str] = {}
+        self._job_unfinished: Dict[str, int] = {}
+        self._failed_jobs: Set[str] = set()
         self._active_tasks: dict[str, Task] = {}
+        # BEAM_CALC tasks ready to run but still waiting for their case's beam count.
+        self._unexpanded: Dict[str, Task] = {}
+        # Every task that has not completed or failed yet.
+        self._unfinished: dict[str, Task] = {}
+        # Tasks waiting for dependencies, with the number still unfinished.
+        self._blocked: dict[str, Task] = {}
+        self._unfinished_dependencies: dict[str, int] = {}
+        self._dependents: dict[str, List[str]] = {}
+        self._lock = threading.Lock()
 
     def schedule_case(self, case_id: str) -> List[Task]:
         """
@@ -24,50 +103,420 @@ class TaskScheduler(ITaskScheduler):
         """
         # Create a job for the case first
         job = self._job_service.create_job(case_id=case_id)
+        tasks = self._schedule_job(job, self._case_service.beam_counts([case_id]).get(case_id, 0))
+        self._case_service.update_case_status(case_id, CaseStatus.QUEUED)
+        return tasks
 
-        # Define the standard workflow of tasks
-        task_types = [
-            TaskType.UPLOAD,
-            TaskType.INTERPRET,
-            TaskType.BEAM_CALC,
-            TaskType.CONVERT,
-            TaskType.DOWNLOAD,
-        ]
+    def schedule_cases(self, case_ids: List[str]) -> Dict[str, List[Task]]:
+        """
+        Schedules several cases at once. Their jobs are created in a single
+        transaction; returns the scheduled tasks keyed by case ID.
+        """
+        jobs = self._job_service.create_jobs(case_ids)
+        beam_counts = self._case_service.beam_counts(case_ids) if jobs else {}
+        scheduled = {job.case_id: self._schedule_job(job, beam_counts.get(job.case_id, 0)) for job in jobs}
+        if scheduled:
+            self._case_service.update_case_statuses({case_id: CaseStatus.QUEUED for case_id in scheduled})
+        return scheduled
 
+    def _schedule_job(self, job: Job, beam_count: Optional[int] = 1) -> List[Task]:
         new_tasks = []
-        for task_type in task_types:
-            task = Task(
-                task_id=str(uuid.uuid4()),
-                job_id=job.job_id,
-                type=task_type,
-                status=TaskStatus.PENDING,
-                parameters={} # Parameters could be added here
-            )
-            new_tasks.append(task)
-
-        self._task_queue.extend(new_tasks)
+        previous: List[str] = []
+        for task_type in WORKFLOW:
+            if task_type == TaskType.BEAM_CALC and beam_count is None:
+                # Fanned out by `_expand_beams` once the beams are counted.
+                stage = [self._new_task(job.job_id, task_type, previous, {"beam": 1, "beam_count": None})]
+            elif task_type == TaskType.BEAM_CALC:
+                stage = [
+                    self._new_task(job.job_id, task_type, previous, {"beam": beam, "beam_count": max(1, beam_count)})
+                    for beam in range(1, max(1, beam_count) + 1)
+                ]
+            else:
+                stage = [self._new_task(job.job_id, task_type, previous, {})]
+            new_tasks.extend(stage)
+            previous = [task.task_id for task in stage]
+
+        self._register_jobs([job])
+        self.schedule_tasks(new_tasks)
         return new_tasks
 
-    def get_next_task(self) -> Optional[Task]:
+    @staticmethod
+    def _new_task(job_id: str, task_type: TaskType, dependencies: List[str], parameters: Dict) -> Task:
+        return Task(
+            task_id=str(uuid.uuid4()),
+            job_id=job_id,
+            type=task_type,
+            status=TaskStatus.PENDING,
+            parameters=parameters,
+            dependencies=list(dependencies),
+        )
+
+    def _register_jobs(self, jobs: Iterable[Job]) -> None:
+        with self._lock:
+            for job in jobs:
+                self._job_priorities[job.job_id] = job.priority
+                self._job_cases[job.job_id] = job.case_id
+                self._case_jobs[job.case_id] = job.job_id
+
+    def schedule_tasks(self, tasks: List[Task]) -> None:
         """
-        Retrieves the next task to be executed from the queue.
+        Adds tasks to the graph. A dependency must be scheduled already or come
+        earlier in `tasks`; one that is no longer known has completed.
         """
-        if not self._task_queue:
-            return None
+        batch = {task.task_id for task in tasks}
+        seen = set()
+        for task in tasks:
+            later = [dep for dep in task.dependencies if dep in batch and dep not in seen]
+            if later:
+                raise ValueError(f"Task {task.task_id} depends on tasks scheduled after it: {later}")
+            seen.add(task.task_id)
+        if self._task_repository is not None:
+            self._task_repository.save_many(tasks)
+        self._add_tasks(tasks)
+
+    def _add_tasks(self, tasks: List[Task]) -> None:
+        with self._lock:
+            for task in tasks:
+                unfinished = [dep for dep in task.dependencies if dep in self._unfinished]
+                self._unfinished[task.task_id] = task
+                self._job_unfinished[task.job_id] = self._job_unfinished.get(task.job_id, 0) + 1
+                for dep in unfinished:
+                    self._dependents.setdefault(dep, []).append(task.task_id)
+                if unfinished:
+                    self._blocked[task.task_id] = task
+                    self._unfinished_dependencies[task.task_id] = len(unfinished)
+                else:
+                    self._make_ready(task)
 
-        task = self._task_queue.popleft()
-        task.status = TaskStatus.RUNNING
-        self._active_tasks[task.task_id] = task
+    def _make_ready(self, task: Task, ready_since: Optional[float] = None) -> None:
+        if task.type == TaskType.BEAM_CALC and task.parameters.get("beam_count", 0) is None:
+            self._unexpanded[task.task_id] = task
+            return
+        ready_since = self._clock() if ready_since is None else ready_since
+        priority = self._job_priorities.get(task.job_id, DEFAULT_PRIORITY)
+        entry = [ready_since - priority * self._aging_interval, next(self._ready_order), task, ready_since]
+        self._ready_entries[task.task_id] = entry
+        self._ready_by_job.setdefault(task.job_id, set()).add(task.task_id)
+        heapq.heappush(self._ready[task.type], entry)
+
+    def _take_ready(self, entry: list) -> Task:
+        task = entry[2]
+        del self._ready_entries[task.task_id]
+        job_ready = self._ready_by_job[task.job_id]
+        job_ready.discard(task.task_id)
+        if not job_ready:
+            del self._ready_by_job[task.job_id]
+        return task
+
+    def _finished(
+        self, task: Task, job_statuses: Dict[str, JobStatus], case_statuses: Dict[str, CaseStatus]
+    ) -> None:
+        """
+        Forgets a completed or failed task. Once it was its job's last, the
+        final status of the job is added to `job_statuses` and that of the
+        job's case to `case_statuses`.
+        """
+        del self._unfinished[task.task_id]
+        if task.status == TaskStatus.FAILED:
+            self._failed_jobs.add(task.job_id)
+        self._job_unfinished[task.job_id] -= 1
+        if self._job_unfinished[task.job_id] == 0:
+            del self._job_unfinished[task.job_id]
+            failed = task.job_id in self._failed_jobs
+            self._failed_jobs.discard(task.job_id)
+            job_statuses[task.job_id] = JobStatus.FAILED if failed else JobStatus.COMPLETED
+            self._job_priorities.pop(task.job_id, None)
+            case_id = self._job_cases.pop(task.job_id, None)
+            if case_id is not None and self._case_jobs.get(case_id) == task.job_id:
+                del self._case_jobs[case_id]
+                case_statuses[case_id] = CaseStatus.FAILED if failed else CaseStatus.COMPLETED
+
+    def _record_finished(
+        self, task_ids: List[str], job_statuses: Dict[str, JobStatus], case_statuses: Dict[str, CaseStatus]
+    ) -> None:
+        if self._task_repository is not None and task_ids:
+            self._task_repository.delete_many(task_ids)
+        # Jobs first: a case is only archived once it and all its jobs are finished.
+        if job_statuses:
+            self._job_service.finish_jobs(job_statuses)
+        if case_statuses:
+            self._case_service.update_case_statuses(case_statuses)
+
+    def get_next_task(
+        self, task_types: Optional[Iterable[TaskType]] = None, job_id: Optional[str] = None
+    ) -> Optional[Task]:
+        """
+        Retrieves the ready task with the highest aged priority, optionally only
+        among `task_types` (e.g. the types a worker pool has room for) or the
+        tasks of one job (e.g. to run a case on demand).
+        """
+        self._expand_beams()
+        with self._lock:
+            if job_id is None:
+                best: Optional[List[list]] = None
+                for task_type in (TaskType if task_types is None else task_types):
+                    heap = self._ready[task_type]
+                    while heap and heap[0][2] is None:
+                        heapq.heappop(heap)
+                        self._stale[task_type] -= 1
+                    if heap and (best is None or heap[0][:2] < best[0][:2]):
+                        best = heap
+                if best is None:
+                    return None
+                task = self._take_ready(heapq.heappop(best))
+            else:
+                types = set(TaskType if task_types is None else task_types)
+                entries = [
+                    self._ready_entries[task_id] for task_id in self._ready_by_job.get(job_id, ())
+                    if self._ready_entries[task_id][2].type in types
+                ]
+                if not entries:
+                    return None
+                entry = min(entries, key=lambda entry: entry[:2])
+                task = self._take_ready(entry)
+                # Left in its heap, to be skipped when it reaches the top.
+                entry[2] = None
+                self._stale[task.type] += 1
+                self._compact(task.type)
+            task.status = TaskStatus.RUNNING
+            self._active_tasks[task.task_id] = task
+        if self._task_repository is not None:
+            # Recovery needs to know which tasks may have been interrupted.
+            self._task_repository.save_many([task])
         return task
 
+    def _expand_beams(self) -> None:
+        """Fans out the held back BEAM_CALC tasks whose case's beams have been counted since."""
+        with self._lock:
+            if not self._unexpanded:
+                return
+            waiting = {task_id: self._job_cases.get(task.job_id) for task_id, task in self._unexpanded.items()}
+        # Asked outside the lock: the case service reads the repository.
+        beam_counts = self._case_service.beam_counts(
+            sorted({case_id for case_id in waiting.values() if case_id is not None})
+        )
+        changed: List[Task] = []
+        with self._lock:
+            for task_id, case_id in waiting.items():
+                beam_count = beam_counts.get(case_id, 0) if case_id is not None else 0
+                if beam_count is None or task_id not in self._unexpanded:
+                    continue
+                changed.extend(self._fan_out(self._unexpanded.pop(task_id), max(1, beam_count)))
+        if changed and self._task_repository is not None:
+            self._task_repository.save_many(changed)
+
+    def _fan_out(self, task: Task, beam_count: int) -> List[Task]:
+        """
+        Turns a held back BEAM_CALC task into the first of `beam_count` beam
+        tasks, makes them all ready and has its dependents wait for every one.
+        Returns the new and changed tasks.
+        """
+        task.parameters.update(beam=1, beam_count=beam_count)
+        beams = [task] + [
+            self._new_task(task.job_id, TaskType.BEAM_CALC, task.dependencies, {"beam": beam, "beam_count": beam_count})
+            for beam in range(2, beam_count + 1)
+        ]
+        dependents = self._dependents.get(task.task_id, [])
+        for beam in beams[1:]:
+            self._unfinished[beam.task_id] = beam
+            self._job_unfinished[beam.job_id] += 1
+            self._dependents[beam.task_id] = list(dependents)
+        changed = list(beams)
+        for dependent_id in dependents:
+            dependent = self._blocked[dependent_id]
+            dependent.dependencies.extend(beam.task_id for beam in beams[1:])
+            self._unfinished_dependencies[dependent_id] += len(beams) - 1
+            changed.append(dependent)
+        for beam in beams:
+            self._make_ready(beam)
+        return changed
+
+    def requeue_task(self, task_id: str) -> None:
+        """
+        Puts a task handed out by `get_next_task` back among the ready tasks,
+        e.g. when the resources it needs have turned out to be taken.
+        """
+        with self._lock:
+            task = self._active_tasks.pop(task_id, None)
+            if task is None:
+                return
+            task.status = TaskStatus.PENDING
+            self._make_ready(task)
+        if self._task_repository is not None:
+            self._task_repository.save_many([task])
+
+    def update_task(self, task: Task) -> None:
+        """
+        Saves changes to the parameters of a running task, such as the GPUs it
+        was given, so that they are known after a restart.
+        """
+        with self._lock:
+            if task.task_id not in self._active_tasks:
+                return
+        if self._task_repository is not None:
+            self._task_repository.save_many([task])
+
     def complete_task(self, task_id: str) -> None:
         """
-        Marks a task as complete.
+        Marks a task as complete and releases the tasks waiting for it.
+        """
+        job_statuses: Dict[str, JobStatus] = {}
+        case_statuses: Dict[str, CaseStatus] = {}
+        with self._lock:
+            if task_id in self._active_tasks:
+                task = self._active_tasks.pop(task_id)
+                task.status = TaskStatus.COMPLETED
+                self._finished(task, job_statuses, case_statuses)
+                # In a real system, we might save the task's final state here.
+                for dependent_id in self._dependents.pop(task_id, []):
+                    if dependent_id not in self._unfinished_dependencies:
+                        # Already failed along with another of its dependencies.
+                        continue
+                    self._unfinished_dependencies[dependent_id] -= 1
+                    if self._unfinished_dependencies[dependent_id] == 0:
+                        del self._unfinished_dependencies[dependent_id]
+                        self._make_ready(self._blocked.pop(dependent_id))
+            else:
+                # Log a warning about an unknown or already completed task
+                return
+        self._record_finished([task_id], job_statuses, case_statuses)
+
+    def fail_task(self, task_id: str) -> List[Task]:
+        """
+        Marks a running task as failed. Every task that depends on it, directly
+        or not, can no longer run and is failed too; returns those tasks.
+        """
+        job_statuses: Dict[str, JobStatus] = {}
+        case_statuses: Dict[str, CaseStatus] = {}
+        with self._lock:
+            task = self._active_tasks.pop(task_id, None)
+            if task is None:
+                # Log a warning about an unknown or already finished task
+                return []
+            task.status = TaskStatus.FAILED
+            self._finished(task, job_statuses, case_statuses)
+            cancelled = []
+            stack = list(self._dependents.pop(task_id, []))
+            while stack:
+                dependent = self._blocked.pop(stack.pop(), None)
+                if dependent is None:
+                    continue
+                del self._unfinished_dependencies[dependent.task_id]
+                dependent.status = TaskStatus.FAILED
+                self._finished(dependent, job_statuses, case_statuses)
+                cancelled.append(dependent)
+                stack.extend(self._dependents.pop(dependent.task_id, []))
+        self._record_finished(
+            [task_id] + [dependent.task_id for dependent in cancelled], job_statuses, case_statuses
+        )
+        return cancelled
+
+    def bump_case_priority(self, case_id: str, priority: int) -> bool:
+        """
+        Changes the priority of a queued case's job; its ready tasks move in
+        the queue right away, keeping the time they have already waited, and
+        its later tasks are queued with the new priority. The new priority is
+        also saved to the job. Returns False if the case has no unfinished job.
+        """
+        with self._lock:
+            job_id = self._case_jobs.get(case_id)
+            if job_id is None:
+                return False
+            self._job_priorities[job_id] = priority
+            for task_id in list(self._ready_by_job.get(job_id, ())):
+                entry = self._ready_entries[task_id]
+                task = self._take_ready(entry)
+                entry[2] = None
+                self._stale[task.type] += 1
+                self._make_ready(task, ready_since=entry[3])
+                self._compact(task.type)
+        self._job_service.set_priority(job_id, priority)
+        return True
+
+    def _compact(self, task_type: TaskType) -> None:
+        heap = self._ready[task_type]
+        if self._stale[task_type] >= _MIN_STALE_TO_COMPACT and self._stale[task_type] * 2 > len(heap):
+            heap[:] = [entry for entry in heap if entry[2] is not None]
+            heapq.heapify(heap)
+            self._stale[task_type] = 0
+
+    def recover(
+        self,
+        reconcile: Optional[Callable[[Task], bool]] = None,
+        release: Optional[Callable[[Task], None]] = None,
+    ) -> List[Task]:
+        """
+        Restores the tasks saved before a restart and schedules the cases that
+        were registered but never scheduled. Returns the restored tasks.
+
+        A task that was RUNNING is queued again, unless `reconcile(task)`
+        reports that it did finish (e.g. by checking remote state); then it
+        counts as completed. Completed tasks are not saved, so their stages
+        are not redone. Tasks whose job no longer exists are dropped. Every
+        task that was RUNNING, whatever becomes of it, is first passed to
+        `release` to free what it held (e.g. its GPUs).
         """
-        if task_id in self._active_tasks:
-            task = self._active_tasks.pop(task_id)
-            task.status = TaskStatus.COMPLETED
-            # In a real system, we might save the task's final state here.
-        else:
-            # Log a warning about an unknown or already completed task
-            pass
+        if self._task_repository is None:
+            return []
+        saved = self._task_repository.get_all()
+        jobs: Dict[str, Job] = {}
+        for job_id in {task.job_id for task in saved}:
+            job = self._job_service.get(job_id)
+            if job is not None:
+                jobs[job_id] = job
+
+        restored, requeued, dropped = [], [], []
+        for task in saved:
+            if task.status == TaskStatus.RUNNING and release is not None:
+                release(task)
+            if task.job_id not in jobs or task.status not in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                dropped.append(task.task_id)
+            elif task.status == TaskStatus.RUNNING and reconcile is not None and reconcile(task):
+                dropped.append(task.task_id)
+            else:
+                if task.status == TaskStatus.RUNNING:
+                    task.status = TaskStatus.PENDING
+                    requeued.append(task)
+                restored.append(task)
+        if dropped:
+            self._task_repository.delete_many(dropped)
+        if requeued:
+            self._task_repository.save_many(requeued)
+
+        restored = _dependency_order(restored)
+        restored_jobs = {task.job_id: jobs[task.job_id] for task in restored}
+        self._register_jobs(restored_jobs.values())
+        self._add_tasks(restored)
+
+        queued_case_ids = {job.case_id for job in restored_jobs.values()}
+        new_case_ids = [case.case_id for case in self._case_service.find_cases_by_status(CaseStatus.NEW)]
+        # Cases interrupted between saving their tasks and their status only need the status.
+        interrupted = {case_id: CaseStatus.QUEUED for case_id in new_case_ids if case_id in queued_case_ids}
+        if interrupted:
+            self._case_service.update_case_statuses(interrupted)
+        unscheduled = [case_id for case_id in new_case_ids if case_id not in queued_case_ids]
+        if unscheduled:
+            self.schedule_cases(unscheduled)
+        return restored
+
+
+def _dependency_order(tasks: List[Task]) -> List[Task]:
+    """Orders tasks so that each comes after those of its dependencies that are in the list."""
+    by_id = {task.task_id: task for task in tasks}
+    ordered: List[Task] = []
+    visited: Set[str] = set()
+    for task in tasks:
+        stack = [(task, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if expanded:
+                ordered.append(current)
+                continue
+            if current.task_id in visited:
+                continue
+            visited.add(current.task_id)
+            stack.append((current, True))
+            for dependency in reversed(current.dependencies):
+                if dependency in by_id and dependency not in visited:
+                    stack.append((by_id[dependency], False))
+    return ordered
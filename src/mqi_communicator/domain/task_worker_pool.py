@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from mqi_communicator.domain.models import Task, TaskType
+
+
+class TaskWorkerPool:
+    """
+    Runs tasks on worker threads with a separate concurrency limit per task
+    type, so e.g. a long BEAM_CALC does not hold up uploads and downloads.
+    Types without a limit of their own get `default_limit`.
+
+    Only one thread should submit (the orchestrator's main loop): it asks
+    `available_types` which types have a free slot and only submits those.
+    When a task finishes, its slot is released before `on_done` is called
+    with the task and the exception it raised, if any.
+    """
+
+    def __init__(self, limits: Optional[Dict[TaskType, int]] = None, default_limit: int = 1):
+        self._limits = {task_type: (limits or {}).get(task_type, default_limit) for task_type in TaskType}
+        self._running: Dict[TaskType, int] = {task_type: 0 for task_type in TaskType}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def limit(self, task_type: TaskType) -> int:
+        return self._limits[task_type]
+
+    def available_types(self) -> List[TaskType]:
+        """Returns the task types that have a free slot."""
+        with self._lock:
+            return [task_type for task_type in TaskType if self._running[task_type] < self._limits[task_type]]
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(self._running.values())
+
+    def submit(
+        self,
+        task: Task,
+        run: Callable[[Task], None],
+        on_done: Callable[[Task, Optional[BaseException]], None],
+    ) -> None:
+        """Runs `run(task)` on a worker. Raises RuntimeError if its type has no free slot."""
+        with self._lock:
+            if self._running[task.type] >= self._limits[task.type]:
+                raise RuntimeError(f"No free {task.type.value} slot for task {task.task_id}")
+            self._running[task.type] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, sum(self._limits.values())), thread_name_prefix="task-worker"
+                )
+            executor = self._executor
+        executor.submit(self._run, task, run, on_done)
+
+    def _run(
+        self,
+        task: Task,
+        run: Callable[[Task], None],
+        on_done: Callable[[Task, Optional[BaseException]], None],
+    ) -> None:
+        error: Optional[BaseException] = None
+        try:
+            run(task)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                self._running[task.type] -= 1
+                self._idle.notify_all()
+        on_done(task, error)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Waits until no task is running. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not any(self._running.values()), timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the workers, by default after the running tasks have finished."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
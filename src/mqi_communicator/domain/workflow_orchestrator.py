@@ -1,19 +1,40 @@
 import threading
 import time
-from typing import Dict, Callable
+from collections import deque
+from typing import Dict, Callable, Optional
 
 from mqi_communicator.domain.interfaces import (
     IWorkflowOrchestrator, ITaskScheduler, ISystemMonitor
 )
 from mqi_communicator.services.interfaces import (
-    ICaseService, ITransferService, IJobService, IResourceService
+    ICaseService, ITransferService, IJobService, IResourceService, IRetentionService
 )
 from mqi_communicator.domain.models import Task, TaskType
+from mqi_communicator.domain.task_worker_pool import TaskWorkerPool
+from mqi_communicator.infrastructure.state.interfaces import IStateManager
 
 class WorkflowOrchestrator(IWorkflowOrchestrator):
     """
     The main workflow orchestrator for the MQI Communicator.
     It runs a continuous loop to process cases.
+
+    If the case service can watch for new cases, a discovery thread waits on
+    it and wakes the main loop as soon as a case appears; the periodic scan
+    then only reconciles anything the watcher missed.
+
+    Tasks run on a `worker_pool` with a concurrency limit per task type. The
+    main loop hands it every ready task whose type has a free slot; each
+    finished task is completed (or failed) in the scheduler and wakes the main
+    loop to dispatch whatever has become ready. With a `resource_service`,
+    each BEAM_CALC task is placed on a GPU when it is dispatched, taking
+    `beam_gpu_share` of it and reserving `beam_memory_mb` of its memory (as
+    `gpu_ids`, `gpu_share` and `gpu_memory_mb` in its parameters); the GPU is
+    released when the task finishes. While no GPU has room, beam tasks wait
+    and the main loop checks again every `gpu_poll_interval` seconds.
+
+    On the first start, the scheduler recovers the tasks left unfinished by a
+    previous run. A `task_reconciler` can tell it which interrupted tasks
+    actually finished, e.g. by checking the remote side.
     """
     def __init__(
         self,
@@ -23,6 +44,15 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
         transfer_service: ITransferService,
         system_monitor: ISystemMonitor,
         scan_interval: int = 60,
+        state_manager: Optional[IStateManager] = None,
+        retention_service: Optional[IRetentionService] = None,
+        maintenance_interval: int = 3600,
+        worker_pool: Optional[TaskWorkerPool] = None,
+        task_reconciler: Optional[Callable[[Task], bool]] = None,
+        resource_service: Optional[IResourceService] = None,
+        beam_gpu_share: float = 1.0,
+        beam_memory_mb: float = 0.0,
+        gpu_poll_interval: float = 5.0,
     ):
         self._case_service = case_service
         self._job_service = job_service
@@ -30,9 +60,26 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
         self._transfer_service = transfer_service
         self._system_monitor = system_monitor
         self._scan_interval = scan_interval
+        # Flushed at stage boundaries so a completed task is durable
+        # even when the state manager defers writes.
+        self._state_manager = state_manager
+        self._retention_service = retention_service
+        self._maintenance_interval = maintenance_interval
+        self._worker_pool = worker_pool or TaskWorkerPool()
+        self._task_reconciler = task_reconciler
+        self._resource_service = resource_service
+        self._beam_gpu_share = beam_gpu_share
+        self._beam_memory_mb = beam_memory_mb
+        self._gpu_poll_interval = gpu_poll_interval
+        self._recovered = False
 
         self._main_thread: threading.Thread | None = None
+        self._maintenance_thread: threading.Thread | None = None
+        self._discovery_thread: threading.Thread | None = None
         self._stop_event = threading.Event()
+        # Set by the discovery thread, finished tasks and stop to cut the main loop's wait short.
+        self._wake_event = threading.Event()
+        self._discovered_case_ids: deque = deque()
 
         # Map task types to handler methods
         self._task_handlers: Dict[TaskType, Callable[[Task], None]] = {
@@ -43,59 +90,199 @@ class WorkflowOrchestrator(IWorkflowOrchestrator):
 
     def start(self) -> None:
         """Starts the main processing loop in a separate thread."""
+        if not self._recovered:
+            self._task_scheduler.recover(self._reconcile_task, release=self._release_gpus)
+            self._recovered = True
         if self._main_thread is None or not self._main_thread.is_alive():
             self._stop_event.clear()
             self._main_thread = threading.Thread(target=self._main_loop, daemon=True)
             self._main_thread.start()
+        if self._retention_service is not None and (
+            self._maintenance_thread is None or not self._maintenance_thread.is_alive()
+        ):
+            self._maintenance_thread = threading.Thread(target=self._maintenance_loop, daemon=True)
+            self._maintenance_thread.start()
+        if self._discovery_thread is None or not self._discovery_thread.is_alive():
+            self._discovery_thread = threading.Thread(target=self._discovery_loop, daemon=True)
+            self._discovery_thread.start()
 
     def stop(self) -> None:
         """Stops the main processing loop gracefully."""
         self._stop_event.set()
+        self._wake_event.set()
         if self._main_thread:
             self._main_thread.join()
+        if self._maintenance_thread:
+            self._maintenance_thread.join()
+        if self._discovery_thread:
+            self._discovery_thread.join()
+        # Let running tasks finish so their completion is recorded.
+        self._worker_pool.shutdown(wait=True)
+        self._flush_state()
+
+    def _flush_state(self) -> None:
+        if self._state_manager is not None:
+            self._state_manager.flush()
 
     def _main_loop(self):
         """The main loop that continuously scans for and processes cases."""
+        next_scan = time.monotonic()
+        while not self._stop_event.is_set():
+            # 1. Scan for new cases when due, add those the watcher found, and schedule them
+            self._wake_event.clear()
+            new_case_ids = []
+            if time.monotonic() >= next_scan:
+                new_case_ids = self._case_service.scan_for_new_cases()
+                next_scan = time.monotonic() + self._scan_interval
+            new_case_ids += self._take_discovered()
+            if new_case_ids:
+                self._task_scheduler.schedule_cases(new_case_ids)
+
+            # 2. Hand ready tasks to the workers while their type has a free slot
+            gpus_full = self._dispatch_ready_tasks()
+
+            # 3. Wait for a finished task, a discovered case or the next scan
+            timeout = max(0.0, next_scan - time.monotonic())
+            if gpus_full:
+                # GPUs may also free up as load outside our control drops.
+                timeout = min(timeout, self._gpu_poll_interval)
+            self._wake_event.wait(timeout)
+
+    def _dispatch_ready_tasks(self) -> bool:
+        """Returns True if beam tasks were held back because no GPU had room."""
+        gpus_full = False
+        while True:
+            task_types = self._worker_pool.available_types()
+            if self._resource_service is not None and TaskType.BEAM_CALC in task_types:
+                gpus_full = gpus_full or not self._resource_service.can_allocate_gpus(
+                    1, memory_mb=self._beam_memory_mb, share=self._beam_gpu_share
+                )
+                if gpus_full:
+                    task_types.remove(TaskType.BEAM_CALC)
+            task = self._task_scheduler.get_next_task(task_types)
+            if task is None:
+                return gpus_full
+            if task.type == TaskType.BEAM_CALC and self._resource_service is not None:
+                gpu_ids = self._resource_service.allocate_gpus(
+                    1, memory_mb=self._beam_memory_mb, share=self._beam_gpu_share
+                )
+                if not gpu_ids:
+                    # The telemetry changed since the check above.
+                    self._task_scheduler.requeue_task(task.task_id)
+                    gpus_full = True
+                    continue
+                task.parameters.update(
+                    gpu_ids=gpu_ids, gpu_share=self._beam_gpu_share, gpu_memory_mb=self._beam_memory_mb
+                )
+                self._task_scheduler.update_task(task)
+            self._worker_pool.submit(task, self._run_task, self._task_done)
+
+    def _release_gpus(self, task: Task) -> None:
+        gpu_ids = task.parameters.pop("gpu_ids", None)
+        share = task.parameters.pop("gpu_share", 1.0)
+        memory_mb = task.parameters.pop("gpu_memory_mb", 0.0)
+        if gpu_ids and self._resource_service is not None:
+            self._resource_service.release_gpus(gpu_ids, memory_mb=memory_mb, share=share)
+
+    def _reconcile_task(self, task: Task) -> bool:
+        """
+        Called on recovery for each task that was running before the restart
+        (its GPUs have been freed already); it is queued again unless the task
+        reconciler reports that it finished.
+        """
+        return self._task_reconciler is not None and self._task_reconciler(task)
+
+    def _take_discovered(self) -> list:
+        case_ids = []
+        while self._discovered_case_ids:
+            case_ids.append(self._discovered_case_ids.popleft())
+        return case_ids
+
+    def _discovery_loop(self):
+        """Hands cases found by the case service's watcher to the main loop."""
         while not self._stop_event.is_set():
-            # 1. Scan for new cases and schedule them
-            new_case_ids = self._case_service.scan_for_new_cases()
-            for case_id in new_case_ids:
-                self._task_scheduler.schedule_case(case_id)
-
-            # 2. Process tasks from the queue
-            task = self._task_scheduler.get_next_task()
-            if task:
-                self.execute_task(task)
-            else:
-                # If no tasks, wait before the next scan
+            try:
+                case_ids = self._case_service.watch_for_new_cases(timeout=1.0)
+            except Exception:
+                # Log the failure and back off; scanning still finds the cases.
                 self._stop_event.wait(self._scan_interval)
+                continue
+            if case_ids is None:
+                # No watcher: discovery is left to the periodic scan.
+                return
+            if case_ids:
+                self._discovered_case_ids.extend(case_ids)
+                self._wake_event.set()
+
+    def _maintenance_loop(self):
+        """Periodically archives finished cases so the live state stays small."""
+        while not self._stop_event.wait(self._maintenance_interval):
+            self.run_maintenance()
+
+    def run_maintenance(self) -> None:
+        """Runs one round of background maintenance."""
+        if self._retention_service is None:
+            return
+        try:
+            self._retention_service.archive_expired()
+            self._flush_state()
+        except Exception:
+            # Log the failure; the next round retries.
+            pass
 
     def process_case(self, case_id: str) -> None:
-        """Processes a single case on demand."""
+        """
+        Processes a single case on demand, in the calling thread. Each task is
+        claimed from the scheduler before it runs, so the main loop cannot run
+        it again; tasks the main loop claimed first are left to it, as are
+        those that wait for them or for the case's beams to be counted. Tasks
+        failed along with another are skipped.
+        """
         tasks = self._task_scheduler.schedule_case(case_id)
-        for task in tasks:
+        if not tasks:
+            return
+        task = self._task_scheduler.get_next_task(job_id=tasks[0].job_id)
+        while task is not None:
             self.execute_task(task)
+            task = self._task_scheduler.get_next_task(job_id=tasks[0].job_id)
 
     def execute_task(self, task: Task) -> None:
-        """Executes a single task."""
+        """
+        Executes a single task claimed from the scheduler in the calling
+        thread. A failed task also fails the tasks that depend on it, so the
+        rest of its case is not run.
+        """
+        try:
+            self._run_task(task)
+        except Exception as e:
+            self._task_done(task, e)
+        else:
+            self._task_done(task, None)
+
+    def _run_task(self, task: Task) -> None:
         handler = self._task_handlers.get(task.type)
-        if handler:
-            try:
-                # Get the job associated with the task to pass to the handler
-                job = self._job_service.get(task.job_id)
-                if job:
-                    handler(task, job)
-                    self._task_scheduler.complete_task(task.task_id)
-                else:
-                    # Handle missing job
-                    pass
-            except Exception:
-                # Handle task execution failure
-                # e.g., mark task as failed, release resources
-                pass
+        if handler is None:
+            # Nothing to run for this task type here; completing it lets the
+            # tasks that depend on it proceed.
+            return
+        # Get the job associated with the task to pass to the handler
+        job = self._job_service.get(task.job_id)
+        if not job:
+            raise LookupError(f"Job {task.job_id} of task {task.task_id} not found")
+        handler(task, job)
+
+    def _task_done(self, task: Task, error: Optional[BaseException]) -> None:
+        """Feeds a finished task back into the scheduler; called by the workers."""
+        self._release_gpus(task)
+        if error is None:
+            self._task_scheduler.complete_task(task.task_id)
+            if task.type in self._task_handlers:
+                self._flush_state()
         else:
-            # Handle unknown task type
-            pass
+            # Log the task execution failure
+            # e.g., release resources
+            self._task_scheduler.fail_task(task.task_id)
+        self._wake_event.set()
 
     # --- Task Handlers ---
 
@@ -1,7 +1,7 @@
 import yaml
 from pathlib import Path
 from dataclasses import is_dataclass, fields, MISSING
-from typing import Type, TypeVar
+from typing import Optional, Type, TypeVar, get_args, get_origin
 
 from mqi_communicator.infrastructure.config.models import MainConfig
 from mqi_communicator.exceptions import ConfigurationError, ValidationError
@@ -56,8 +56,17 @@ class ConfigLoader:
             field_path = f"{current_path}.{f.name}"
             if f.name in data:
                 field_value = data[f.name]
+                item_type = cls._list_item_type(f.type)
                 if is_dataclass(f.type) and isinstance(field_value, dict):
                     init_data[f.name] = cls._dict_to_dataclass(f.type, field_value, field_path)
+                elif item_type is not None:
+                    if not isinstance(field_value, list):
+                        raise ValidationError(f"Invalid type for field {field_path}. Expected list, got {type(field_value).__name__}.")
+                    init_data[f.name] = [
+                        cls._dict_to_dataclass(item_type, item, f"{field_path}[{i}]")
+                        if is_dataclass(item_type) and isinstance(item, dict) else item
+                        for i, item in enumerate(field_value)
+                    ]
                 elif isinstance(field_value, f.type):
                     init_data[f.name] = field_value
                 else:
@@ -70,3 +79,11 @@ class ConfigLoader:
                 raise ValidationError(f"Missing required configuration field: {field_path}")
 
         return dclass(**init_data)
+
+    @staticmethod
+    def _list_item_type(field_type) -> Optional[type]:
+        """Returns X for a List[X] field type, otherwise None."""
+        if get_origin(field_type) is list:
+            args = get_args(field_type)
+            return args[0] if args else object
+        return None
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import List, Optional
 
 @dataclass
 class AppConfig:
@@ -7,10 +7,24 @@ class AppConfig:
     version: str = "2.0.0"
     environment: str = "production"
 
+@dataclass
+class ScanRootConfig:
+    path: str
+    name: Optional[str] = None
+    # Share of newly found cases taken from this root relative to others of the same priority.
+    weight: float = 1.0
+    # List this root at most this often; without it, it is listed on every scan.
+    scan_interval_seconds: Optional[int] = None
+    # New cases from higher priority roots are handled first.
+    priority: int = 1
+
 @dataclass
 class PathsConfig:
     local_logdata: str
     remote_workspace: str
+    # Directories new cases are found in, e.g. one share per treatment room.
+    # Without any, local_logdata is the only scan root.
+    scan_roots: List[ScanRootConfig] = field(default_factory=list)
 
 @dataclass
 class SSHConfig:
@@ -25,6 +39,14 @@ class ResourcesConfig:
     max_concurrent_jobs: int = 10
     gpu_count: int = 8
     min_disk_space_gb: int = 100
+    # A GPU is not used while work outside our control keeps its utilization at or
+    # above gpu_busy_load_percent. Telemetry is re-read at most every gpu_telemetry_ttl_seconds.
+    gpu_busy_load_percent: float = 30.0
+    gpu_telemetry_ttl_seconds: float = 5.0
+    # What one beam calculation takes of a GPU: a share below 1 lets small beams share a GPU,
+    # and beams are packed by their expected memory in MB (0 if unknown).
+    beam_gpu_share: float = 1.0
+    beam_memory_mb: int = 0
 
 @dataclass
 class RetryPolicyConfig:
@@ -34,8 +56,69 @@ class RetryPolicyConfig:
 @dataclass
 class ProcessingConfig:
     scan_interval_seconds: int = 60
+    # How new cases are found: "poll" scans every scan_interval_seconds; "inotify" (Linux)
+    # picks them up as soon as they appear and scans only every reconcile_interval_seconds
+    # to catch anything the watcher missed.
+    case_discovery: str = "poll"
+    reconcile_interval_seconds: int = 600
+    # A new case directory is registered once nothing in it has changed for
+    # case_quiet_period_seconds, or as soon as case_ready_marker (e.g. "COMPLETE") appears
+    # in it. 0 disables the quiet period; with neither set, cases are registered at once.
+    case_quiet_period_seconds: int = 60
+    case_ready_marker: Optional[str] = None
+    # Threads used to hash case files for content manifests.
+    manifest_workers: int = 4
+    # Threads used to extract beam count, size and treatment date of new cases.
+    metadata_workers: int = 2
+    # Threads used to list scan roots concurrently, and how long a scan waits for a slow one.
+    scan_workers: int = 4
+    scan_timeout_seconds: float = 5.0
+    # Tasks of each type that may run at once: uploads and downloads (each), interpretations
+    # and conversions. Beam calculations are limited by resources.max_concurrent_jobs.
+    transfer_workers: int = 4
+    interpret_workers: int = 2
+    convert_workers: int = 2
+    # Ready tasks are served by job priority; a task that has waited this long ranks with
+    # one of the next higher priority, so low priority cases are not starved.
+    priority_aging_seconds: int = 300
     retry_policy: RetryPolicyConfig = field(default_factory=RetryPolicyConfig)
 
+@dataclass
+class StateConfig:
+    # "json" rewrites the whole state file on every commit,
+    # "journal" appends changed keys to a journal and compacts in the background,
+    # "sqlite" stores one row per entity and migrates an existing state file on first use,
+    # "sharded" stores each top-level section in its own file.
+    backend: str = "json"
+    journal_compact_threshold_bytes: int = 4 * 1024 * 1024
+    # Sections the sharded backend stores as one file per entity, e.g. ["cases", "jobs"].
+    shard_entity_sections: List[str] = field(default_factory=list)
+    # Let several processes on this host share the sharded state (fcntl locking).
+    shard_multi_process: bool = False
+    # Defaults to the state file path with a '.db' suffix.
+    sqlite_file: Optional[str] = None
+    # Coalesce commits and write them from a background thread (json and journal backends).
+    write_behind: bool = False
+    flush_interval_ms: int = 50
+    flush_max_commits: int = 100
+    # "none", "flush" (fsync each flush) or "commit" (flush and fsync every commit).
+    durability: str = "none"
+    # State file format for the json and journal backends: "json" (compact), "pretty_json",
+    # "orjson" (if installed), "pickle5", "marshal" or "indexed" (sections decoded on
+    # first access, for fast startup with a large history). Existing files load in any format.
+    serializer: str = "json"
+
+@dataclass
+class RetentionConfig:
+    # Archive COMPLETED and FAILED cases, with their jobs, once they are this old.
+    enabled: bool = False
+    max_age_days: int = 30
+    maintenance_interval_seconds: int = 3600
+    batch_size: int = 500
+    # Defaults to an 'archive' directory next to the state file.
+    archive_dir: Optional[str] = None
+    max_segment_bytes: int = 64 * 1024 * 1024
+
 @dataclass
 class MonitoringConfig:
     metrics_interval_seconds: int = 30
@@ -49,3 +132,5 @@ class MainConfig:
     resources: ResourcesConfig = field(default_factory=ResourcesConfig)
     processing: ProcessingConfig = field(default_factory=ProcessingConfig)
     monitoring: MonitoringConfig = field(default_factory=MonitoringConfig)
+    state: StateConfig = field(default_factory=StateConfig)
+    retention: RetentionConfig = field(default_factory=RetentionConfig)
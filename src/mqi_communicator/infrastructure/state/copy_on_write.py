@@ -0,0 +1,179 @@
+import copy
+from collections.abc import MutableMapping
+from typing import Any, Iterator
+
+from .lazy_section import LazySection
+
+# Describes what a transaction touched: for each top-level key, either the set of
+# entity keys that changed inside it, or None if the key was replaced or deleted as a whole.
+Changes = dict[str, "set[str] | None"]
+
+_MISSING = object()
+
+
+class _CopyOnWriteMapping(MutableMapping):
+    """
+    A mutable overlay over a dict that is never modified.
+
+    Writes and deletions are recorded in the overlay. Mutable values read through
+    the overlay are handed out as private copies and compared against the original
+    on commit, so in-place edits are detected without copying anything else.
+    """
+
+    def __init__(self, base: dict[str, Any]):
+        self._base = base
+        self._writes: dict[str, Any] = {}
+        self._deleted: set[str] = set()
+        self._copies: dict[str, Any] = {}
+
+    def _read(self, key: str) -> Any:
+        value = self._base[key]
+        if isinstance(value, (dict, list, set)):
+            value = copy.deepcopy(value)
+            self._copies[key] = value
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._writes:
+            return self._writes[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        if key in self._copies:
+            return self._copies[key]
+        return self._read(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._deleted.discard(key)
+        self._copies.pop(key, None)
+        self._writes[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._writes.pop(key, None)
+        self._copies.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._writes:
+            return True
+        return key not in self._deleted and key in self._base
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._writes:
+            if key not in self._base:
+                yield key
+
+    def __len__(self) -> int:
+        added = sum(1 for key in self._writes if key not in self._base)
+        return len(self._base) - len(self._deleted) + added
+
+    def _changed_keys(self) -> set[str]:
+        changed = set(self._writes) | self._deleted
+        for key, value in self._copies.items():
+            if value != self._base[key]:
+                changed.add(key)
+        return changed
+
+    def _value_for_commit(self, key: str) -> Any:
+        if key in self._writes:
+            return self._writes[key]
+        if key in self._copies:
+            return self._copies[key]
+        return _MISSING
+
+    def _materialize(self, changed: set[str]) -> dict[str, Any]:
+        """
+        Builds the committed dict. Unchanged values are shared with the base,
+        so only the container itself is copied.
+        """
+        if not changed:
+            return self._base
+        # copy() keeps a lazy section lazy; for a dict it is the same as dict().
+        result = self._base.copy()
+        # Keys new to the dict are added in the order they were written.
+        ordered = [key for key in self._writes if key in changed]
+        ordered += [key for key in changed if key not in self._writes]
+        for key in ordered:
+            value = self._value_for_commit(key)
+            if value is _MISSING:
+                result.pop(key, None)
+            else:
+                result[key] = value
+        return result
+
+
+class CopyOnWriteSection(_CopyOnWriteMapping):
+    """The transactional view of one top-level section, such as 'cases' or 'jobs'."""
+
+    def changed_keys(self) -> set[str]:
+        return self._changed_keys()
+
+    def materialize(self) -> dict[str, Any]:
+        return self._materialize(self._changed_keys())
+
+
+class CopyOnWriteState(_CopyOnWriteMapping):
+    """
+    The transactional view of the whole state.
+
+    Top-level dict values are exposed as CopyOnWriteSection views, which lets a
+    transaction that saves one case touch only that case. Everything the
+    transaction did not touch is shared with the committed state.
+    """
+
+    def __init__(self, base: dict[str, Any]):
+        super().__init__(base)
+        self._sections: dict[str, CopyOnWriteSection] = {}
+
+    def _read(self, key: str) -> Any:
+        value = self._base[key]
+        if isinstance(value, (dict, LazySection)):
+            section = self._sections.get(key)
+            if section is None:
+                section = self._sections[key] = CopyOnWriteSection(value)
+            return section
+        return super()._read(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._sections.pop(key, None)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self._sections.pop(key, None)
+        super().__delitem__(key)
+
+    def changes(self) -> Changes:
+        """Returns what this transaction touched, relative to the base state."""
+        result: Changes = {key: None for key in self._changed_keys()}
+        for key, section in self._sections.items():
+            entity_keys = section.changed_keys()
+            if entity_keys:
+                result[key] = entity_keys
+        return result
+
+    def commit(self) -> tuple[dict[str, Any], Changes]:
+        """Returns the new state to swap in along with the changes it contains."""
+        changes = self.changes()
+        if not changes:
+            return self._base, changes
+        result = self._materialize({key for key, v in changes.items() if v is None})
+        if result is self._base:
+            result = dict(self._base)
+        for key, entity_keys in changes.items():
+            if entity_keys is not None:
+                result[key] = self._sections[key].materialize()
+        return result, changes
+
+
+def merge_changes(target: Changes, changes: Changes) -> None:
+    """Folds `changes` into `target`, e.g. to persist several commits at once."""
+    for key, entity_keys in changes.items():
+        if entity_keys is None or target.get(key, set()) is None:
+            target[key] = None
+        else:
+            target.setdefault(key, set()).update(entity_keys)
@@ -1,9 +1,19 @@
 from typing import Protocol, Any, Callable, TypeVar, ContextManager
 from contextlib import contextmanager
+from enum import Enum
 import abc
 
 T = TypeVar('T')
 
+class Durability(str, Enum):
+    """How hard a state manager tries to get commits onto stable storage."""
+    # Write files but never fsync; the OS decides when data reaches the disk.
+    NONE = "none"
+    # fsync each time pending commits are flushed.
+    FLUSH = "flush"
+    # Flush and fsync every commit before the transaction returns.
+    COMMIT = "commit"
+
 class ITransactionContext(Protocol):
     """
     An interface for a transaction context that allows getting and setting state
@@ -11,7 +21,7 @@ class ITransactionContext(Protocol):
     """
     def get_state(self) -> dict[str, Any]:
         """
-        Returns a mutable copy of the current state for modification within the transaction.
+        Returns a mutable view of the current state for modification within the transaction.
         """
         ...
 
@@ -44,9 +54,20 @@ class IStateManager(Protocol):
         ...
 
     @abc.abstractmethod
-    def transaction(self) -> ContextManager[ITransactionContext]:
+    def transaction(self, read_only: bool = False) -> ContextManager[ITransactionContext]:
         """
         Provides a transactional context for state modifications.
         Changes are only persisted if the context exits without an exception.
+
+        Args:
+            read_only: If True, the state must not be modified inside the context.
+                Implementations may then skip copying and persisting.
+        """
+        ...
+
+    def flush(self) -> None:
+        """
+        Blocks until every commit made so far has been written out.
+        Acts as a durability barrier for implementations that defer writes.
         """
         ...
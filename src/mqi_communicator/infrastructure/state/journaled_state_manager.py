@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from .copy_on_write import Changes
+from .interfaces import Durability
+from .json_state_manager import JsonStateManager
+from .serializers import CorruptStateError, IStateSerializer, load_state
+
+# Key under which a snapshot records the last journal sequence number it contains.
+# A plain state dict without it (e.g. a file written by JsonStateManager) is
+# treated as a snapshot at sequence 0, so existing state files can be adopted.
+_SEQ_KEY = "__journal_seq__"
+_STATE_KEY = "__state__"
+
+# A journal operation is ("set", path, value) or ("del", path).
+# The path is [top_level_key] or [top_level_key, entity_key].
+Operation = list[Any]
+
+
+def operations_for_changes(state: dict[str, Any], changes: Changes) -> list[Operation]:
+    """
+    Builds the operations for a commit whose touched keys are already known,
+    without comparing the rest of the state.
+    """
+    ops: list[Operation] = []
+    for key, entity_keys in changes.items():
+        if entity_keys is None:
+            if key in state:
+                ops.append(["set", [key], state[key]])
+            else:
+                ops.append(["del", [key]])
+            continue
+        section = state[key]
+        for entity_key in entity_keys:
+            if entity_key in section:
+                ops.append(["set", [key, entity_key], section[entity_key]])
+            else:
+                ops.append(["del", [key, entity_key]])
+    return ops
+
+
+def apply_operations(state: dict[str, Any], ops: list[Operation]) -> None:
+    """Applies journal operations to a state dict in place."""
+    for op in ops:
+        kind, path = op[0], op[1]
+        if len(path) == 1:
+            if kind == "set":
+                state[path[0]] = op[2]
+            else:
+                state.pop(path[0], None)
+        else:
+            section = state.setdefault(path[0], {})
+            if kind == "set":
+                section[path[1]] = op[2]
+            else:
+                section.pop(path[1], None)
+
+
+class JournaledStateManager(JsonStateManager):
+    """
+    A state manager that appends the changed keys of each commit to a journal
+    instead of rewriting the whole state file.
+
+    The state file holds a snapshot. Once the journal grows past
+    `compact_threshold_bytes`, a background thread folds it into a new snapshot.
+    Snapshots are written with the same temp-file-plus-rename scheme as
+    JsonStateManager, and each journal entry is a single line, so a crash can
+    at worst lose a torn final entry, which is discarded on startup.
+    """
+
+    def __init__(
+        self,
+        state_file: Path,
+        compact_threshold_bytes: int = 4 * 1024 * 1024,
+        write_behind: bool = False,
+        flush_interval: float = 0.05,
+        flush_max_commits: int = 100,
+        durability: Durability = Durability.NONE,
+        serializer: Union[str, IStateSerializer] = "json",
+    ):
+        self._journal_file = state_file.with_suffix(f"{state_file.suffix}.journal")
+        self._compact_threshold_bytes = compact_threshold_bytes
+        self._seq = 0
+        self._journal_size = 0
+        self._journal = None
+        self._compaction_lock = threading.Lock()
+        self._compaction_requested = threading.Event()
+        self._closed = threading.Event()
+        self._compactor: threading.Thread | None = None
+        super().__init__(
+            state_file,
+            write_behind=write_behind,
+            flush_interval=flush_interval,
+            flush_max_commits=flush_max_commits,
+            durability=durability,
+            serializer=serializer,
+        )
+
+    # --- Loading ---
+
+    def _load_state(self):
+        with self._lock.write(), self._io_lock:
+            snapshot_seq = 0
+            state: dict[str, Any] = {}
+            if self._state_file.exists():
+                with self._state_file.open("rb") as f:
+                    raw = f.read()
+                try:
+                    data = load_state(raw)
+                except CorruptStateError:
+                    data = {}
+                if isinstance(data, dict) and _SEQ_KEY in data:
+                    snapshot_seq = data[_SEQ_KEY]
+                    state = data.get(_STATE_KEY, {})
+                elif isinstance(data, dict):
+                    state = data
+
+            self._state = state
+            self._seq = snapshot_seq
+            torn = self._replay_journal(snapshot_seq)
+
+            if not self._state_file.exists():
+                self._persist()
+            if torn:
+                # Drop the partial entry so that new appends start on a clean line.
+                self._rewrite_journal(snapshot_seq)
+            self._open_journal()
+
+    def _replay_journal(self, snapshot_seq: int) -> bool:
+        """
+        Applies journal entries newer than the snapshot.
+        Returns True if a torn or corrupted entry was found at the end.
+        """
+        for entry in self._read_journal():
+            if entry is None:
+                return True
+            if entry["seq"] <= snapshot_seq:
+                # Already folded into the snapshot by an interrupted compaction.
+                continue
+            apply_operations(self._state, entry["ops"])
+            self._seq = entry["seq"]
+        return False
+
+    def _read_journal(self) -> Iterator[dict[str, Any] | None]:
+        """Yields journal entries in order, and None for the first unreadable line."""
+        if not self._journal_file.exists():
+            return
+        with self._journal_file.open("r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    yield None
+                    return
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+                    return
+
+    # --- Persistence ---
+
+    def _persist(self, state: Optional[dict[str, Any]] = None, fsync: bool = False):
+        """
+        Atomically writes a snapshot of the state (by default the current one),
+        tagged with the sequence number of the last journal entry it includes.
+        Must be called with the I/O lock held.
+        """
+        self._write_snapshot(self._state if state is None else state, self._seq)
+
+    def _write_snapshot(self, state: dict[str, Any], seq: int):
+        temp_file_path = self._state_file.with_suffix(f"{self._state_file.suffix}.tmp")
+        with temp_file_path.open("wb") as f:
+            self._serializer.dump({_SEQ_KEY: seq, _STATE_KEY: state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_file_path, self._state_file)
+
+    def _write(self, state: dict[str, Any], changes: Changes, fsync: bool):
+        # With write-behind, `changes` spans several commits, which are
+        # appended as a single entry.
+        ops = operations_for_changes(state, changes)
+        if ops:
+            self._append(ops, fsync)
+
+    def _append(self, ops: list[Operation], fsync: bool = False):
+        self._seq += 1
+        line = json.dumps({"seq": self._seq, "ops": ops}, separators=(",", ":")) + "\n"
+        self._journal.write(line)
+        self._journal.flush()
+        if fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_size += len(line)
+        if self._journal_size >= self._compact_threshold_bytes:
+            self._request_compaction()
+
+    def _open_journal(self):
+        self._journal = self._journal_file.open("a")
+        self._journal_size = self._journal.tell()
+
+    def _rewrite_journal(self, after_seq: int):
+        """
+        Atomically replaces the journal with only the entries newer than `after_seq`.
+        Must be called with the I/O lock held.
+        """
+        kept = [
+            json.dumps(entry, separators=(",", ":")) + "\n"
+            for entry in self._read_journal()
+            if entry is not None and entry["seq"] > after_seq
+        ]
+        temp_file_path = self._journal_file.with_suffix(f"{self._journal_file.suffix}.tmp")
+        with temp_file_path.open("w") as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_file_path, self._journal_file)
+
+    # --- Compaction ---
+
+    def compact(self):
+        """
+        Folds the journal into a new snapshot.
+
+        Commits replace self._state rather than mutating it, so the snapshot is
+        serialized outside the I/O lock while other transactions keep committing.
+        The state may include commits that are not journaled yet; replaying them
+        again on top of the snapshot is harmless.
+        """
+        with self._compaction_lock:
+            with self._io_lock:
+                state, seq = self._state, self._seq
+            self._write_snapshot(state, seq)
+            with self._io_lock:
+                if self._journal is not None:
+                    self._journal.close()
+                self._rewrite_journal(seq)
+                self._open_journal()
+
+    def _request_compaction(self):
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+            self._compactor.start()
+        self._compaction_requested.set()
+
+    def _compaction_loop(self):
+        while True:
+            self._compaction_requested.wait()
+            if self._closed.is_set():
+                return
+            self._compaction_requested.clear()
+            self.compact()
+
+    def close(self):
+        """Writes out pending commits, stops the background threads and closes the journal."""
+        super().close()
+        self._closed.set()
+        self._compaction_requested.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._io_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
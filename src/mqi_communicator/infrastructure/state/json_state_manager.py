@@ -1,77 +1,278 @@
-import json
 import threading
+import time
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Any, ContextManager
+from typing import Any, Callable, ContextManager, Optional, Union
+from types import MappingProxyType
 import copy
 import os
 
-from .interfaces import IStateManager, ITransactionContext
+from .interfaces import Durability, IStateManager, ITransactionContext
+from .copy_on_write import Changes, CopyOnWriteState, merge_changes
+from .rw_lock import InstrumentedLock, LockStats, ReadWriteLock
+from .serializers import CorruptStateError, IStateSerializer, open_state, resolve_serializer
 
 class JsonStateManager(IStateManager):
     """
     A thread-safe, transactional state manager that persists state to a JSON file.
     It ensures atomic writes to prevent data corruption.
+
+    The file format is chosen by `serializer` (compact JSON by default; see
+    serializers.get_serializer). Loading detects the format of the existing
+    file, so the serializer can be changed without migrating anything. Files
+    written by the "indexed" serializer are opened without decoding them:
+    sections and their entities are decoded when first accessed.
+
+    By default every commit is written before the transaction returns. With
+    `write_behind=True`, commits are coalesced by a background thread and written
+    together once `flush_interval` seconds have passed since the first pending
+    commit, or once `flush_max_commits` commits are pending. `flush()` forces
+    pending commits out, and `durability` controls when writes are fsynced.
+
+    Concurrency follows a reader-writer model. Committed states are never
+    modified in place, so readers only hold the read lock long enough to take a
+    reference to the current state. Writers are serialized by the write lock,
+    and file I/O happens under a separate I/O lock after the new state has been
+    swapped in, so neither readers nor the next writer wait for the disk.
     """
 
-    def __init__(self, state_file: Path):
+    def __init__(
+        self,
+        state_file: Path,
+        write_behind: bool = False,
+        flush_interval: float = 0.05,
+        flush_max_commits: int = 100,
+        durability: Durability = Durability.NONE,
+        serializer: Union[str, IStateSerializer] = "json",
+    ):
         self._state_file = state_file
-        self._lock = threading.RLock()
+        self._serializer = resolve_serializer(serializer)
+        self._lock = ReadWriteLock()
+        self._io_lock = InstrumentedLock()
         self._state: dict[str, Any] = {}
+
+        self._write_behind = write_behind and durability != Durability.COMMIT
+        self._flush_interval = flush_interval
+        self._flush_max_commits = flush_max_commits
+        self._durability = Durability(durability)
+        self._pending: Changes = {}
+        self._pending_commits = 0
+        self._first_pending_at = 0.0
+        self._pending_lock = threading.Lock()
+        self._pending_changed = threading.Condition(self._pending_lock)
+        self._flusher: threading.Thread | None = None
+        self._closing = False
+        self._reload_listeners: list[Callable[[Changes], None]] = []
+
         self._load_state()
 
     def _load_state(self):
-        with self._lock:
+        with self._lock.write(), self._io_lock:
             if self._state_file.exists():
-                with self._state_file.open("r") as f:
-                    try:
-                        self._state = json.load(f)
-                    except json.JSONDecodeError:
-                        # Handle case of empty or corrupted file
-                        self._state = {}
+                try:
+                    self._state = open_state(self._state_file)
+                except CorruptStateError:
+                    # Handle case of empty or corrupted file
+                    self._state = {}
             else:
                 self._state = {}
                 self._persist()
 
-    def _persist(self):
+    def _persist(self, state: Optional[dict[str, Any]] = None, fsync: bool = False):
         """
-        Atomically persists the current in-memory state to the JSON file.
+        Atomically persists the state (by default the current in-memory state) to the state file.
         Writes to a temporary file first, then renames it to the final destination.
+        Must be called with the I/O lock held.
         """
-        with self._lock:
-            temp_file_path = self._state_file.with_suffix(f"{self._state_file.suffix}.tmp")
-            with temp_file_path.open("w") as f:
-                json.dump(self._state, f, indent=2)
-            os.rename(temp_file_path, self._state_file)
+        if state is None:
+            state = self._state
+        temp_file_path = self._state_file.with_suffix(f"{self._state_file.suffix}.tmp")
+        with temp_file_path.open("wb") as f:
+            self._serializer.dump(state, f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(temp_file_path, self._state_file)
+        if fsync:
+            _fsync_directory(self._state_file.parent)
 
     def get(self, key: str, default: Any = None) -> Any:
-        with self._lock:
-            return copy.deepcopy(self._state.get(key, default))
+        with self._lock.read():
+            value = self._state.get(key, default)
+        return copy.deepcopy(value)
 
     def set(self, key: str, value: Any):
-        with self._lock:
-            self._state[key] = value
-            self._persist()
+        with self._lock.write():
+            new_state = dict(self._state)
+            new_state[key] = value
+            self._commit(new_state, {key: None})
+        self._after_commit()
+
+    def _commit(self, new_state: dict[str, Any], changes: Changes):
+        """
+        Swaps in a new state and records its changes as pending.
+        Must be called with the write lock held.
+
+        The committed state is never modified in place afterwards, so a reference
+        to it is a consistent snapshot.
+        """
+        with self._pending_lock:
+            self._state = new_state
+            merge_changes(self._pending, changes)
+            if self._pending_commits == 0:
+                self._first_pending_at = time.monotonic()
+            self._pending_commits += 1
+            if self._write_behind and not self._closing:
+                self._ensure_flusher()
+                self._pending_changed.notify()
+
+    def _after_commit(self):
+        """
+        Writes a commit out once the write lock has been released,
+        unless the background flusher is responsible for it.
+        """
+        if not self._write_behind or self._closing:
+            self._flush_pending(fsync=self._durability != Durability.NONE)
+
+    def _write(self, state: dict[str, Any], changes: Changes, fsync: bool):
+        """
+        Writes out a committed state. `changes` covers every commit since the
+        previous write. Subclasses override this to write only what changed.
+        """
+        self._persist(state, fsync=fsync)
+
+    def _flush_pending(self, fsync: bool):
+        with self._io_lock:
+            with self._pending_lock:
+                if not self._pending_commits:
+                    return
+                # The state and the pending changes are swapped together under
+                # this lock, so `state` contains exactly the changes taken here.
+                state = self._state
+                changes, self._pending = self._pending, {}
+                self._pending_commits = 0
+            try:
+                self._write(state, changes, fsync)
+            except BaseException:
+                # Keep the changes so the next flush retries them.
+                with self._pending_lock:
+                    merge_changes(changes, self._pending)
+                    self._pending = changes
+                    self._pending_commits += 1
+                raise
+
+    def flush(self):
+        """
+        Writes out all pending commits and blocks until they are on disk.
+        Unless durability is NONE, the write is fsynced.
+        """
+        # A failed background flush leaves its changes pending, so they are
+        # retried here and any error surfaces to this caller.
+        self._flush_pending(fsync=self._durability != Durability.NONE)
+
+    def _ensure_flusher(self):
+        # Called with the pending lock held.
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._pending_lock:
+                while not self._pending_commits and not self._closing:
+                    self._pending_changed.wait()
+                if self._closing:
+                    return
+                # Coalesce commits until the window closes or enough have piled up.
+                deadline = self._first_pending_at + self._flush_interval
+                while self._pending_commits < self._flush_max_commits and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending_changed.wait(remaining)
+            try:
+                self._flush_pending(fsync=self._durability == Durability.FLUSH)
+            except Exception:
+                # The changes stay pending; back off before retrying.
+                with self._pending_lock:
+                    if not self._closing:
+                        self._pending_changed.wait(self._flush_interval)
 
     @contextmanager
-    def transaction(self) -> ContextManager[ITransactionContext]:
+    def transaction(self, read_only: bool = False) -> ContextManager[ITransactionContext]:
         """
         Provides a transactional context for state modifications.
+
+        Write transactions operate on a copy-on-write view of the state: only the
+        top-level values and entities they touch are copied. A read-only
+        transaction exposes the committed state directly, with no copy and no
+        persist; callers must not modify anything reachable from it.
         """
-        with self._lock:
-            # The transaction operates on a deep copy of the state.
-            temp_state = copy.deepcopy(self._state)
+        if read_only:
+            # A reference to the committed state is a consistent snapshot,
+            # so the read lock is not held while the caller reads it.
+            with self._lock.read():
+                snapshot = MappingProxyType(self._state)
+
+            class ReadOnlyTransactionContext(ITransactionContext):
+                def get_state(self) -> dict[str, Any]:
+                    return snapshot
+
+            yield ReadOnlyTransactionContext()
+            return
+
+        with self._lock.write():
+            temp_state = CopyOnWriteState(self._state)
 
             class TransactionContext(ITransactionContext):
                 def get_state(self) -> dict[str, Any]:
                     return temp_state
 
-            try:
-                yield TransactionContext()
-                # If the context exits without error, commit the changes.
-                self._state = temp_state
-                self._persist()
-            except Exception:
-                # If an error occurred, the changes to temp_state are discarded
-                # and the original self._state is preserved.
-                raise
+            # If an exception escapes the block, the view is discarded
+            # and the original self._state is preserved.
+            yield TransactionContext()
+            new_state, changes = temp_state.commit()
+            if changes:
+                self._commit(new_state, changes)
+        if changes:
+            self._after_commit()
+
+    def add_reload_listener(self, listener: Callable[[Changes], None]):
+        """
+        Registers a callback that receives the changed keys whenever state
+        written by another process is reloaded. Listeners may be called with
+        locks held, so they must only record the changes and return.
+        """
+        self._reload_listeners.append(listener)
+
+    def _notify_reload(self, changes: Changes):
+        if changes:
+            for listener in self._reload_listeners:
+                listener(changes)
+
+    def lock_stats(self) -> dict[str, LockStats]:
+        """
+        Returns contention metrics: wait and hold times for the read and write
+        sides of the state lock, and for the I/O lock that serializes file writes.
+        """
+        stats = self._lock.stats()
+        stats["io"] = self._io_lock.stats()
+        return stats
+
+    def close(self):
+        """Stops the background flusher and writes out any pending commits."""
+        with self._pending_lock:
+            self._closing = True
+            self._pending_changed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+
+def _fsync_directory(path: Path):
+    """Makes a rename inside `path` durable."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,109 @@
+import copy
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterator, Optional
+
+
+class _Encoded:
+    """The location of an entity that has not been decoded yet."""
+    __slots__ = ("offset", "length")
+
+    def __init__(self, offset: int, length: int):
+        self.offset = offset
+        self.length = length
+
+
+class LazySection(MutableMapping):
+    """
+    A state section read from an indexed state file, decoded on demand.
+
+    Nothing is decoded until the section is first used; then only its entity
+    index (ids and lengths) is read. Each entity is decoded the first time it is
+    accessed and the decoded value is kept, so it is the same object on every
+    later access. Entities that were never decoded can be copied to a new file
+    byte-for-byte through `raw()`.
+
+    Like any committed section, a LazySection must not be modified once it is
+    part of the committed state; transactions modify a `copy()` instead.
+    """
+
+    def __init__(self, buffer: Any, index: tuple[int, int], loads: Callable[[bytes], Any]):
+        self._buffer = buffer
+        self._index = index
+        self._loads = loads
+        self._entries: Optional[dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, Any]:
+        entries = self._entries
+        if entries is None:
+            with self._lock:
+                if self._entries is None:
+                    offset, length = self._index
+                    ids, lengths, position = self._loads(self._buffer[offset:offset + length])
+                    entries = {}
+                    for entity_id, size in zip(ids, lengths):
+                        entries[entity_id] = _Encoded(position, size)
+                        position += size
+                    self._entries = entries
+                entries = self._entries
+        return entries
+
+    def __getitem__(self, key: str) -> Any:
+        entries = self._load()
+        value = entries[key]
+        if type(value) is _Encoded:
+            value = self._loads(self._buffer[value.offset:value.offset + value.length])
+            # Decoding does not change what the section holds, so the committed
+            # section may cache the decoded value.
+            entries[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._load()[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._load()[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._load()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __deepcopy__(self, memo: dict) -> dict[str, Any]:
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __repr__(self) -> str:
+        loaded = "unloaded" if self._entries is None else f"{len(self._entries)} entities"
+        return f"<LazySection {loaded}>"
+
+    def raw(self, key: str) -> Optional[bytes]:
+        """Returns the encoded bytes of an entity that has not been decoded, else None."""
+        value = self._load()[key]
+        if type(value) is _Encoded:
+            return self._buffer[value.offset:value.offset + value.length]
+        return None
+
+    def copy(self) -> "LazySection":
+        """Returns a section with the same entities; undecoded ones stay undecoded."""
+        result = LazySection(self._buffer, self._index, self._loads)
+        result._entries = dict(self._load())
+        return result
+
+    def to_dict(self) -> dict[str, Any]:
+        """Decodes every entity into a plain dict. Values are shared, not copied."""
+        return {key: self[key] for key in self}
+
+
+def plain_state(state: dict[str, Any]) -> dict[str, Any]:
+    """Returns `state` with any lazy sections decoded into plain dicts."""
+    if not any(isinstance(value, LazySection) for value in state.values()):
+        return state
+    return {
+        key: value.to_dict() if isinstance(value, LazySection) else value
+        for key, value in state.items()
+    }
@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Iterator
+
+@dataclass
+class LockStats:
+    """Contention metrics for one side of a lock. Times are in seconds."""
+    acquisitions: int = 0
+    # Acquisitions that had to wait for another holder.
+    contended: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    total_hold: float = 0.0
+    max_hold: float = 0.0
+
+    def _record_wait(self, waited: float, contended: bool):
+        self.acquisitions += 1
+        if contended:
+            self.contended += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _record_hold(self, held: float):
+        self.total_hold += held
+        self.max_hold = max(self.max_hold, held)
+
+
+class ReadWriteLock:
+    """
+    A writer-preferring reader-writer lock.
+
+    Any number of threads may hold the read side at once; the write side is
+    exclusive. Waiting writers block new readers so that a steady stream of
+    reads cannot starve them. The write side is reentrant, and a thread holding
+    it may also take the read side. Upgrading from read to write is not
+    supported because two upgrading readers would deadlock.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: int | None = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+        self._read_stats = LockStats()
+        self._write_stats = LockStats()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, "read_depth", 0)
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        me = threading.get_ident()
+        if self._writer == me or self._read_depth():
+            # Already protected by this thread's write or read hold.
+            self._local.read_depth = self._read_depth() + 1
+            try:
+                yield
+            finally:
+                self._local.read_depth -= 1
+            return
+
+        start = time.perf_counter()
+        with self._cond:
+            contended = self._writer is not None or self._waiting_writers > 0
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+            acquired = time.perf_counter()
+            self._read_stats._record_wait(acquired - start, contended)
+        self._local.read_depth = 1
+        try:
+            yield
+        finally:
+            self._local.read_depth = 0
+            with self._cond:
+                self._readers -= 1
+                self._read_stats._record_hold(time.perf_counter() - acquired)
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        if self._read_depth():
+            raise RuntimeError("Cannot acquire the write lock while holding the read lock.")
+
+        start = time.perf_counter()
+        with self._cond:
+            contended = self._writer is not None or self._readers > 0
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            acquired = time.perf_counter()
+            self._write_stats._record_wait(acquired - start, contended)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._write_stats._record_hold(time.perf_counter() - acquired)
+                self._cond.notify_all()
+
+    def stats(self) -> dict[str, LockStats]:
+        """Returns a copy of the read and write contention metrics."""
+        with self._cond:
+            return {"read": replace(self._read_stats), "write": replace(self._write_stats)}
+
+
+class InstrumentedLock:
+    """A mutex that records the same contention metrics as ReadWriteLock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = LockStats()
+
+    def __enter__(self):
+        start = time.perf_counter()
+        contended = not self._lock.acquire(blocking=False)
+        if contended:
+            self._lock.acquire()
+        self._acquired = time.perf_counter()
+        self._stats._record_wait(self._acquired - start, contended)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stats._record_hold(time.perf_counter() - self._acquired)
+        self._lock.release()
+
+    def stats(self) -> LockStats:
+        """Returns a copy of the contention metrics."""
+        return replace(self._stats)
@@ -0,0 +1,261 @@
+import io
+import json
+import marshal
+import mmap
+import pickle
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Protocol, Union
+
+try:
+    import orjson
+except ImportError:  # Optional: only used when installed.
+    orjson = None
+
+from .lazy_section import LazySection, plain_state
+
+# Binary formats start with this header followed by the format name and a newline.
+# JSON documents never start with a NUL byte, so the two cannot be confused.
+_MAGIC = b"\x00MQISTATE "
+
+
+class CorruptStateError(ValueError):
+    """Raised when a state file cannot be decoded."""
+
+
+class IStateSerializer(Protocol):
+    """Encodes the state dict to a binary stream and back."""
+    name: str
+
+    def dump(self, state: Dict[str, Any], f: BinaryIO) -> None:
+        ...
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        ...
+
+
+class JsonSerializer:
+    """
+    Plain JSON. Compact by default; `indent` gives the older pretty-printed
+    layout. Loading uses orjson when it is installed.
+    """
+
+    def __init__(self, indent: Optional[int] = None):
+        self._indent = indent
+        self.name = "json" if indent is None else "pretty_json"
+
+    def dump(self, state: Dict[str, Any], f: BinaryIO) -> None:
+        state = plain_state(state)
+        text = io.TextIOWrapper(f, encoding="utf-8")
+        if self._indent is None:
+            json.dump(state, text, separators=(",", ":"))
+        else:
+            json.dump(state, text, indent=self._indent)
+        text.flush()
+        text.detach()
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """Compact JSON written with orjson, which is several times faster than json."""
+
+    def __init__(self):
+        super().__init__()
+        self.name = "orjson"
+
+    def dump(self, state: Dict[str, Any], f: BinaryIO) -> None:
+        f.write(orjson.dumps(plain_state(state)))
+
+
+class _BinarySerializer:
+    def __init__(self, name: str):
+        self.name = name
+        self._header = _MAGIC + name.encode() + b"\n"
+
+    def dump(self, state: Dict[str, Any], f: BinaryIO) -> None:
+        f.write(self._header)
+        f.write(self._dumps(plain_state(state)))
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        return self._loads(memoryview(data)[len(self._header):])
+
+
+class PickleSerializer(_BinarySerializer):
+    """
+    pickle protocol 5. Only for state files this process itself trusts:
+    unpickling can run arbitrary code.
+    """
+
+    def __init__(self):
+        super().__init__("pickle5")
+
+    def _dumps(self, state):
+        return pickle.dumps(state, protocol=5)
+
+    def _loads(self, data):
+        return pickle.loads(data)
+
+
+class MarshalSerializer(_BinarySerializer):
+    """
+    marshal, the fastest stdlib codec. The format may change between Python
+    versions, so a file is only guaranteed to load on the version that wrote it.
+    """
+
+    def __init__(self):
+        super().__init__("marshal")
+
+    def _dumps(self, state):
+        return marshal.dumps(state)
+
+    def _loads(self, data):
+        return marshal.loads(data)
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _is_entity_section(value: Any) -> bool:
+    if isinstance(value, LazySection):
+        return True
+    return isinstance(value, dict) and bool(value) and all(isinstance(v, dict) for v in value.values())
+
+
+class IndexedSerializer(_BinarySerializer):
+    """
+    JSON records behind an index of offsets, so a file can be opened without
+    decoding it. Sections whose values are all dicts (cases, jobs) are written
+    one entity at a time, followed by an index of their ids and lengths; other
+    top-level values are stored inline in a table at the end of the file, which
+    a fixed-width trailer points to.
+
+    `open()` reads only that table and returns the state with LazySection
+    values, whose entities are decoded on first access. Entities of a lazy
+    section that were never decoded are copied to the next file as-is.
+    """
+
+    _TRAILER = 20
+
+    def __init__(self):
+        super().__init__("indexed")
+
+    def dump(self, state: Dict[str, Any], f: BinaryIO) -> None:
+        position = f.write(self._header)
+        table: List[Any] = []
+        for key, value in state.items():
+            if not _is_entity_section(value):
+                table.append([key, "value", value])
+                continue
+            start = position
+            ids, lengths = [], []
+            for entity_id in value:
+                raw = value.raw(entity_id) if isinstance(value, LazySection) else None
+                if raw is None:
+                    raw = _dumps(value[entity_id])
+                position += f.write(raw)
+                ids.append(entity_id)
+                lengths.append(len(raw))
+            index = _dumps([ids, lengths, start])
+            table.append([key, "entities", [position, len(index)]])
+            position += f.write(index)
+        f.write(_dumps(table))
+        f.write(b"%0*d" % (self._TRAILER, position))
+
+    def open(self, buffer: Any) -> Dict[str, Any]:
+        """Returns the state in `buffer` (bytes or an mmap) without decoding its sections."""
+        end = len(buffer) - self._TRAILER
+        if end < len(self._header) or buffer[:len(self._header)] != self._header:
+            raise CorruptStateError("Truncated indexed state file")
+        try:
+            table = _loads(buffer[int(buffer[end:]):end])
+        except ValueError as e:
+            raise CorruptStateError(str(e)) from e
+        return {
+            key: LazySection(buffer, tuple(payload), _loads) if kind == "entities" else payload
+            for key, kind, payload in table
+        }
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        return plain_state(self.open(data))
+
+
+def get_serializer(name: str) -> IStateSerializer:
+    """
+    Returns a serializer by name: "json", "pretty_json", "orjson", "pickle5",
+    "marshal" or "indexed". "orjson" falls back to "json" when orjson is not
+    installed.
+    """
+    if name == "json":
+        return JsonSerializer()
+    if name == "pretty_json":
+        return JsonSerializer(indent=2)
+    if name == "orjson":
+        return OrjsonSerializer() if orjson is not None else JsonSerializer()
+    if name in ("pickle5", "pickle"):
+        return PickleSerializer()
+    if name == "marshal":
+        return MarshalSerializer()
+    if name == "indexed":
+        return IndexedSerializer()
+    raise ValueError(f"Unknown state serializer: {name}")
+
+
+def detect_serializer(data: bytes) -> IStateSerializer:
+    """Picks the serializer that wrote `data` from its header."""
+    if data.startswith(_MAGIC):
+        end = data.find(b"\n", len(_MAGIC))
+        if end < 0:
+            raise CorruptStateError("Truncated state file header")
+        try:
+            return get_serializer(data[len(_MAGIC):end].decode())
+        except (UnicodeDecodeError, ValueError) as e:
+            raise CorruptStateError(str(e)) from e
+    return JsonSerializer()
+
+
+def load_state(data: bytes) -> Any:
+    """Decodes a state file written by any of the serializers."""
+    if not data.strip():
+        raise CorruptStateError("Empty state file")
+    try:
+        return detect_serializer(data).loads(data)
+    except CorruptStateError:
+        raise
+    except Exception as e:
+        raise CorruptStateError(str(e)) from e
+
+
+def open_state(path: Path) -> Any:
+    """
+    Loads a state file written by any of the serializers. Indexed files are
+    memory-mapped and their sections decoded lazily; the mapping keeps the
+    contents readable after the file is replaced.
+    """
+    with path.open("rb") as f:
+        head = f.read(64)
+        if head.startswith(_MAGIC) and isinstance(detect_serializer(head), IndexedSerializer):
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return IndexedSerializer().open(buffer)
+            except CorruptStateError:
+                raise
+            except Exception as e:
+                raise CorruptStateError(str(e)) from e
+        data = head + f.read()
+    return load_state(data)
+
+
+def resolve_serializer(serializer: Union[str, IStateSerializer]) -> IStateSerializer:
+    return get_serializer(serializer) if isinstance(serializer, str) else serializer
@@ -0,0 +1,456 @@
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ContextManager, Iterable, Iterator, Optional
+from urllib.parse import quote, unquote
+
+from .copy_on_write import Changes, merge_changes
+from .interfaces import Durability, ITransactionContext
+from .json_state_manager import JsonStateManager, _fsync_directory
+from .serializers import CorruptStateError, load_state
+
+_MANIFEST = "manifest.json"
+_LOCK = ".lock"
+# How many generations of changed keys the manifest remembers. A process that
+# falls further behind reloads every section instead.
+_LOG_GENERATIONS = 256
+_FILE = "file"
+_ENTITIES = "entities"
+
+
+def _shard_name(key: str) -> str:
+    """Maps a state or entity key to a safe file name."""
+    return quote(key, safe="")
+
+
+class ShardedJsonStateManager(JsonStateManager):
+    """
+    A state manager that stores each top-level section of the state in its own
+    file, and the sections named in `entity_sections` as one file per entity.
+
+    Shards live in a directory next to the state file (state.json -> state.shards/).
+    A commit rewrites only the shards it changed. Each shard is written to a
+    temp file and renamed into place, so a single-shard commit is atomic on its
+    own. A commit that touches several shards first records its renames and
+    deletions in the manifest; once the manifest is written the commit counts
+    as done, and an interrupted commit is finished on the next load.
+
+    Shards are always compact JSON. An existing single-file state, in any
+    serializer format, is imported on first use and left untouched.
+
+    Sharding cuts what a commit writes, not who it waits for. Commits still
+    go through the manager-wide write lock and I/O lock of JsonStateManager,
+    since a transaction does not say up front which sections it will touch.
+    Writers to unrelated shards therefore still take turns. The turns are
+    short. The write lock only covers the in-memory copy-on-write commit.
+    When several writers are waiting for the I/O lock, the first to get it
+    writes all of their changes together.
+
+    With `multi_process=True` several processes on one host can share the
+    shards. Commits run under an exclusive `fcntl` lock on the shard directory
+    and always go through the manifest, which carries a generation counter and
+    a log of the keys each recent generation changed. Before reading, a
+    process compares the manifest's inode and mtime with what it last saw and,
+    if they differ, reloads only the shards changed since its own generation.
+    Write-behind is disabled in this mode so that other processes see every
+    commit as soon as it returns.
+    """
+
+    def __init__(
+        self,
+        state_file: Path,
+        entity_sections: Iterable[str] = (),
+        multi_process: bool = False,
+        write_behind: bool = False,
+        flush_interval: float = 0.05,
+        flush_max_commits: int = 100,
+        durability: Durability = Durability.NONE,
+    ):
+        self._shard_dir = state_file.with_suffix(".shards")
+        self._manifest_file = self._shard_dir / _MANIFEST
+        self._entity_sections = frozenset(entity_sections)
+        self._layouts: dict[str, str] = {}
+        self._generation = 0
+        self._multi_process = multi_process
+        self._lock_file = self._shard_dir / _LOCK
+        # Generations log_start onwards are fully described by the log.
+        self._log: list[list[Any]] = []
+        self._log_start = 1
+        self._manifest_stat: Optional[tuple[int, int, int]] = None
+        self._shard_dir.mkdir(parents=True, exist_ok=True)
+        super().__init__(
+            state_file,
+            write_behind=write_behind and not multi_process,
+            flush_interval=flush_interval,
+            flush_max_commits=flush_max_commits,
+            durability=durability,
+        )
+
+    # --- Paths ---
+
+    def _section_file(self, key: str) -> Path:
+        return self._shard_dir / f"{_shard_name(key)}.json"
+
+    def _entity_dir(self, key: str) -> Path:
+        return self._shard_dir / _shard_name(key)
+
+    def _entity_file(self, key: str, entity_key: str) -> Path:
+        return self._entity_dir(key) / f"{_shard_name(entity_key)}.json"
+
+    def _layout_for(self, value: Any, key: str) -> str:
+        if key in self._entity_sections and isinstance(value, dict):
+            return _ENTITIES
+        return _FILE
+
+    # --- Loading ---
+
+    def _load_state(self):
+        with self._process_lock(exclusive=True), self._lock.write(), self._io_lock:
+            manifest = self._read_manifest()
+            if manifest is None:
+                self._state = self._read_legacy_state()
+                self._layouts = {}
+                # Nothing is on disk in shard form yet: write every section.
+                self._write(self._state, {key: None for key in self._state}, fsync=True)
+                if not self._manifest_file.exists():
+                    self._write_manifest(fsync=True)
+                return
+
+            manifest = self._redo(manifest)
+            self._adopt_manifest(manifest)
+            self._state = {key: self._read_section(key, layout) for key, layout in self._layouts.items()}
+            self._remove_temp_files()
+            self._manifest_stat = self._stat_manifest()
+
+            # Move sections whose configured layout has changed since they were written.
+            relayout = {
+                key: None for key, value in self._state.items()
+                if self._layout_for(value, key) != self._layouts[key]
+            }
+            if relayout:
+                self._write(self._state, relayout, fsync=True)
+
+    def _read_manifest(self) -> Optional[dict[str, Any]]:
+        if not self._manifest_file.exists():
+            return None
+        with self._manifest_file.open("r") as f:
+            return json.load(f)
+
+    def _read_legacy_state(self) -> dict[str, Any]:
+        if not self._state_file.exists():
+            return {}
+        with self._state_file.open("rb") as f:
+            data = f.read()
+        try:
+            return load_state(data)
+        except CorruptStateError:
+            return {}
+
+    def _read_section(self, key: str, layout: str) -> Any:
+        if layout == _ENTITIES:
+            section = {}
+            entity_dir = self._entity_dir(key)
+            if entity_dir.exists():
+                for entry in os.scandir(entity_dir):
+                    if entry.name.endswith(".json"):
+                        with open(entry.path, "r") as f:
+                            section[unquote(entry.name[:-len(".json")])] = json.load(f)
+            return section
+        with self._section_file(key).open("r") as f:
+            return json.load(f)
+
+    def _adopt_manifest(self, manifest: dict[str, Any]):
+        self._generation = manifest.get("generation", 0)
+        self._layouts = dict(manifest.get("sections", {}))
+        self._log = manifest.get("log", [])
+        self._log_start = manifest.get("log_start", self._generation + 1)
+
+    def _redo(self, manifest: dict[str, Any]) -> dict[str, Any]:
+        """
+        Finishes the renames and deletions of an interrupted multi-shard commit.
+        Must be called with the exclusive process lock held. Returns the manifest
+        as it is on disk afterwards.
+        """
+        renames = manifest.get("renames", [])
+        deletes = manifest.get("deletes", [])
+        if not renames and not deletes:
+            return manifest
+        for temp_name, final_name in renames:
+            temp_path = self._shard_dir / temp_name
+            if temp_path.exists():
+                os.replace(temp_path, self._shard_dir / final_name)
+        for name in deletes:
+            self._delete(self._shard_dir / name)
+        manifest = dict(manifest, renames=[], deletes=[])
+        self._dump_manifest(manifest, fsync=True)
+        return manifest
+
+    def _remove_temp_files(self):
+        # Left behind by commits that never reached their manifest or rename.
+        for path in self._shard_dir.rglob("*.tmp"):
+            path.unlink(missing_ok=True)
+
+    # --- Sharing between processes ---
+
+    @contextmanager
+    def _process_lock(self, exclusive: bool) -> Iterator[None]:
+        """
+        Holds an advisory lock on the shard directory in multi-process mode.
+        A fresh descriptor is opened each time, so threads of the same process
+        also exclude each other.
+        """
+        if not self._multi_process:
+            yield
+            return
+        fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # Closing the descriptor releases the lock.
+            os.close(fd)
+
+    def _stat_manifest(self) -> Optional[tuple[int, int, int]]:
+        try:
+            st = os.stat(self._manifest_file)
+        except FileNotFoundError:
+            return None
+        # The manifest is replaced by a rename, so a new commit always changes the inode.
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Picks up commits made by other processes since the last refresh."""
+        if not self._multi_process or self._stat_manifest() == self._manifest_stat:
+            return
+        with self._process_lock(exclusive=False):
+            manifest = self._read_manifest()
+            interrupted = manifest.get("renames") or manifest.get("deletes")
+            if not interrupted:
+                self._reload(manifest)
+        if interrupted:
+            # A writer died mid-commit; finishing it needs the exclusive lock.
+            with self._process_lock(exclusive=True):
+                self._refresh_locked()
+
+    def _refresh_locked(self):
+        """Like _refresh, but with the exclusive process lock already held."""
+        if self._stat_manifest() == self._manifest_stat:
+            return
+        self._reload(self._redo(self._read_manifest()))
+
+    def _reload(self, manifest: dict[str, Any]):
+        """
+        Brings the in-memory state up to `manifest`, re-reading only the shards
+        changed since this process's generation. Must be called with the
+        process lock held.
+        """
+        stat = self._stat_manifest()
+        generation = manifest.get("generation", 0)
+        if generation == self._generation:
+            self._manifest_stat = stat
+            return
+
+        log_start = manifest.get("log_start", generation + 1)
+        changes: Changes = {}
+        if log_start <= self._generation + 1 and generation > self._generation:
+            for entry_generation, key, entity_keys in manifest.get("log", []):
+                if entry_generation > self._generation:
+                    merge_changes(changes, {key: None if entity_keys is None else set(entity_keys)})
+        else:
+            changes = {key: None for key in set(self._state) | set(manifest.get("sections", {}))}
+
+        layouts = manifest.get("sections", {})
+        with self._lock.write():
+            new_state = dict(self._state)
+            for key, entity_keys in changes.items():
+                layout = layouts.get(key)
+                if layout is None:
+                    new_state.pop(key, None)
+                elif entity_keys is None or layout != _ENTITIES or not isinstance(new_state.get(key), dict):
+                    new_state[key] = self._read_section(key, layout)
+                    changes[key] = None
+                else:
+                    section = dict(new_state[key])
+                    for entity_key in entity_keys:
+                        try:
+                            with self._entity_file(key, entity_key).open("r") as f:
+                                section[entity_key] = json.load(f)
+                        except FileNotFoundError:
+                            section.pop(entity_key, None)
+                    new_state[key] = section
+            with self._pending_lock:
+                self._state = new_state
+            self._adopt_manifest(manifest)
+            self._manifest_stat = stat
+        self._notify_reload(changes)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._refresh()
+        return super().get(key, default)
+
+    def set(self, key: str, value: Any):
+        if not self._multi_process:
+            return super().set(key, value)
+        with self._process_lock(exclusive=True):
+            self._refresh_locked()
+            super().set(key, value)
+
+    @contextmanager
+    def transaction(self, read_only: bool = False) -> ContextManager[ITransactionContext]:
+        """
+        As JsonStateManager.transaction. In multi-process mode a write
+        transaction holds the exclusive process lock from the moment it starts
+        until its commit is on disk, and always starts from the latest state.
+        """
+        if not self._multi_process:
+            with super().transaction(read_only) as tx:
+                yield tx
+            return
+        if read_only:
+            self._refresh()
+            with super().transaction(read_only=True) as tx:
+                yield tx
+            return
+        with self._process_lock(exclusive=True):
+            self._refresh_locked()
+            with super().transaction() as tx:
+                yield tx
+
+    # --- Persistence ---
+
+    def _persist(self, state: Optional[dict[str, Any]] = None, fsync: bool = False):
+        """
+        Rewrites every shard of the state (by default the current one).
+        Must be called with the I/O lock held.
+        """
+        state = self._state if state is None else state
+        self._write(state, {key: None for key in set(state) | set(self._layouts)}, fsync)
+
+    def _write(self, state: dict[str, Any], changes: Changes, fsync: bool):
+        renames: list[tuple[Path, Path]] = []
+        deletes: list[Path] = []
+        layouts = dict(self._layouts)
+        temp_suffix = f".{self._generation + 1}.tmp"
+
+        def stage(path: Path, value: Any):
+            temp_path = path.with_name(path.name + temp_suffix)
+            with temp_path.open("w") as f:
+                json.dump(value, f, separators=(",", ":"))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            renames.append((temp_path, path))
+
+        for key, entity_keys in changes.items():
+            old_layout = layouts.get(key)
+            if key not in state:
+                if old_layout is not None:
+                    deletes.append(self._entity_dir(key) if old_layout == _ENTITIES else self._section_file(key))
+                    del layouts[key]
+                continue
+
+            value = state[key]
+            layout = self._layout_for(value, key)
+            if old_layout is not None and old_layout != layout:
+                deletes.append(self._entity_dir(key) if old_layout == _ENTITIES else self._section_file(key))
+                entity_keys = None
+            layouts[key] = layout
+
+            if layout == _FILE:
+                stage(self._section_file(key), value)
+                continue
+
+            entity_dir = self._entity_dir(key)
+            entity_dir.mkdir(exist_ok=True)
+            if entity_keys is None:
+                entity_keys = set(value)
+                if old_layout == _ENTITIES:
+                    # Also drop entities that are on disk but no longer in the section.
+                    entity_keys |= {
+                        unquote(entry.name[:-len(".json")])
+                        for entry in os.scandir(entity_dir) if entry.name.endswith(".json")
+                    }
+            for entity_key in entity_keys:
+                path = self._entity_file(key, entity_key)
+                if entity_key in value:
+                    stage(path, value[entity_key])
+                else:
+                    deletes.append(path)
+
+        if not renames and not deletes and layouts == self._layouts:
+            return
+
+        multi_shard = (
+            self._multi_process or len(renames) + len(deletes) > 1 or layouts != self._layouts
+        )
+        self._generation += 1
+        if self._multi_process:
+            for key, entity_keys in changes.items():
+                logged_keys = sorted(entity_keys) if entity_keys is not None and layouts.get(key) == _ENTITIES else None
+                self._log.append([self._generation, key, logged_keys])
+            self._log_start = max(self._log_start, self._generation - _LOG_GENERATIONS + 1)
+            self._log = [entry for entry in self._log if entry[0] >= self._log_start]
+        if multi_shard:
+            if fsync:
+                for directory in {temp_path.parent for temp_path, _ in renames}:
+                    _fsync_directory(directory)
+            # The manifest is the commit point for a multi-shard commit.
+            self._layouts = layouts
+            self._write_manifest(renames, deletes, fsync)
+
+        for temp_path, path in renames:
+            os.replace(temp_path, path)
+        for path in deletes:
+            self._delete(path)
+        if fsync:
+            for directory in {path.parent for _, path in renames} | {path.parent for path in deletes}:
+                if directory.exists():
+                    _fsync_directory(directory)
+
+        if multi_shard:
+            self._write_manifest(fsync=fsync)
+
+    def _write_manifest(
+        self,
+        renames: Iterable[tuple[Path, Path]] = (),
+        deletes: Iterable[Path] = (),
+        fsync: bool = False,
+    ):
+        if not self._multi_process:
+            # Single-shard commits skip the manifest, so the log would be incomplete.
+            self._log = []
+            self._log_start = self._generation + 1
+        self._dump_manifest({
+            "generation": self._generation,
+            "sections": self._layouts,
+            "renames": [
+                [str(temp_path.relative_to(self._shard_dir)), str(path.relative_to(self._shard_dir))]
+                for temp_path, path in renames
+            ],
+            "deletes": [str(path.relative_to(self._shard_dir)) for path in deletes],
+            "log_start": self._log_start,
+            "log": self._log,
+        }, fsync)
+
+    def _dump_manifest(self, manifest: dict[str, Any], fsync: bool):
+        temp_file_path = self._manifest_file.with_name(_MANIFEST + ".tmp")
+        with temp_file_path.open("w") as f:
+            json.dump(manifest, f, indent=2)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(temp_file_path, self._manifest_file)
+        if fsync:
+            _fsync_directory(self._shard_dir)
+        # Our own commits need not be reloaded.
+        self._manifest_stat = self._stat_manifest()
+
+    @staticmethod
+    def _delete(path: Path):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,115 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Any, ContextManager, Iterable, Iterator
+import copy
+
+from .interfaces import IStateManager, ITransactionContext
+from .copy_on_write import CopyOnWriteState
+
+class SqliteStateManager(IStateManager):
+    """
+    A thread-safe, transactional state manager backed by a SQLite database.
+
+    Generic keys are stored one row per top-level key in a key-value table.
+    Repositories that need one row per entity can create their own tables and
+    run statements through `connection()`, which shares this manager's lock
+    and database connection.
+    """
+
+    def __init__(self, db_file: Path):
+        self._db_file = db_file
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._state: dict[str, Any] = {}
+        self._load_state()
+
+    def _load_state(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv").fetchall()
+            self._state = {key: json.loads(value) for key, value in rows}
+
+    @contextmanager
+    def connection(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Provides the database connection under the manager's lock.
+        With write=True, the statements run in one transaction that is committed
+        when the context exits, or rolled back if it raises.
+        """
+        with self._lock:
+            if not write:
+                yield self._conn
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return copy.deepcopy(self._state.get(key, default))
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            new_state = dict(self._state)
+            new_state[key] = value
+            self._commit(new_state, {key})
+
+    def _commit(self, new_state: dict[str, Any], keys: Iterable[str]):
+        with self.connection(write=True) as conn:
+            for key in keys:
+                if key in new_state:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                        (key, json.dumps(new_state[key], separators=(",", ":"))),
+                    )
+                else:
+                    conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+        self._state = new_state
+
+    @contextmanager
+    def transaction(self, read_only: bool = False) -> ContextManager[ITransactionContext]:
+        """
+        Provides a transactional context for state modifications.
+        Touched top-level keys are written back in a single SQLite transaction.
+        """
+        with self._lock:
+            if read_only:
+                snapshot = MappingProxyType(self._state)
+
+                class ReadOnlyTransactionContext(ITransactionContext):
+                    def get_state(self) -> dict[str, Any]:
+                        return snapshot
+
+                yield ReadOnlyTransactionContext()
+                return
+
+            temp_state = CopyOnWriteState(self._state)
+
+            class TransactionContext(ITransactionContext):
+                def get_state(self) -> dict[str, Any]:
+                    return temp_state
+
+            yield TransactionContext()
+            new_state, changes = temp_state.commit()
+            if changes:
+                self._commit(new_state, changes)
+
+    def flush(self):
+        """Commits are written to the database before they return, so there is nothing to flush."""
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
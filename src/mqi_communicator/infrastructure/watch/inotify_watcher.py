@@ -0,0 +1,136 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Sequence, Union
+
+from .interfaces import DirectoryEvents, IDirectoryWatcher
+
+# From <sys/inotify.h>
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def inotify_available() -> bool:
+    """Returns True if this platform's C library provides inotify."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        return hasattr(_load_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+
+class InotifyWatcher(IDirectoryWatcher):
+    """
+    Watches directories for new subdirectories with Linux inotify, called
+    through ctypes so no extra package is needed. All directories share one
+    inotify instance, so a single `read_events` waits on every one of them.
+
+    The kernel queue is bounded; when it overflows, every directory is reported
+    as `overflowed`, and when a watched directory itself is removed or moved,
+    that directory is. The caller must then fall back to listing it. A lost
+    watch is re-added on the next read once the directory exists again.
+    """
+
+    def __init__(self, paths: Union[str, Sequence[str]]):
+        self._paths = [paths] if isinstance(paths, str) else list(paths)
+        libc = _load_libc()
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+        self._watches: Dict[int, str] = {}
+        for path in self._paths:
+            self._add_watch(path)
+
+    def _add_watch(self, path: str) -> bool:
+        wd = _load_libc().inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            raise OSError(error, os.strerror(error), path)
+        self._watches[wd] = path
+        return True
+
+    def read_events(self, timeout: float) -> DirectoryEvents:
+        events = DirectoryEvents()
+        watched = set(self._watches.values())
+        for path in self._paths:
+            if path not in watched and self._add_watch(path):
+                # Anything created while the watch was missing is only found by a listing.
+                events.overflowed.append(path)
+        if events.overflowed:
+            return events
+        if not self._watches:
+            time.sleep(timeout)
+            return events
+        if not self._poll.poll(int(timeout * 1000)):
+            return events
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            self._parse(data, events)
+        return events
+
+    def _parse(self, data: bytes, events: DirectoryEvents) -> None:
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            path = self._watches.get(wd)
+            if mask & IN_Q_OVERFLOW:
+                events.overflowed.extend(p for p in self._paths if p not in events.overflowed)
+            elif path is None:
+                # Left over from a watch that has since been replaced.
+                continue
+            elif mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                if mask & IN_MOVE_SELF:
+                    # The watch follows the moved directory; drop it and watch the path again.
+                    _load_libc().inotify_rm_watch(self._fd, wd)
+                if mask & (IN_IGNORED | IN_MOVE_SELF):
+                    del self._watches[wd]
+                if path not in events.overflowed:
+                    events.overflowed.append(path)
+            elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                events.created.append((path, os.fsdecode(name)))
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
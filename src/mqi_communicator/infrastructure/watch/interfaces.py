@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from typing import List, Protocol, Tuple
+
+
+@dataclass
+class DirectoryEvents:
+    """
+    What a watcher saw in its directories. `created` holds (watched directory,
+    name) pairs; `overflowed` lists the watched directories whose events may
+    have been lost, so they have to be listed to catch up.
+    """
+    created: List[Tuple[str, str]] = field(default_factory=list)
+    overflowed: List[str] = field(default_factory=list)
+
+
+class IDirectoryWatcher(Protocol):
+    """
+    Reports subdirectories created in (or moved into) a set of directories.
+    """
+    def read_events(self, timeout: float) -> DirectoryEvents:
+        """Waits up to `timeout` seconds for events and returns all that are pending."""
+        ...
+
+    def close(self) -> None:
+        """Stops watching and releases the underlying resources."""
+        ...
@@ -0,0 +1,150 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Files at least this large are hashed through mmap instead of being read into memory.
+MMAP_THRESHOLD = 4 * 1024 * 1024
+_CHUNK_SIZE = 8 * 1024 * 1024
+_DIGEST_SIZE = 16
+
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: str, size: int) -> str:
+    """Returns the BLAKE2b digest of a file's contents as hex."""
+    digest = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    if size == 0:
+        return digest.hexdigest()
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    # hashlib releases the GIL for large updates, so files hash in parallel.
+                    for start in range(0, len(view), _CHUNK_SIZE):
+                        digest.update(view[start:start + _CHUNK_SIZE])
+                finally:
+                    view.release()
+        else:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def walk_files(root: str) -> List[Tuple[str, str, int, int]]:
+    """Returns (relative path, absolute path, size, mtime_ns) for every file under `root`."""
+    files = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        relative = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                        files.append((relative, entry.path, stat.st_size, stat.st_mtime_ns))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    files.sort()
+    return files
+
+
+class ManifestBuilder:
+    """
+    Builds content manifests of case directories: the path, size, mtime and
+    BLAKE2b hash of every file, plus a digest over all of them that changes
+    whenever any file does.
+
+    Files are hashed on a shared, bounded thread pool, large ones through mmap.
+    A hash is reused without reading the file while its size and mtime are
+    unchanged, either from this builder's cache or from the previous manifest
+    passed to `build`, which keeps reuse working across restarts.
+    """
+
+    def __init__(self, max_workers: int = 4, cache_size: int = 100_000):
+        self._max_workers = max_workers
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hashed_files = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="manifest"
+                )
+            return self._executor
+
+    def _cached(self, path: str, size: int, mtime_ns: int) -> Optional[str]:
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+                self._cache.move_to_end(path)
+                return entry[2]
+        return None
+
+    def _remember(self, path: str, size: int, mtime_ns: int, digest: str) -> None:
+        with self._lock:
+            self._cache[path] = (size, mtime_ns, digest)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def build(self, root: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Returns the manifest of the directory `root`. Files that disappear while
+        the manifest is built are left out.
+        """
+        known = (previous or {}).get("files", {})
+        entries: Dict[str, Dict[str, Any]] = {}
+        pending = []
+        for relative, path, size, mtime_ns in walk_files(root):
+            digest = self._cached(path, size, mtime_ns)
+            old = known.get(relative)
+            if digest is None and old and old["size"] == size and old["mtime_ns"] == mtime_ns:
+                digest = old["blake2b"]
+                self._remember(path, size, mtime_ns, digest)
+            if digest is None:
+                pending.append((relative, path, size, mtime_ns, self._pool().submit(hash_file, path, size)))
+            else:
+                entries[relative] = {"size": size, "mtime_ns": mtime_ns, "blake2b": digest}
+
+        for relative, path, size, mtime_ns, future in pending:
+            try:
+                digest = future.result()
+            except FileNotFoundError:
+                continue
+            self.hashed_files += 1
+            self._remember(path, size, mtime_ns, digest)
+            entries[relative] = {"size": size, "mtime_ns": mtime_ns, "blake2b": digest}
+
+        total = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+        for relative in sorted(entries):
+            entry = entries[relative]
+            total.update(f"{relative}\0{entry['size']}\0{entry['blake2b']}\n".encode())
+        return {
+            "version": MANIFEST_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "file_count": len(entries),
+            "total_size": sum(entry["size"] for entry in entries.values()),
+            "digest": total.hexdigest(),
+            "files": {relative: entries[relative] for relative in sorted(entries)},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
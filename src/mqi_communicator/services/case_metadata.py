@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from .case_manifest import walk_files
+
+
+class CaseDirectory:
+    """
+    The directory of one case as seen by metadata extractors. It is listed
+    once, on first use, and the listing is shared by every extractor.
+    """
+
+    def __init__(self, case_id: str, path: str):
+        self.case_id = case_id
+        self.path = path
+        self._files: Optional[List[Tuple[str, str, int, int]]] = None
+
+    @property
+    def files(self) -> List[Tuple[str, str, int, int]]:
+        """(relative path, absolute path, size, mtime_ns) of every file, sorted by path."""
+        if self._files is None:
+            self._files = walk_files(self.path)
+        return self._files
+
+    def read_head(self, relative: str, size: int) -> bytes:
+        """Returns up to `size` bytes from the start of a file."""
+        with open(os.path.join(self.path, relative), "rb") as f:
+            return f.read(size)
+
+
+class IMetadataExtractor(Protocol):
+    """
+    Infers some metadata of a case from its directory. Returns only the keys it
+    could determine.
+    """
+    def extract(self, directory: CaseDirectory) -> Dict[str, Any]:
+        ...
+
+
+class FileStatsExtractor(IMetadataExtractor):
+    """Counts the files of a case and their total size."""
+
+    def extract(self, directory: CaseDirectory) -> Dict[str, Any]:
+        return {
+            "file_count": len(directory.files),
+            "total_size": sum(size for _, _, size, _ in directory.files),
+        }
+
+
+class BeamCountExtractor(IMetadataExtractor):
+    """
+    Counts the distinct beam numbers in file and directory names such as
+    "Beam01/" or "beam_2_spots.log". Without any, each top-level subdirectory
+    is taken to hold one beam.
+    """
+
+    def __init__(self, pattern: str = r"(?i)(?<![a-z])beam[ _-]?0*(\d+)"):
+        self._pattern = re.compile(pattern)
+
+    def extract(self, directory: CaseDirectory) -> Dict[str, Any]:
+        beams = set()
+        for relative, _, _, _ in directory.files:
+            for part in relative.split("/"):
+                match = self._pattern.search(part)
+                if match:
+                    beams.add(int(match.group(1)))
+        if beams:
+            return {"beam_count": len(beams)}
+        subdirectories = {relative.split("/", 1)[0] for relative, _, _, _ in directory.files if "/" in relative}
+        return {"beam_count": len(subdirectories)} if subdirectories else {}
+
+
+# A date such as 2024-01-15, 2024/01/15 or 20240115, with the same separator throughout.
+_DATE = re.compile(rb"(20\d{2})([-/.]?)(0[1-9]|1[0-2])\2(0[1-9]|[12]\d|3[01])")
+
+
+class TreatmentDateExtractor(IMetadataExtractor):
+    """
+    Finds the treatment date in the headers of the first few log files, falling
+    back to the date of the oldest file.
+    """
+
+    def __init__(self, suffixes: Sequence[str] = (".log", ".txt"), max_files: int = 5, header_bytes: int = 4096):
+        self._suffixes = tuple(suffixes)
+        self._max_files = max_files
+        self._header_bytes = header_bytes
+
+    def extract(self, directory: CaseDirectory) -> Dict[str, Any]:
+        logs = [relative for relative, _, _, _ in directory.files if relative.lower().endswith(self._suffixes)]
+        for relative in logs[:self._max_files]:
+            try:
+                match = _DATE.search(directory.read_head(relative, self._header_bytes))
+            except OSError:
+                continue
+            if match:
+                try:
+                    found = date(int(match.group(1)), int(match.group(3)), int(match.group(4)))
+                except ValueError:
+                    continue
+                return {"treatment_date": found.isoformat()}
+        if not directory.files:
+            return {}
+        oldest = min(mtime_ns for _, _, _, mtime_ns in directory.files)
+        return {"treatment_date": datetime.fromtimestamp(oldest / 1e9).date().isoformat()}
+
+
+def default_extractors() -> List[IMetadataExtractor]:
+    return [FileStatsExtractor(), BeamCountExtractor(), TreatmentDateExtractor()]
+
+
+class CaseMetadataPipeline:
+    """
+    Runs metadata extractors over case directories on a bounded thread pool.
+
+    `submit` starts an extraction in the background so discovery does not wait
+    for it; finished results are collected with `take_completed`, `poll`
+    looks at one without waiting, and `result` waits for (or runs) the
+    extraction of one case when its metadata is needed right away. An extractor that fails is skipped; the
+    others still contribute.
+    """
+
+    def __init__(self, extractors: Optional[Sequence[IMetadataExtractor]] = None, max_workers: int = 2):
+        self._extractors = list(extractors) if extractors is not None else default_extractors()
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def extract(self, case_id: str, path: str) -> Dict[str, Any]:
+        """Runs every extractor in the calling thread."""
+        directory = CaseDirectory(case_id, path)
+        metadata: Dict[str, Any] = {}
+        for extractor in self._extractors:
+            try:
+                metadata.update(extractor.extract(directory))
+            except Exception:
+                # Log the failing extractor and keep what the others found.
+                pass
+        return metadata
+
+    def submit(self, case_id: str, path: str) -> Future:
+        """Schedules an extraction unless one is already running for the case."""
+        with self._lock:
+            future = self._in_flight.get(case_id)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._max_workers, thread_name_prefix="case-metadata"
+                    )
+                future = self._in_flight[case_id] = self._executor.submit(self.extract, case_id, path)
+            return future
+
+    def result(self, case_id: str, path: str) -> Dict[str, Any]:
+        """Returns the metadata of a case, waiting for a running extraction if there is one."""
+        with self._lock:
+            future = self._in_flight.pop(case_id, None)
+        if future is not None:
+            return future.result()
+        return self.extract(case_id, path)
+
+    def poll(self, case_id: str, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the metadata of a case if its extraction has finished, leaving
+        it for `take_completed`. Otherwise returns None, starting the
+        extraction if none is running.
+        """
+        future = self.submit(case_id, path)
+        return future.result() if future.done() else None
+
+    def take_completed(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the results of finished background extractions, each only once."""
+        with self._lock:
+            done = {case_id: future for case_id, future in self._in_flight.items() if future.done()}
+            for case_id in done:
+                del self._in_flight[case_id]
+        return {case_id: future.result() for case_id, future in done.items()}
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .case_service import FileSystem
+
+# (file count, total size, newest mtime in ns) of everything under a case directory.
+Fingerprint = Tuple[int, int, int]
+
+
+class _Pending:
+    __slots__ = ("path", "fingerprint", "due")
+
+    def __init__(self, path: str, due: float):
+        self.path = path
+        self.fingerprint: Optional[Fingerprint] = None
+        self.due = due
+
+
+class CaseReadinessTracker:
+    """
+    Holds back newly found case directories until they are completely written.
+
+    A case is ready once `marker_file` exists in its directory, or once its
+    fingerprint (file count, total size and newest mtime) has not changed for
+    `quiet_period` seconds. With `quiet_period=None` only the marker counts.
+
+    A pending case is only walked when its quiet period is due, i.e. about once
+    per period rather than on every poll, so hundreds of cases can be pending
+    at once. Time is measured with the local monotonic clock; file mtimes are
+    only compared with each other, so clock skew on a network share does not
+    matter.
+    """
+
+    def __init__(
+        self,
+        file_system: "FileSystem",
+        scan_path: str,
+        quiet_period: Optional[float],
+        marker_file: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._fs = file_system
+        self._scan_path = scan_path
+        self._quiet_period = quiet_period
+        self._marker_file = marker_file
+        self._clock = clock
+        self._pending: Dict[str, _Pending] = {}
+        self._lock = threading.Lock()
+
+    def track(self, case_ids: Iterable[str], scan_path: Optional[str] = None) -> None:
+        """
+        Starts tracking case directories under `scan_path` (by default the
+        tracker's own); ones already pending are left as they are.
+        """
+        now = self._clock()
+        scan_path = scan_path or self._scan_path
+        with self._lock:
+            for case_id in case_ids:
+                if case_id not in self._pending:
+                    self._pending[case_id] = _Pending(os.path.join(scan_path, case_id), due=now)
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            return list(self._pending)
+
+    def poll(self) -> List[str]:
+        """
+        Returns the cases that have become ready and stops tracking them.
+        Cases whose directory has disappeared are dropped.
+        """
+        ready = []
+        with self._lock:
+            for case_id, pending in list(self._pending.items()):
+                path = pending.path
+                if self._marker_file and self._fs.exists(os.path.join(path, self._marker_file)):
+                    ready.append(case_id)
+                    del self._pending[case_id]
+                    continue
+                if self._quiet_period is None:
+                    if not self._fs.exists(path):
+                        del self._pending[case_id]
+                    continue
+                now = self._clock()
+                if now < pending.due:
+                    continue
+                fingerprint = self._fs.fingerprint(path)
+                if fingerprint is None:
+                    del self._pending[case_id]
+                elif fingerprint == pending.fingerprint or self._quiet_period <= 0:
+                    ready.append(case_id)
+                    del self._pending[case_id]
+                else:
+                    # New or still changing: check again once a full quiet period has passed.
+                    pending.fingerprint = fingerprint
+                    pending.due = now + self._quiet_period
+        return ready
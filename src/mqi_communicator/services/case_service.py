@@ -1,9 +1,18 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Set
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import datetime
 
 from mqi_communicator.domain.models import Case, CaseStatus
-from mqi_communicator.domain.repositories.interfaces import ICaseRepository
+from mqi_communicator.domain.repositories.interfaces import ICaseArchive, ICaseRepository
+from mqi_communicator.infrastructure.watch.interfaces import IDirectoryWatcher
+from .case_manifest import ManifestBuilder
+from .case_metadata import CaseMetadataPipeline
+from .case_readiness import CaseReadinessTracker, Fingerprint
 from .interfaces import ICaseService
 
 # A simple file system abstraction could be made for this
@@ -11,48 +20,453 @@ from .interfaces import ICaseService
 class FileSystem:
     def list_directories(self, path: str) -> List[str]:
         """Returns a list of directory names in the given path."""
+        # scandir reports the entry type from the directory listing itself,
+        # so no extra stat is needed per entry on most file systems.
         try:
-            return [d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d))]
+            with os.scandir(path) as entries:
+                return [entry.name for entry in entries if entry.is_dir()]
         except FileNotFoundError:
             return []
 
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def fingerprint(self, path: str) -> Optional[Fingerprint]:
+        """
+        Returns (file count, total size, newest mtime in ns) for everything
+        under a directory, or None if it is missing.
+        """
+        files = size = newest = 0
+        stack = [path]
+        try:
+            newest = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        newest = max(newest, stat.st_mtime_ns)
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            files += 1
+                            size += stat.st_size
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return files, size, newest
+
+    def directory_mtime(self, path: str) -> Optional[int]:
+        """Returns the modification time of a directory in nanoseconds, or None if it is missing."""
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+# Directory mtimes can be as coarse as one second (e.g. on NFS), so an entry added
+# just after a listing may leave the mtime unchanged. An mtime is only trusted as a
+# watermark if it was already this old when the directory was listed.
+_MTIME_SLACK_NS = 2_000_000_000
+
+@dataclass(frozen=True)
+class ScanRoot:
+    """
+    A directory new cases are found in, e.g. the log share of one treatment
+    room. It is listed at most every `scan_interval` seconds (None: on every
+    scan). New cases from a root with a higher `priority` are returned first;
+    among roots of equal priority they are interleaved in proportion to
+    `weight`, so a backlog in one room does not hold up the others.
+    """
+    path: str
+    name: Optional[str] = None
+    weight: float = 1.0
+    scan_interval: Optional[float] = None
+    priority: int = 1
+
+    def __post_init__(self):
+        if self.weight <= 0:
+            raise ValueError(f"Scan root {self.path} needs a positive weight, got {self.weight}")
+
+
+class _RootState:
+    """
+    Scan bookkeeping of one root. The watermark is only written by the listing
+    of this root, and only one listing per root runs at a time.
+    """
+    __slots__ = ("root", "watermark", "listed_at", "listing")
+
+    def __init__(self, root: ScanRoot):
+        self.root = root
+        self.watermark: Optional[int] = None
+        self.listed_at: Optional[float] = None
+        self.listing: Optional[Future] = None
+
+    def due(self, now: float) -> bool:
+        interval = self.root.scan_interval
+        return self.listed_at is None or not interval or now - self.listed_at >= interval
+
+
+def interleave_by_root(found: Dict[ScanRoot, List[str]]) -> List[str]:
+    """
+    Merges the case IDs found per root: higher priority roots first, roots of
+    equal priority interleaved by weight (smooth weighted round-robin).
+    """
+    merged: List[str] = []
+    for priority in sorted({root.priority for root in found}, reverse=True):
+        queues = {root: deque(ids) for root, ids in found.items() if root.priority == priority and ids}
+        credit = {root: 0.0 for root in queues}
+        while queues:
+            total = sum(root.weight for root in queues)
+            for root in queues:
+                credit[root] += root.weight
+            root = max(queues, key=credit.__getitem__)
+            credit[root] -= total
+            merged.append(queues[root].popleft())
+            if not queues[root]:
+                del queues[root]
+    return merged
+
+
 class CaseService(ICaseService):
     """
     Handles business logic related to Cases.
+
+    Cases are found in one or more scan roots (`scan_path`, or `scan_roots`
+    with a weight, interval and priority each). A directory name found in
+    several roots is one case, registered from the root it was seen in first.
+
+    Scanning is incremental: a root is only listed again once its mtime has
+    moved past the last listing's watermark, and new directories are found
+    against an in-memory set of known case IDs that is loaded from the
+    repository once and kept up to date by `register_cases`. As other
+    processes sharing the state may register cases too, the repository has
+    the final say: found IDs it already holds are not saved again. Several roots are
+    listed concurrently on a pool of `max_scan_workers` threads, and a scan
+    waits at most `scan_timeout` seconds for them: a root that is slower (e.g.
+    a hanging network mount) keeps being listed in the background, and its
+    cases are registered by a later scan without delaying the other roots.
+
+    With a `watcher`, `watch_for_new_cases` registers case directories as soon
+    as they are created. Scanning then only reconciles: it catches anything the
+    watcher missed, and a watcher overflow triggers a full listing right away.
+
+    With a `readiness` tracker, found directories are only registered once
+    the tracker reports them as completely written; until then they are
+    polled on every scan or watcher wake-up.
+
+    `build_manifest` records what a case directory contains in
+    `Case.metadata["manifest"]`; see ManifestBuilder.
+
+    With a `metadata_pipeline`, every registered case has its beam count, size,
+    file count and treatment date extracted in the background. Results are
+    saved to the case record (`beam_count` and `metadata["extracted"]`) on the
+    next scan, or right away by `extract_metadata` when they are needed sooner.
+    `beam_counts` reports them without waiting or saving, for the scheduler.
+
+    Directories of cases in the `archive` are not registered again, although
+    archiving removed them from the case repository.
     """
-    def __init__(self, case_repository: ICaseRepository, file_system: FileSystem, scan_path: str):
+    def __init__(
+        self,
+        case_repository: ICaseRepository,
+        file_system: FileSystem,
+        scan_path: Optional[str] = None,
+        watcher: Optional[IDirectoryWatcher] = None,
+        readiness: Optional[CaseReadinessTracker] = None,
+        manifest_builder: Optional[ManifestBuilder] = None,
+        metadata_pipeline: Optional[CaseMetadataPipeline] = None,
+        scan_roots: Optional[Sequence[ScanRoot]] = None,
+        max_scan_workers: int = 4,
+        scan_timeout: float = 5.0,
+        archive: Optional[ICaseArchive] = None,
+    ):
+        roots = list(scan_roots) if scan_roots else [ScanRoot(scan_path)] if scan_path else []
+        if not roots:
+            raise ValueError("CaseService needs a scan_path or at least one scan root")
         self._repo = case_repository
         self._fs = file_system
-        self._scan_path = scan_path
+        self._roots = [_RootState(root) for root in roots]
+        self._roots_by_path = {root.path: root for root in roots}
+        self._watcher = watcher
+        self._readiness = readiness
+        self._manifest_builder = manifest_builder or ManifestBuilder()
+        self._metadata = metadata_pipeline
+        # Runs `extract_metadata` when no pipeline extracts in the background.
+        self._on_demand_metadata: Optional[CaseMetadataPipeline] = None
+        self._max_scan_workers = max_scan_workers
+        self._scan_timeout = scan_timeout
+        self._archive = archive
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._known_case_ids: Optional[Set[str]] = None
+        # Root of each case that was found but is not registered yet.
+        self._pending_roots: Dict[str, ScanRoot] = {}
+        # Scans and watcher events may come from different threads.
+        self._scan_lock = threading.RLock()
+
+    @property
+    def scan_roots(self) -> List[ScanRoot]:
+        return [state.root for state in self._roots]
 
     def scan_for_new_cases(self) -> List[str]:
         """
-        Scans the source directory for new cases and registers them.
-        Returns a list of newly found case IDs.
+        Lists the scan roots that are due and registers the new cases in them.
+        Returns the newly found case IDs, ordered by root priority and weight.
         """
-        found_dirs = self._fs.list_directories(self._scan_path)
-        existing_case_ids = set(self._repo.get_all_case_ids())
+        self._save_extracted_metadata()
+        with self._scan_lock:
+            now = time.monotonic()
+            for state in self._roots:
+                if state.listing is None and state.due(now):
+                    state.listed_at = now
+                    state.listing = self._start_listing(state)
+            listings = [state.listing for state in self._roots if state.listing is not None]
+        if listings:
+            wait(listings, timeout=self._scan_timeout)
+        with self._scan_lock:
+            found: Dict[ScanRoot, List[str]] = {}
+            for state in self._roots:
+                listing = state.listing
+                if listing is None or not listing.done():
+                    continue
+                state.listing = None
+                try:
+                    dir_names = listing.result()
+                except OSError:
+                    # Log that the root could not be listed; it is tried again when next due.
+                    continue
+                if dir_names is not None:
+                    found[state.root] = dir_names
+            if not found and self._readiness is None:
+                return []
+            # Even with nothing listed, pending cases may have become ready.
+            return self._register_new(found)
+
+    def _start_listing(self, state: _RootState) -> Future:
+        if len(self._roots) == 1:
+            # Nothing to overlap with, so the one root is listed in the calling thread.
+            future: Future = Future()
+            try:
+                future.set_result(self._list_root(state))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=min(self._max_scan_workers, len(self._roots)),
+                thread_name_prefix="case-scan",
+            )
+        return self._executor.submit(self._list_root, state)
 
-        new_case_ids = [dir_name for dir_name in found_dirs if dir_name not in existing_case_ids]
+    def _list_root(self, state: _RootState) -> Optional[List[str]]:
+        """Lists a root, or returns None if its mtime shows that nothing has changed."""
+        path = state.root.path
+        mtime = self._fs.directory_mtime(path)
+        if mtime is not None and mtime == state.watermark:
+            return None
+        listed_at = time.time_ns()
+        dir_names = self._fs.list_directories(path)
+        settled = mtime is not None and listed_at - mtime >= _MTIME_SLACK_NS
+        state.watermark = mtime if settled else None
+        return dir_names
 
-        for case_id in new_case_ids:
-            now = datetime.utcnow()
-            new_case = Case(
+    def watch_for_new_cases(self, timeout: float) -> Optional[List[str]]:
+        """
+        Waits up to `timeout` seconds for new case directories, registers them
+        and returns their IDs. Returns None if there is no watcher.
+        """
+        if self._watcher is None:
+            return None
+        events = self._watcher.read_events(timeout)
+        found: Dict[ScanRoot, List[str]] = {}
+        for directory, dir_name in events.created:
+            root = self._roots_by_path.get(directory)
+            if root is not None:
+                found.setdefault(root, []).append(dir_name)
+        if events.overflowed:
+            with self._scan_lock:
+                # Events were lost, so these roots have to be listed.
+                for state in self._roots:
+                    if state.root.path in events.overflowed:
+                        state.watermark = None
+                        state.listed_at = None
+                new_case_ids = self._register_new(found) if found else []
+            return new_case_ids + self.scan_for_new_cases()
+        if not found and self._readiness is None:
+            return []
+        return self._register_new(found)
+
+    def _register_new(self, found: Dict[ScanRoot, List[str]]) -> List[str]:
+        with self._scan_lock:
+            known_case_ids = self._known_ids()
+            new_by_root: Dict[ScanRoot, List[str]] = {}
+            for root, dir_names in found.items():
+                for dir_name in dir_names:
+                    if dir_name in known_case_ids or self._is_archived(dir_name):
+                        continue
+                    if self._pending_roots.setdefault(dir_name, root) == root:
+                        new_by_root.setdefault(root, []).append(dir_name)
+            if self._readiness is not None:
+                for root, case_ids in new_by_root.items():
+                    self._readiness.track(case_ids, root.path)
+                new_by_root = {}
+                for case_id in self._readiness.poll():
+                    root = self._pending_roots.get(case_id, self._roots[0].root)
+                    new_by_root.setdefault(root, []).append(case_id)
+                still_pending = set(self._readiness.pending())
+                for case_id in [case_id for case_id in self._pending_roots if case_id not in still_pending]:
+                    del self._pending_roots[case_id]
+            else:
+                self._pending_roots.clear()
+            saved = {case.case_id for case in self._save_new_cases(new_by_root)}
+            return [case_id for case_id in interleave_by_root(new_by_root) if case_id in saved]
+
+    def _is_archived(self, case_id: str) -> bool:
+        # Archived cases have left the case repository but are not new work.
+        return self._archive is not None and self._archive.contains(case_id)
+
+    def _known_ids(self) -> Set[str]:
+        if self._known_case_ids is None:
+            self._known_case_ids = set(self._repo.get_all_case_ids())
+        return self._known_case_ids
+
+    def register_cases(self, case_ids: List[str], root: Optional[ScanRoot] = None) -> List[Case]:
+        """
+        Creates a NEW case for each ID, found in `root` (by default the first
+        scan root), and saves them all in one transaction. Returns the created cases.
+        """
+        return self._save_new_cases({root or self._roots[0].root: case_ids})
+
+    def _save_new_cases(self, case_ids_by_root: Dict[ScanRoot, List[str]]) -> List[Case]:
+        candidates = [case_id for case_ids in case_ids_by_root.values() for case_id in case_ids]
+        if not candidates:
+            return []
+        # Registered by another process since the known IDs were loaded; saving
+        # them again would reset their progress.
+        registered = {case.case_id for case in self._repo.get_many(candidates)}
+        if registered and self._known_case_ids is not None:
+            self._known_case_ids.update(registered)
+        now = datetime.utcnow()
+        new_cases = [
+            Case(
                 case_id=case_id,
                 status=CaseStatus.NEW,
-                beam_count=0, # This might be determined later
+                beam_count=0, # Filled in by metadata extraction
                 created_at=now,
                 updated_at=now,
-                metadata={}
+                metadata={"scan_root": root.path}
             )
-            self._repo.save(new_case)
+            for root, case_ids in case_ids_by_root.items()
+            for case_id in case_ids
+            if case_id not in registered
+        ]
+        if new_cases:
+            self._repo.save_many(new_cases)
+            if self._known_case_ids is not None:
+                self._known_case_ids.update(case.case_id for case in new_cases)
+            if self._metadata is not None:
+                for case in new_cases:
+                    self._metadata.submit(case.case_id, self._case_path(case))
+        return new_cases
+
+    def _case_path(self, case: Case) -> str:
+        root_path = case.metadata.get("scan_root") or self._roots[0].root.path
+        return os.path.join(root_path, case.case_id)
+
+    def _save_extracted_metadata(self) -> None:
+        if self._metadata is None:
+            return
+        completed = self._metadata.take_completed()
+        if not completed:
+            return
+        cases = [
+            case for case in self._repo.get_many(list(completed))
+            if "extracted" not in case.metadata
+        ]
+        for case in cases:
+            self._apply_metadata(case, completed[case.case_id])
+        if cases:
+            self._repo.save_many(cases)
+
+    @staticmethod
+    def _apply_metadata(case: Case, extracted: Dict[str, Any]) -> None:
+        case.metadata["extracted"] = dict(extracted, extracted_at=datetime.utcnow().isoformat())
+        if "beam_count" in extracted:
+            case.beam_count = extracted["beam_count"]
+        case.updated_at = datetime.utcnow()
+
+    def beam_counts(self, case_ids: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Returns the beam count of each known case without waiting: the saved
+        one, or the one a finished background extraction found. A case whose
+        extraction is still running maps to None. Nothing is saved here;
+        finished extractions are saved by the next scan.
+        """
+        counts: Dict[str, Optional[int]] = {}
+        for case in self._repo.get_many(case_ids):
+            if "extracted" in case.metadata or self._metadata is None:
+                counts[case.case_id] = case.beam_count
+                continue
+            extracted = self._metadata.poll(case.case_id, self._case_path(case))
+            counts[case.case_id] = None if extracted is None else extracted.get("beam_count", 0)
+        return counts
 
-        return new_case_ids
+    def extract_metadata(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the extracted metadata of a case, waiting for or running the
+        extraction if it has not been saved yet. Returns None for an unknown case.
+        """
+        case = self._repo.get(case_id)
+        if case is None:
+            return None
+        if "extracted" not in case.metadata:
+            pipeline = self._metadata
+            if pipeline is None:
+                if self._on_demand_metadata is None:
+                    self._on_demand_metadata = CaseMetadataPipeline()
+                pipeline = self._on_demand_metadata
+            self._apply_metadata(case, pipeline.result(case_id, self._case_path(case)))
+            self._repo.save(case)
+        return case.metadata["extracted"]
+
+    def build_manifest(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Builds the content manifest of a case directory and stores it in the
+        case's metadata. Hashes from the previous manifest are reused for files
+        whose size and mtime are unchanged. Returns None for an unknown case.
+        """
+        case = self._repo.get(case_id)
+        if case is None:
+            return None
+        manifest = self._manifest_builder.build(
+            self._case_path(case), previous=case.metadata.get("manifest")
+        )
+        if case.metadata.get("manifest", {}).get("digest") != manifest["digest"]:
+            case.metadata["manifest"] = manifest
+            case.updated_at = datetime.utcnow()
+            self._repo.save(case)
+        return manifest
+
+    def get_manifest(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the last manifest stored for a case, if any."""
+        case = self._repo.get(case_id)
+        return case.metadata.get("manifest") if case else None
 
     def get_case(self, case_id: str) -> Optional[Case]:
         """Retrieves a case by its ID."""
         return self._repo.get(case_id)
 
+    def get_cases(self, case_ids: List[str]) -> List[Case]:
+        """Retrieves several cases at once; unknown IDs are skipped."""
+        return self._repo.get_many(case_ids)
+
+    def find_cases_by_status(self, status: CaseStatus) -> List[Case]:
+        """Retrieves all cases with the given status."""
+        return self._repo.find_by_status(status)
+
     def update_case_status(self, case_id: str, status: CaseStatus) -> None:
         """Updates the status of a case."""
         case = self._repo.get(case_id)
@@ -64,3 +478,16 @@ class CaseService(ICaseService):
             # Log that the case was not found
             # logger.warning(f"Attempted to update status of non-existent case: {case_id}")
             pass
+
+    def update_case_statuses(self, statuses: Dict[str, CaseStatus]) -> None:
+        """
+        Updates the statuses of several cases and saves them in one transaction.
+        Unknown case IDs are skipped.
+        """
+        cases = self._repo.get_many(list(statuses))
+        now = datetime.utcnow()
+        for case in cases:
+            case.status = statuses[case.case_id]
+            case.updated_at = now
+        if cases:
+            self._repo.save_many(cases)
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from mqi_communicator.domain.interfaces import GPUStatus
+
+# Shares are compared with this tolerance so that e.g. four quarters fill a GPU exactly.
+_EPSILON = 1e-9
+
+
+@dataclass
+class GpuSlot:
+    """
+    One GPU as the placement sees it: the share of it and the memory (MB)
+    held by our own allocations, its last reported telemetry, if any, and
+    the utilization (%) reported just before our first allocation on it.
+    """
+    gpu_id: int
+    share: float = 0.0
+    memory_mb: float = 0.0
+    status: Optional[GPUStatus] = None
+    base_load: Optional[float] = None
+
+    def external_load(self) -> float:
+        """
+        The utilization (%) caused by work outside our control. While we hold
+        part of the GPU, our work may drive it at any rate, even a quarter
+        share at 100%, so only the load seen before we took it counts.
+        """
+        if self.status is None:
+            return 0.0
+        if self.share > _EPSILON:
+            return self.base_load or 0.0
+        return self.status.load
+
+    def free_memory_mb(self) -> Optional[float]:
+        """
+        Memory still free for new work, or None without memory telemetry.
+        Assuming our work stays within what it reserved, the reported usage
+        beyond our reservations belongs to someone else.
+        """
+        if self.status is None or self.status.memory_total is None:
+            return None
+        external = max(0.0, self.status.memory_usage - self.memory_mb)
+        return self.status.memory_total - self.memory_mb - external
+
+    def fits(self, share: float, memory_mb: float, busy_load_percent: float) -> bool:
+        if self.external_load() >= busy_load_percent:
+            return False
+        if self.share + share > 1.0 + _EPSILON:
+            return False
+        free = self.free_memory_mb()
+        return free is None or free + _EPSILON >= memory_mb
+
+
+def place_gpus(
+    slots: Iterable[GpuSlot],
+    count: int,
+    share: float = 1.0,
+    memory_mb: float = 0.0,
+    busy_load_percent: float = 30.0,
+) -> List[int]:
+    """
+    Picks `count` distinct GPUs that each have room for `share` of a GPU and
+    `memory_mb` of memory. Returns their IDs, or an empty list if there are
+    not enough.
+
+    GPUs are filled best fit first: the one left with the least room is
+    chosen, so small placements share partly used GPUs and whole GPUs stay
+    free for large ones. A GPU whose load from work outside our control
+    reaches `busy_load_percent` is avoided.
+    """
+    candidates = [slot for slot in slots if slot.fits(share, memory_mb, busy_load_percent)]
+    if len(candidates) < count:
+        return []
+
+    def leftover(slot: GpuSlot):
+        free = slot.free_memory_mb()
+        return (
+            1.0 - slot.share - share,
+            float("inf") if free is None else free - memory_mb,
+            slot.external_load(),
+            slot.gpu_id,
+        )
+
+    return sorted(slot.gpu_id for slot in sorted(candidates, key=leftover)[:count])
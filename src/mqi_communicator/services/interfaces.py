@@ -1,5 +1,5 @@
-from typing import Protocol, List, Optional
-from mqi_communicator.domain.models import Case, Job
+from typing import Any, Dict, Protocol, List, Optional
+from mqi_communicator.domain.models import ArchivedCase, Case, CaseStatus, Job, JobStatus
 
 class ICaseService(Protocol):
     """
@@ -9,26 +9,73 @@ class ICaseService(Protocol):
         """Scans the source directory for new cases and registers them."""
         ...
 
+    def watch_for_new_cases(self, timeout: float) -> Optional[List[str]]:
+        """
+        Waits for new case directories and registers them as they appear.
+        Returns None if the service cannot watch, i.e. only scanning finds cases.
+        """
+        ...
+
     def get_case(self, case_id: str) -> Optional[Case]:
         """Retrieves a case by its ID."""
         ...
 
+    def get_cases(self, case_ids: List[str]) -> List[Case]:
+        """Retrieves several cases at once; unknown IDs are skipped."""
+        ...
+
+    def find_cases_by_status(self, status: CaseStatus) -> List[Case]:
+        """Retrieves all cases with the given status."""
+        ...
+
+    def beam_counts(self, case_ids: List[str]) -> Dict[str, Optional[int]]:
+        """Returns the known beam counts of cases; None while a case's is still being extracted."""
+        ...
+
+    def extract_metadata(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the beam count, size, file count and treatment date inferred for a case."""
+        ...
+
+    def build_manifest(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """Records the files of a case (path, size, mtime, hash) in its metadata."""
+        ...
+
+    def get_manifest(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the last manifest recorded for a case."""
+        ...
+
+    def register_cases(self, case_ids: List[str]) -> List[Case]:
+        """Registers several new cases in a single transaction."""
+        ...
+
     def update_case_status(self, case_id: str, status: str) -> None:
         """Updates the status of a case."""
         ...
 
+    def update_case_statuses(self, statuses: Dict[str, CaseStatus]) -> None:
+        """Updates the statuses of several cases in a single transaction."""
+        ...
+
 class IResourceService(Protocol):
     """
     Manages system resources like GPUs and disk space.
     """
-    def allocate_gpus(self, count: int) -> List[int]:
-        """Allocates a specified number of GPUs."""
+    def allocate_gpus(self, count: int, memory_mb: float = 0.0, share: float = 1.0) -> List[int]:
+        """Allocates `share` of each of `count` GPUs, with `memory_mb` of memory on each."""
         ...
 
-    def release_gpus(self, gpu_ids: List[int]) -> None:
+    def release_gpus(self, gpu_ids: List[int], memory_mb: float = 0.0, share: float = 1.0) -> None:
         """Releases a list of GPUs back to the available pool."""
         ...
 
+    def can_allocate_gpus(self, count: int, memory_mb: float = 0.0, share: float = 1.0) -> bool:
+        """Returns True if the same call to allocate_gpus would currently succeed."""
+        ...
+
+    def available_gpu_count(self) -> int:
+        """Returns the number of GPUs that are not allocated."""
+        ...
+
     def check_disk_space(self) -> bool:
         """Checks if there is sufficient disk space available."""
         ...
@@ -41,6 +88,18 @@ class IJobService(Protocol):
         """Creates a new job for a given case."""
         ...
 
+    def get(self, job_id: str) -> Optional[Job]:
+        """Retrieves a job by its ID."""
+        ...
+
+    def create_jobs(self, case_ids: List[str]) -> List[Job]:
+        """Creates one new job per case in a single transaction."""
+        ...
+
+    def set_priority(self, job_id: str, priority: int) -> None:
+        """Changes the priority of a job."""
+        ...
+
     def allocate_resources(self, job: Job) -> bool:
         """Attempts to allocate necessary resources for a job."""
         ...
@@ -49,6 +108,10 @@ class IJobService(Protocol):
         """Marks a job as complete and releases its resources."""
         ...
 
+    def finish_jobs(self, statuses: Dict[str, JobStatus]) -> None:
+        """Gives several jobs their final status and releases their resources."""
+        ...
+
 class ITransferService(Protocol):
     """
     Orchestrates file transfers between the local machine and a remote host.
@@ -60,3 +123,15 @@ class ITransferService(Protocol):
     def download_results(self, case_id: str) -> None:
         """Downloads the results for a given case from the remote host."""
         ...
+
+class IRetentionService(Protocol):
+    """
+    Evicts finished cases and jobs from the live state into an archive.
+    """
+    def archive_expired(self) -> List[str]:
+        """Archives finished cases older than the retention age."""
+        ...
+
+    def get_archived_case(self, case_id: str) -> Optional[ArchivedCase]:
+        """Retrieves an archived case and its jobs."""
+        ...
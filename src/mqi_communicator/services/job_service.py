@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import uuid
 
@@ -18,7 +18,27 @@ class JobService(IJobService):
         """
         Creates a new job for a given case.
         """
-        new_job = Job(
+        new_job = self._new_job(case_id, priority)
+        self._repo.save(new_job)
+        return new_job
+
+    def create_jobs(self, case_ids: List[str], priority: int = 1) -> List[Job]:
+        """
+        Creates one new job per case and saves them all in one transaction.
+        """
+        new_jobs = [self._new_job(case_id, priority) for case_id in case_ids]
+        if new_jobs:
+            self._repo.save_many(new_jobs)
+        return new_jobs
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Retrieves a job by its ID.
+        """
+        return self._repo.get(job_id)
+
+    def _new_job(self, case_id: str, priority: int) -> Job:
+        return Job(
             job_id=str(uuid.uuid4()),
             case_id=case_id,
             status=JobStatus.PENDING,
@@ -26,8 +46,18 @@ class JobService(IJobService):
             priority=priority,
             created_at=datetime.utcnow()
         )
-        self._repo.save(new_job)
-        return new_job
+
+    def set_priority(self, job_id: str, priority: int) -> None:
+        """
+        Changes the priority of a job. Higher priorities are scheduled first.
+        """
+        job = self._repo.get(job_id)
+        if job and job.priority != priority:
+            job.priority = priority
+            self._repo.save(job)
+        elif not job:
+            # Log warning about a non-existent job
+            pass
 
     def allocate_resources(self, job: Job, required_gpus: int) -> bool:
         """
@@ -60,3 +90,20 @@ class JobService(IJobService):
         else:
             # Log warning about completing a non-running or non-existent job
             pass
+
+    def finish_jobs(self, statuses: Dict[str, JobStatus]) -> None:
+        """
+        Gives several jobs their final status (COMPLETED or FAILED) in one
+        transaction and releases any resources still allocated to them.
+        Unknown job IDs are skipped.
+        """
+        jobs = [job for job in (self._repo.get(job_id) for job_id in statuses) if job]
+        now = datetime.utcnow()
+        for job in jobs:
+            if job.gpu_allocation:
+                self._resource_service.release_gpus(job.gpu_allocation)
+                job.gpu_allocation = []
+            job.status = statuses[job.job_id]
+            job.completed_at = now
+        if jobs:
+            self._repo.save_many(jobs)
@@ -1,44 +1,151 @@
-from typing import List
+from typing import Callable, Dict, List, Optional
 import shutil
+import threading
+import time
 
+from mqi_communicator.domain.interfaces import GPUStatus, ISystemMonitor
 from mqi_communicator.domain.repositories.interfaces import IResourceRepository
+from .gpu_placement import GpuSlot, place_gpus
 from .interfaces import IResourceService
 
 class ResourceService(IResourceService):
     """
     Manages system resources like GPUs and disk space.
+    Allocations and releases are serialized, so several workers can share it.
+
+    GPUs are placed by `place_gpus`, which combines our own allocations with
+    the utilization and memory the `system_monitor` reports: allocations are
+    packed by their expected memory, GPUs kept busy by others are avoided
+    (judged, once we hold part of a GPU, by its load just before we took it),
+    and an allocation may take only a `share` of a GPU so that small beams
+    can share one. Telemetry is cached for `telemetry_ttl` seconds; without
+    a monitor, only our own allocations count.
+
+    The repository records which GPUs hold any allocation. Those found there
+    on startup are treated as fully taken until they are released.
     """
-    def __init__(self, resource_repository: IResourceRepository, total_gpu_count: int, min_disk_space_gb: int):
+    def __init__(
+        self,
+        resource_repository: IResourceRepository,
+        total_gpu_count: int,
+        min_disk_space_gb: int,
+        system_monitor: Optional[ISystemMonitor] = None,
+        busy_load_percent: float = 30.0,
+        telemetry_ttl: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         self._repo = resource_repository
         self._total_gpu_count = total_gpu_count
         self._min_disk_space_gb = min_disk_space_gb
         self._all_gpus = set(range(total_gpu_count))
+        self._system_monitor = system_monitor
+        self._busy_load_percent = busy_load_percent
+        self._telemetry_ttl = telemetry_ttl
+        self._clock = clock
+        self._telemetry: Dict[int, GPUStatus] = {}
+        self._telemetry_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._telemetry_lock = threading.Lock()
+        # Our share of each GPU and the memory (MB) reserved on it; None if
+        # restored from the repository, where only the GPU ID was kept.
+        self._shares: Dict[int, Optional[float]] = {
+            gpu_id: None for gpu_id in self._repo.get_allocated_gpus() if gpu_id in self._all_gpus
+        }
+        self._memory: Dict[int, float] = {}
+        # Load of each GPU we hold part of, as reported before we took it.
+        self._base_load: Dict[int, float] = {}
 
-    def allocate_gpus(self, count: int) -> List[int]:
+    def allocate_gpus(self, count: int, memory_mb: float = 0.0, share: float = 1.0) -> List[int]:
         """
-        Allocates a specified number of GPUs.
-        Returns a list of GPU IDs if successful, otherwise an empty list.
+        Allocates `share` of each of `count` GPUs, reserving `memory_mb` of
+        memory on each. Returns a list of GPU IDs if successful, otherwise an
+        empty list.
         """
-        allocated_gpus = set(self._repo.get_allocated_gpus())
-        available_gpus = sorted(list(self._all_gpus - allocated_gpus))
-
-        if len(available_gpus) >= count:
-            gpus_to_allocate = available_gpus[:count]
-            newly_allocated_gpus = sorted(list(allocated_gpus.union(gpus_to_allocate)))
-            self._repo.set_allocated_gpus(newly_allocated_gpus)
+        telemetry = self._current_telemetry()
+        with self._lock:
+            gpus_to_allocate = place_gpus(
+                self._slots(telemetry), count, share=share, memory_mb=memory_mb,
+                busy_load_percent=self._busy_load_percent,
+            )
+            if not gpus_to_allocate:
+                return []
+            in_use = set(self._shares)
+            for gpu_id in gpus_to_allocate:
+                if gpu_id not in self._shares and gpu_id in telemetry:
+                    self._base_load[gpu_id] = telemetry[gpu_id].load
+                self._shares[gpu_id] = (self._shares.get(gpu_id) or 0.0) + share
+                self._memory[gpu_id] = self._memory.get(gpu_id, 0.0) + memory_mb
+            if set(self._shares) != in_use:
+                self._repo.set_allocated_gpus(sorted(self._shares))
             return gpus_to_allocate
-        else:
-            return []
 
-    def release_gpus(self, gpu_ids: List[int]) -> None:
+    def release_gpus(self, gpu_ids: List[int], memory_mb: float = 0.0, share: float = 1.0) -> None:
+        """
+        Releases what `allocate_gpus` allocated with the same `memory_mb` and
+        `share` back to the available pool.
+        """
+        with self._lock:
+            in_use = set(self._shares)
+            for gpu_id in gpu_ids:
+                if gpu_id not in self._shares:
+                    continue
+                remaining = self._shares[gpu_id]
+                remaining = 0.0 if remaining is None else remaining - share
+                if remaining <= 1e-9:
+                    del self._shares[gpu_id]
+                    self._memory.pop(gpu_id, None)
+                    self._base_load.pop(gpu_id, None)
+                else:
+                    self._shares[gpu_id] = remaining
+                    self._memory[gpu_id] = max(0.0, self._memory.get(gpu_id, 0.0) - memory_mb)
+            if set(self._shares) != in_use:
+                self._repo.set_allocated_gpus(sorted(self._shares))
+
+    def can_allocate_gpus(self, count: int, memory_mb: float = 0.0, share: float = 1.0) -> bool:
+        """
+        Returns True if `allocate_gpus` would currently succeed.
         """
-        Releases a list of GPUs back to the available pool.
+        telemetry = self._current_telemetry()
+        with self._lock:
+            return bool(place_gpus(
+                self._slots(telemetry), count, share=share, memory_mb=memory_mb,
+                busy_load_percent=self._busy_load_percent,
+            ))
+
+    def available_gpu_count(self) -> int:
         """
-        allocated_gpus = set(self._repo.get_allocated_gpus())
-        gpus_to_release = set(gpu_ids)
+        Returns the number of GPUs that are not allocated.
+        """
+        with self._lock:
+            return len(self._all_gpus - set(self._shares))
+
+    def _slots(self, telemetry: Dict[int, GPUStatus]) -> List[GpuSlot]:
+        slots = []
+        for gpu_id in sorted(self._all_gpus):
+            share = self._shares.get(gpu_id, 0.0)
+            slots.append(GpuSlot(
+                gpu_id=gpu_id,
+                share=1.0 if share is None else share,
+                memory_mb=self._memory.get(gpu_id, 0.0),
+                status=telemetry.get(gpu_id),
+                base_load=self._base_load.get(gpu_id),
+            ))
+        return slots
 
-        newly_allocated_gpus = sorted(list(allocated_gpus - gpus_to_release))
-        self._repo.set_allocated_gpus(newly_allocated_gpus)
+    def _current_telemetry(self) -> Dict[int, GPUStatus]:
+        # Fetched outside the allocation lock: querying the GPUs can take a while.
+        if self._system_monitor is None:
+            return {}
+        with self._telemetry_lock:
+            now = self._clock()
+            if self._telemetry_at is None or now - self._telemetry_at >= self._telemetry_ttl:
+                try:
+                    self._telemetry = {status.id: status for status in self._system_monitor.get_gpu_status()}
+                except Exception:
+                    # Log the failure and place by our own allocations alone.
+                    self._telemetry = {}
+                self._telemetry_at = now
+            return self._telemetry
 
     def check_disk_space(self, path: str) -> bool:
         """
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from mqi_communicator.domain.models import ArchivedCase, CaseStatus, JobStatus
+from mqi_communicator.domain.repositories.interfaces import (
+    ICaseArchive, ICaseRepository, IJobRepository
+)
+from .interfaces import IRetentionService
+
+_TERMINAL_CASE_STATUSES = (CaseStatus.COMPLETED, CaseStatus.FAILED)
+_TERMINAL_JOB_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED)
+
+class RetentionService(IRetentionService):
+    """
+    Moves finished cases, together with their jobs, out of the live state
+    and into the archive, so the live state only grows with in-flight work.
+    """
+    def __init__(
+        self,
+        case_repository: ICaseRepository,
+        job_repository: IJobRepository,
+        archive: ICaseArchive,
+        max_age: timedelta,
+        batch_size: int = 500,
+    ):
+        self._case_repo = case_repository
+        self._job_repo = job_repository
+        self._archive = archive
+        self._max_age = max_age
+        self._batch_size = batch_size
+
+    def archive_expired(self) -> List[str]:
+        """
+        Archives COMPLETED and FAILED cases last updated more than `max_age` ago.
+        Cases that still have unfinished jobs are left alone. At most `batch_size`
+        cases are archived per call. Returns the archived case IDs.
+        """
+        cutoff = datetime.utcnow() - self._max_age
+        expired = [
+            case
+            for status in _TERMINAL_CASE_STATUSES
+            for case in self._case_repo.find_by_status(status)
+            if case.updated_at < cutoff
+        ]
+        expired.sort(key=lambda case: case.updated_at)
+
+        now = datetime.utcnow()
+        batch: List[ArchivedCase] = []
+        for case in expired:
+            if len(batch) >= self._batch_size:
+                break
+            jobs = self._job_repo.find_by_case_id(case.case_id)
+            if all(job.status in _TERMINAL_JOB_STATUSES for job in jobs):
+                batch.append(ArchivedCase(case=case, jobs=jobs, archived_at=now))
+        if not batch:
+            return []
+
+        # The archive is durable before anything leaves the live state; if we
+        # stop in between, the cases are archived again on the next run.
+        self._archive.append(batch)
+        self._job_repo.delete_many([job.job_id for record in batch for job in record.jobs])
+        case_ids = [record.case.case_id for record in batch]
+        self._case_repo.delete_many(case_ids)
+        return case_ids
+
+    def get_archived_case(self, case_id: str) -> Optional[ArchivedCase]:
+        """Retrieves an archived case and its jobs."""
+        return self._archive.get(case_id)
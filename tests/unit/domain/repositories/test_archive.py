@@ -0,0 +1,50 @@
+from datetime import datetime
+from pathlib import Path
+
+from mqi_communicator.domain.models import ArchivedCase, Case, CaseStatus, Job, JobStatus
+
+# Target for testing
+from mqi_communicator.domain.repositories.archive import CaseArchive
+
+def make_record(case_id: str, job_count: int = 1) -> ArchivedCase:
+    now = datetime(2024, 1, 1)
+    case = Case(case_id=case_id, status=CaseStatus.COMPLETED, beam_count=2, created_at=now, updated_at=now)
+    jobs = [
+        Job(job_id=f"{case_id}-job{i}", case_id=case_id, status=JobStatus.COMPLETED,
+            gpu_allocation=[0], priority=1, created_at=now, completed_at=now)
+        for i in range(job_count)
+    ]
+    return ArchivedCase(case=case, jobs=jobs, archived_at=datetime(2024, 2, 1))
+
+class TestCaseArchive:
+    def test_append_and_get_round_trip(self, tmp_path: Path):
+        archive = CaseArchive(tmp_path / "archive")
+        record = make_record("case001", job_count=2)
+
+        archive.append([record, make_record("case002")])
+
+        assert archive.get("case001") == record
+        assert archive.contains("case002")
+        assert archive.get("missing") is None
+
+    def test_index_survives_restart_and_segments_roll(self, tmp_path: Path):
+        archive = CaseArchive(tmp_path / "archive", max_segment_bytes=1)
+        archive.append([make_record(f"case{i}") for i in range(3)])
+        archive.append([make_record("case3")])
+
+        reopened = CaseArchive(tmp_path / "archive", max_segment_bytes=1)
+
+        assert sorted(reopened.case_ids()) == ["case0", "case1", "case2", "case3"]
+        assert reopened.get("case2").case.case_id == "case2"
+        assert len(list((tmp_path / "archive").glob("segment-*.gz"))) == 4
+
+    def test_torn_index_line_is_dropped(self, tmp_path: Path):
+        archive = CaseArchive(tmp_path / "archive")
+        archive.append([make_record("case001")])
+        with open(tmp_path / "archive" / "index.jsonl", "a") as f:
+            f.write('{"case_id": "case00')
+
+        reopened = CaseArchive(tmp_path / "archive")
+        reopened.append([make_record("case002")])
+
+        assert sorted(CaseArchive(tmp_path / "archive").case_ids()) == ["case001", "case002"]
@@ -0,0 +1,148 @@
+import pytest
+from datetime import datetime
+from pathlib import Path
+
+from mqi_communicator.domain.models import Case, CaseStatus, Job, JobStatus, Task, TaskStatus, TaskType
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+
+# Targets for testing
+from mqi_communicator.domain.repositories.codec import IdentityMap, codec_for
+from mqi_communicator.domain.repositories.json_repositories import CaseRepository, JobRepository
+
+@pytest.fixture
+def sample_case() -> Case:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return Case(
+        case_id="case001", status=CaseStatus.NEW, beam_count=2,
+        created_at=now, updated_at=now, metadata={"beams": ["a", "b"]}
+    )
+
+class TestModelCodec:
+    def test_case_round_trip_restores_types(self, sample_case):
+        data = codec_for(Case).encode(sample_case)
+
+        assert data["status"] == "new"
+        assert data["created_at"] == "2024-01-01T12:00:00"
+
+        decoded = codec_for(Case).decode(data)
+        assert decoded == sample_case
+        assert type(decoded.status) is CaseStatus
+        assert isinstance(decoded.created_at, datetime)
+
+    def test_optional_datetimes_and_missing_fields(self):
+        job = Job(
+            job_id="job001", case_id="case001", status=JobStatus.RUNNING, gpu_allocation=[0],
+            priority=1, created_at=datetime(2024, 1, 1), started_at=datetime(2024, 1, 1, 1)
+        )
+        data = codec_for(Job).encode(job)
+        assert data["completed_at"] is None
+
+        del data["completed_at"]
+        assert codec_for(Job).decode(data) == job
+
+    def test_task_round_trip(self):
+        task = Task(task_id="t1", job_id="job001", type=TaskType.BEAM_CALC, status=TaskStatus.PENDING)
+        decoded = codec_for(Task).decode(codec_for(Task).encode(task))
+        assert decoded.type is TaskType.BEAM_CALC
+
+    def test_decoded_containers_are_not_shared(self, sample_case):
+        data = codec_for(Case).encode(sample_case)
+        decoded = codec_for(Case).decode(data)
+        decoded.metadata["beams"].append("c")
+        assert data["metadata"]["beams"] == ["a", "b"]
+
+class TestIdentityMap:
+    def test_reuses_model_only_for_the_same_stored_dict(self, sample_case):
+        cache = IdentityMap(codec_for(Case))
+        data = codec_for(Case).encode(sample_case)
+
+        first = cache.get("case001", data)
+        assert cache.get("case001", data) == first
+        assert cache.get("case001", dict(data)) == first
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_edits_to_a_returned_model_are_not_cached(self, sample_case):
+        cache = IdentityMap(codec_for(Case))
+        data = codec_for(Case).encode(sample_case)
+
+        first = cache.get("case001", data)
+        first.status = CaseStatus.FAILED
+        first.metadata["beams"] = []
+
+        again = cache.get("case001", data)
+        assert again.status == sample_case.status
+        assert again.metadata["beams"] == ["a", "b"]
+        assert cache.hits == 1
+
+    def test_evicts_least_recently_used(self, sample_case):
+        cache = IdentityMap(codec_for(Case), max_size=2)
+        stored = {i: codec_for(Case).encode(sample_case) for i in ("a", "b", "c")}
+        cache.get("a", stored["a"])
+        cache.get("b", stored["b"])
+        cache.get("a", stored["a"])
+        cache.get("c", stored["c"])
+
+        assert len(cache) == 2
+        cache.get("a", stored["a"])
+        assert cache.misses == 3
+        cache.get("b", stored["b"])
+        assert cache.misses == 4
+
+class TestCachedJsonRepositories:
+    @pytest.fixture
+    def state_manager(self, tmp_path: Path):
+        return JsonStateManager(tmp_path / "state.json")
+
+    def test_get_returns_typed_cached_case(self, state_manager, sample_case):
+        repo = CaseRepository(state_manager)
+        repo.save(sample_case)
+
+        case = repo.get("case001")
+        assert case == sample_case
+        assert case.status is CaseStatus.NEW
+        assert repo.get("case001") == case
+        assert repo.get_all()[0] == case
+        assert repo._cache.hits == 2
+
+    def test_unsaved_edits_are_not_seen_by_other_readers(self, state_manager, sample_case):
+        repo = CaseRepository(state_manager)
+        repo.save(sample_case)
+
+        case = repo.get("case001")
+        case.status = CaseStatus.FAILED
+
+        assert repo.get("case001").status is CaseStatus.NEW
+        assert [c.status for c in repo.find_by_status(CaseStatus.NEW)] == [CaseStatus.NEW]
+
+    def test_save_invalidates_cached_case(self, state_manager, sample_case):
+        repo = CaseRepository(state_manager)
+        repo.save(sample_case)
+        case = repo.get("case001")
+
+        case.status = CaseStatus.QUEUED
+        repo.save(case)
+        reloaded = repo.get("case001")
+
+        assert reloaded is not case
+        assert reloaded.status is CaseStatus.QUEUED
+        assert repo.count_by_status(CaseStatus.QUEUED) == 1
+
+    def test_changes_from_another_repository_are_seen(self, state_manager, sample_case):
+        writer = CaseRepository(state_manager)
+        reader = CaseRepository(state_manager)
+        writer.save(sample_case)
+        assert reader.get("case001").status is CaseStatus.NEW
+
+        sample_case.status = CaseStatus.FAILED
+        writer.save(sample_case)
+        assert reader.get("case001").status is CaseStatus.FAILED
+
+    def test_jobs_survive_a_reload(self, tmp_path):
+        job = Job(
+            job_id="job001", case_id="case001", status=JobStatus.PENDING,
+            gpu_allocation=[], priority=1, created_at=datetime(2024, 1, 1)
+        )
+        JobRepository(JsonStateManager(tmp_path / "state.json")).save(job)
+
+        reloaded = JobRepository(JsonStateManager(tmp_path / "state.json"))
+        assert reloaded.find_by_case_id("case001") == [job]
@@ -0,0 +1,119 @@
+import pytest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from mqi_communicator.domain.models import Case, CaseStatus, Job, JobStatus
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+from mqi_communicator.infrastructure.state.sharded_state_manager import ShardedJsonStateManager
+
+# Targets for testing
+from mqi_communicator.domain.repositories.indexes import EntityIndex
+from mqi_communicator.domain.repositories.json_repositories import CaseRepository, JobRepository
+
+def job_data(job_id: str, case_id: str, status: str, created_at: datetime) -> dict:
+    return {
+        "job_id": job_id, "case_id": case_id, "status": status,
+        "gpu_allocation": [], "priority": 1, "created_at": created_at.isoformat(),
+        "started_at": None, "completed_at": None,
+    }
+
+class TestEntityIndex:
+    def test_lookup_by_field_accepts_enums(self):
+        index = EntityIndex(fields=("status",), order_by="created_at")
+        index.rebuild({
+            "a": {"status": "new", "created_at": "2024-01-01T00:00:00"},
+            "b": {"status": "queued", "created_at": "2024-01-02T00:00:00"},
+        })
+
+        assert index.ids("status", CaseStatus.NEW) == {"a"}
+        assert index.count("status", "queued") == 1
+        assert index.count("status", CaseStatus.FAILED) == 0
+
+    def test_update_moves_and_removes_entities(self):
+        index = EntityIndex(fields=("status",), order_by="created_at")
+        index.rebuild({"a": {"status": "new", "created_at": "2024-01-01T00:00:00"}})
+
+        index.update("a", {"status": "queued", "created_at": "2024-01-01T00:00:00"})
+        assert index.ids("status", "new") == set()
+        assert index.ids("status", "queued") == {"a"}
+
+        index.update("a", None)
+        assert index.count("status", "queued") == 0
+        assert list(index.ids_before(datetime(2030, 1, 1))) == []
+
+    def test_matching_before_is_ordered_and_respects_cutoff(self):
+        index = EntityIndex(fields=("status",), order_by="created_at")
+        index.rebuild({
+            "late": {"status": "running", "created_at": "2024-01-03T00:00:00"},
+            "early": {"status": "running", "created_at": "2024-01-01T00:00:00"},
+            "done": {"status": "completed", "created_at": "2024-01-01T00:00:00"},
+        })
+        index.update("middle", {"status": "running", "created_at": "2024-01-02T00:00:00"})
+
+        assert index.ids_matching_before("status", "running", datetime(2024, 1, 2, 12)) == ["early", "middle"]
+        assert index.count_before(datetime(2024, 1, 2, 12)) == 3
+
+class TestIndexedJsonRepositories:
+    @pytest.fixture
+    def state_manager(self, tmp_path: Path):
+        return JsonStateManager(tmp_path / "state.json")
+
+    def test_case_status_lookups_use_the_loaded_state(self, state_manager):
+        now = datetime(2024, 1, 1).isoformat()
+        state_manager.set("cases", {
+            "c1": {"case_id": "c1", "status": "new", "beam_count": 1, "created_at": now, "updated_at": now},
+            "c2": {"case_id": "c2", "status": "failed", "beam_count": 1, "created_at": now, "updated_at": now},
+        })
+        repo = CaseRepository(state_manager)
+
+        assert [case.case_id for case in repo.find_by_status(CaseStatus.NEW)] == ["c1"]
+        assert repo.count_by_status(CaseStatus.FAILED) == 1
+        assert repo.count_by_status(CaseStatus.COMPLETED) == 0
+
+    def test_job_queries(self, state_manager):
+        now = datetime.utcnow()
+        state_manager.set("jobs", {
+            "j1": job_data("j1", "c1", "running", now - timedelta(hours=3)),
+            "j2": job_data("j2", "c1", "running", now),
+            "j3": job_data("j3", "c2", "completed", now - timedelta(hours=5)),
+        })
+        repo = JobRepository(state_manager)
+
+        assert {job.job_id for job in repo.find_by_case_id("c1")} == {"j1", "j2"}
+        assert {job.job_id for job in repo.find_by_status(JobStatus.RUNNING)} == {"j1", "j2"}
+        assert [job.job_id for job in repo.find_running_older_than(timedelta(hours=1))] == ["j1"]
+        assert repo.count_by_status(JobStatus.COMPLETED) == 1
+
+    def test_save_many_commits_once_and_updates_indexes(self, state_manager, monkeypatch):
+        repo = CaseRepository(state_manager)
+        commits = []
+        original_commit = state_manager._commit
+        monkeypatch.setattr(state_manager, "_commit", lambda *args: (commits.append(1), original_commit(*args)))
+        now = datetime(2024, 1, 1)
+
+        repo.save_many([
+            Case(case_id=f"c{i}", status=CaseStatus.NEW, beam_count=0, created_at=now, updated_at=now)
+            for i in range(50)
+        ])
+
+        assert len(commits) == 1
+        assert repo.count_by_status(CaseStatus.NEW) == 50
+        assert [case.case_id for case in repo.get_many(["c3", "missing", "c7"])] == ["c3", "c7"]
+
+class TestIndexesAcrossProcesses:
+    def test_index_follows_commits_from_another_process(self, tmp_path: Path):
+        # Given
+        def open_manager():
+            return ShardedJsonStateManager(tmp_path / "state.json", entity_sections=["jobs"], multi_process=True)
+        writer = JobRepository(open_manager())
+        reader = JobRepository(open_manager())
+        now = datetime.utcnow()
+        writer.save(Job(job_id="j1", case_id="c1", status=JobStatus.PENDING, gpu_allocation=[], priority=1, created_at=now))
+
+        # When / Then
+        assert [job.job_id for job in reader.find_by_case_id("c1")] == ["j1"]
+        job = writer.get("j1")
+        job.status = JobStatus.RUNNING
+        writer.save(job)
+        assert reader.count_by_status(JobStatus.PENDING) == 0
+        assert reader.count_by_status(JobStatus.RUNNING) == 1
@@ -0,0 +1,167 @@
+import pytest
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from mqi_communicator.domain.models import Case, CaseStatus, Job, JobStatus, Task, TaskStatus, TaskType
+from mqi_communicator.infrastructure.state.sqlite_state_manager import SqliteStateManager
+
+# Targets for testing
+from mqi_communicator.domain.repositories.sqlite_repositories import (
+    SqliteCaseRepository, SqliteJobRepository, SqliteResourceRepository, SqliteTaskRepository,
+    migrate_json_state, open_sqlite_state
+)
+
+@pytest.fixture
+def state_manager(tmp_path: Path):
+    sm = SqliteStateManager(tmp_path / "state.db")
+    yield sm
+    sm.close()
+
+def make_case(case_id: str) -> Case:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return Case(case_id=case_id, status=CaseStatus.NEW, beam_count=2, created_at=now, updated_at=now)
+
+def make_job(job_id: str, case_id: str) -> Job:
+    return Job(
+        job_id=job_id, case_id=case_id, status=JobStatus.PENDING,
+        gpu_allocation=[], priority=1, created_at=datetime(2024, 1, 1)
+    )
+
+class TestSqliteRepositories:
+    def test_case_round_trip(self, state_manager):
+        repo = SqliteCaseRepository(state_manager)
+        repo.save(make_case("case001"))
+
+        retrieved = repo.get("case001")
+
+        assert retrieved is not None
+        assert retrieved.case_id == "case001"
+        assert retrieved.status == CaseStatus.NEW
+        assert repo.get("missing") is None
+        assert repo.get_all_case_ids() == ["case001"]
+
+    def test_case_status_column_is_indexed(self, state_manager):
+        SqliteCaseRepository(state_manager)
+        with state_manager.connection() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT case_id FROM cases WHERE status = 'new'"
+            ).fetchall()
+        assert "idx_cases_status" in str(plan)
+
+    def test_find_jobs_by_case_id(self, state_manager):
+        repo = SqliteJobRepository(state_manager)
+        repo.save(make_job("job001", "case001"))
+        repo.save(make_job("job002", "case001"))
+        repo.save(make_job("job003", "case002"))
+
+        jobs = repo.find_by_case_id("case001")
+
+        assert {job.job_id for job in jobs} == {"job001", "job002"}
+        with state_manager.connection() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT data FROM jobs WHERE case_id = 'case001'"
+            ).fetchall()
+        assert "idx_jobs_case_id" in str(plan)
+
+    def test_allocated_gpus(self, state_manager):
+        repo = SqliteResourceRepository(state_manager)
+
+        repo.set_allocated_gpus([3, 1])
+        assert repo.get_allocated_gpus() == [1, 3]
+
+        repo.set_allocated_gpus([])
+        assert repo.get_allocated_gpus() == []
+
+    def test_task_round_trip_and_delete(self, state_manager):
+        repo = SqliteTaskRepository(state_manager)
+        repo.save_many([
+            Task(task_id="task001", job_id="job001", type=TaskType.UPLOAD, status=TaskStatus.RUNNING),
+            Task(task_id="task002", job_id="job001", type=TaskType.INTERPRET, status=TaskStatus.PENDING,
+                 dependencies=["task001"]),
+        ])
+
+        repo.delete_many(["task001"])
+
+        assert repo.get("task001") is None
+        [task] = repo.get_all()
+        assert task.type == TaskType.INTERPRET
+        assert task.dependencies == ["task001"]
+
+class TestMigration:
+    @pytest.fixture
+    def legacy_state_file(self, tmp_path: Path) -> Path:
+        state_file = tmp_path / "state.json"
+        state = {
+            "cases": {"case001": {
+                "case_id": "case001", "status": "completed", "beam_count": 1,
+                "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00",
+                "metadata": {},
+            }},
+            "jobs": {"job001": {
+                "job_id": "job001", "case_id": "case001", "status": "completed",
+                "gpu_allocation": [0], "priority": 1, "created_at": "2024-01-01T00:00:00",
+                "started_at": None, "completed_at": None,
+            }},
+            "tasks": {"task001": {
+                "task_id": "task001", "job_id": "job001", "type": "upload", "status": "running",
+                "parameters": {}, "dependencies": [],
+            }},
+            "resources": {"allocated_gpus": [2]},
+            "counter": 7,
+        }
+        state_file.write_text(json.dumps(state))
+        return state_file
+
+    def test_migrates_entities_and_other_keys(self, legacy_state_file: Path):
+        sm = open_sqlite_state(legacy_state_file)
+
+        assert SqliteCaseRepository(sm).get("case001").status == "completed"
+        assert [job.job_id for job in SqliteJobRepository(sm).find_by_case_id("case001")] == ["job001"]
+        assert SqliteResourceRepository(sm).get_allocated_gpus() == [2]
+        assert SqliteTaskRepository(sm).get("task001").status == TaskStatus.RUNNING
+        assert sm.get("tasks") is None
+        assert sm.get("counter") == 7
+        sm.close()
+
+    def test_migration_runs_once(self, legacy_state_file: Path, tmp_path: Path):
+        sm = open_sqlite_state(legacy_state_file)
+        SqliteCaseRepository(sm).save(make_case("case002"))
+
+        assert migrate_json_state(sm, legacy_state_file) is False
+        assert sorted(SqliteCaseRepository(sm).get_all_case_ids()) == ["case001", "case002"]
+        sm.close()
+
+class TestSqliteRepositoryQueries:
+    def test_find_and_count_cases_by_status(self, state_manager):
+        repo = SqliteCaseRepository(state_manager)
+        repo.save(make_case("case001"))
+        failed = make_case("case002")
+        failed.status = CaseStatus.FAILED
+        repo.save(failed)
+
+        assert [case.case_id for case in repo.find_by_status(CaseStatus.FAILED)] == ["case002"]
+        assert repo.count_by_status(CaseStatus.NEW) == 1
+
+    def test_find_running_jobs_older_than(self, state_manager):
+        repo = SqliteJobRepository(state_manager)
+        now = datetime.utcnow()
+        for job_id, age, status in [
+            ("job001", 3, JobStatus.RUNNING), ("job002", 0, JobStatus.RUNNING), ("job003", 5, JobStatus.COMPLETED)
+        ]:
+            job = make_job(job_id, "case001")
+            job.status = status
+            job.created_at = now - timedelta(hours=age)
+            repo.save(job)
+
+        assert [job.job_id for job in repo.find_running_older_than(timedelta(hours=1))] == ["job001"]
+        assert repo.count_by_status(JobStatus.RUNNING) == 2
+        assert {job.job_id for job in repo.find_by_status(JobStatus.COMPLETED)} == {"job003"}
+
+    def test_save_many_and_get_many(self, state_manager):
+        repo = SqliteCaseRepository(state_manager)
+        repo.save_many([make_case(f"case{i:04d}") for i in range(1200)])
+
+        ids = [f"case{i:04d}" for i in range(0, 1200, 2)] + ["missing"]
+        assert len(repo.get_many(ids)) == 600
+        assert repo.count_by_status(CaseStatus.NEW) == 1200
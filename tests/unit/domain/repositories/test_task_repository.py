@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from mqi_communicator.domain.models import Task, TaskStatus, TaskType
+from mqi_communicator.domain.repositories.json_repositories import TaskRepository
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+
+
+def make_task(task_id: str, dependencies=()) -> Task:
+    return Task(
+        task_id=task_id, job_id="job001", type=TaskType.UPLOAD, status=TaskStatus.PENDING,
+        parameters={"attempt": 1}, dependencies=list(dependencies),
+    )
+
+
+def test_tasks_survive_a_restart(tmp_path: Path):
+    # Given
+    repo = TaskRepository(JsonStateManager(tmp_path / "state.json"))
+    running = make_task("task002", dependencies=["task001"])
+    running.status = TaskStatus.RUNNING
+    repo.save_many([make_task("task001"), running])
+
+    # When
+    reopened = TaskRepository(JsonStateManager(tmp_path / "state.json"))
+
+    # Then
+    assert sorted(task.task_id for task in reopened.get_all()) == ["task001", "task002"]
+    restored = reopened.get("task002")
+    assert restored.status == TaskStatus.RUNNING
+    assert restored.type == TaskType.UPLOAD
+    assert restored.dependencies == ["task001"]
+    assert restored.parameters == {"attempt": 1}
+
+
+def test_delete_many(tmp_path: Path):
+    repo = TaskRepository(JsonStateManager(tmp_path / "state.json"))
+    repo.save_many([make_task("task001"), make_task("task002")])
+
+    repo.delete_many(["task001", "missing"])
+
+    assert repo.get("task001") is None
+    assert [task.task_id for task in repo.get_all()] == ["task002"]
@@ -47,8 +47,8 @@ class TestSystemMonitor:
         # Given
         # Mock the output of nvidia-smi
         nvidia_smi_output = (
-            "0, 50.5, 4096\n"
-            "1, 10.0, 8192\n"
+            "0, 50.5, 4096, 16384\n"
+            "1, 10.0, 8192, 16384\n"
         )
         mock_subprocess_run.return_value.stdout = nvidia_smi_output
         mock_subprocess_run.return_value.returncode = 0
@@ -62,9 +62,10 @@ class TestSystemMonitor:
         assert gpu_status[0].id == 0
         assert gpu_status[0].load == 50.5
         assert gpu_status[0].memory_usage == 4096.0
+        assert gpu_status[0].memory_total == 16384.0
         assert gpu_status[1].id == 1
 
-        expected_command = "nvidia-smi --query-gpu=index,utilization.gpu,memory.used --format=csv,noheader,nounits"
+        expected_command = "nvidia-smi --query-gpu=index,utilization.gpu,memory.used,memory.total --format=csv,noheader,nounits"
         mock_subprocess_run.assert_called_once_with(
             expected_command, shell=True, capture_output=True, text=True, check=True
         )
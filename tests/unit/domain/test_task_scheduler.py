@@ -1,6 +1,8 @@
 import pytest
+from pathlib import Path
 from unittest.mock import MagicMock
 import uuid
+from typing import List
 
 # Domain models
 from mqi_communicator.domain.models import Task, TaskType, TaskStatus, Case, CaseStatus, Job, JobStatus
@@ -8,12 +10,18 @@ from mqi_communicator.domain.models import Task, TaskType, TaskStatus, Case, Cas
 # Service interfaces
 from mqi_communicator.services.interfaces import ICaseService, IJobService
 
+from mqi_communicator.domain.repositories.json_repositories import TaskRepository
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+
 # Target for testing
-from mqi_communicator.domain.task_scheduler import TaskScheduler
+from mqi_communicator.domain.task_scheduler import TaskScheduler, WORKFLOW
 
 @pytest.fixture
 def mock_case_service():
-    return MagicMock(spec=ICaseService)
+    service = MagicMock(spec=ICaseService)
+    # No case has been counted: one BEAM_CALC task each
+    service.beam_counts.return_value = {}
+    return service
 
 @pytest.fixture
 def mock_job_service():
@@ -96,14 +104,458 @@ class TestTaskScheduler:
         # This is harder to test without a task repository, but the logic should be there.
         # For now, we just test the queue behavior.
 
-    def test_task_queue_is_fifo(self, scheduler: TaskScheduler):
+    def test_task_waits_for_its_dependencies(self, scheduler: TaskScheduler):
         # Given
-        scheduler.schedule_case("case-1")
+        tasks = scheduler.schedule_case("case-1")
 
         # When
         task1 = scheduler.get_next_task()
+        blocked = scheduler.get_next_task()
+        scheduler.complete_task(task1.task_id)
         task2 = scheduler.get_next_task()
 
         # Then
+        # INTERPRET only becomes ready once UPLOAD has completed
         assert task1.type == TaskType.UPLOAD
+        assert blocked is None
         assert task2.type == TaskType.INTERPRET
+        assert task2.dependencies == [tasks[0].task_id]
+
+    def test_ready_tasks_of_other_cases_run_in_between(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        mock_job_service.create_jobs.return_value = [
+            Job(job_id=f"job-{i}", case_id=f"case-{i}", status=JobStatus.PENDING, gpu_allocation=[], priority=1, created_at=None)
+            for i in range(2)
+        ]
+        scheduler.schedule_cases(["case-0", "case-1"])
+
+        # When
+        # Case 0 is still uploading when case 1's upload is handed out
+        upload_0 = scheduler.get_next_task()
+        upload_1 = scheduler.get_next_task()
+        scheduler.complete_task(upload_0.task_id)
+        interpret_0 = scheduler.get_next_task()
+
+        # Then
+        assert (upload_0.job_id, upload_0.type) == ("job-0", TaskType.UPLOAD)
+        assert (upload_1.job_id, upload_1.type) == ("job-1", TaskType.UPLOAD)
+        assert (interpret_0.job_id, interpret_0.type) == ("job-0", TaskType.INTERPRET)
+        assert scheduler.get_next_task() is None
+
+    def test_task_with_several_dependencies_waits_for_all(self, scheduler: TaskScheduler):
+        # Given
+        beams = [Task(task_id=f"beam-{i}", job_id="j", type=TaskType.BEAM_CALC, status=TaskStatus.PENDING) for i in range(2)]
+        join = Task(task_id="convert", job_id="j", type=TaskType.CONVERT, status=TaskStatus.PENDING, dependencies=["beam-0", "beam-1"])
+        scheduler.schedule_tasks(beams + [join])
+
+        # When
+        first, second = scheduler.get_next_task(), scheduler.get_next_task()
+        scheduler.complete_task(first.task_id)
+        after_one = scheduler.get_next_task()
+        scheduler.complete_task(second.task_id)
+
+        # Then
+        assert after_one is None
+        assert scheduler.get_next_task() is join
+
+    def test_get_next_task_of_given_types(self, scheduler: TaskScheduler):
+        # Given
+        calc = Task(task_id="calc", job_id="j1", type=TaskType.BEAM_CALC, status=TaskStatus.PENDING)
+        upload = Task(task_id="up", job_id="j2", type=TaskType.UPLOAD, status=TaskStatus.PENDING)
+        scheduler.schedule_tasks([calc, upload])
+
+        # When
+        # No calculation slot is free, so the upload that became ready later goes first
+        first = scheduler.get_next_task([TaskType.UPLOAD, TaskType.DOWNLOAD])
+        nothing = scheduler.get_next_task([TaskType.DOWNLOAD])
+
+        # Then
+        assert first is upload
+        assert nothing is None
+        assert scheduler.get_next_task() is calc
+
+    def test_requeued_task_is_handed_out_again(self, scheduler: TaskScheduler):
+        # Given
+        tasks = scheduler.schedule_case("case-1")
+        upload = scheduler.get_next_task()
+
+        # When
+        scheduler.requeue_task(upload.task_id)
+
+        # Then
+        assert upload.status == TaskStatus.PENDING
+        assert scheduler.get_next_task() is upload
+        scheduler.complete_task(upload.task_id)
+        assert scheduler.get_next_task() is tasks[1]
+
+    def test_next_task_of_one_job(self, scheduler: TaskScheduler):
+        # Given
+        scheduler.schedule_tasks([
+            Task(task_id="a1", job_id="j1", type=TaskType.UPLOAD, status=TaskStatus.PENDING),
+            Task(task_id="b1", job_id="j2", type=TaskType.UPLOAD, status=TaskStatus.PENDING),
+            Task(task_id="b2", job_id="j2", type=TaskType.INTERPRET, status=TaskStatus.PENDING, dependencies=["b1"]),
+        ])
+
+        # When
+        task = scheduler.get_next_task(job_id="j2")
+
+        # Then
+        assert task.task_id == "b1" and task.status == TaskStatus.RUNNING
+        assert scheduler.get_next_task(job_id="j2") is None
+        assert scheduler.get_next_task().task_id == "a1"
+        assert scheduler.get_next_task() is None
+        scheduler.complete_task("b1")
+        assert scheduler.get_next_task(job_id="j2").task_id == "b2"
+
+    def test_failed_task_fails_its_dependents(self, scheduler: TaskScheduler):
+        # Given
+        tasks = scheduler.schedule_case("case-1")
+        upload = scheduler.get_next_task()
+
+        # When
+        cancelled = scheduler.fail_task(upload.task_id)
+
+        # Then
+        assert upload.status == TaskStatus.FAILED
+        assert cancelled == tasks[1:]
+        assert all(task.status == TaskStatus.FAILED for task in cancelled)
+        assert scheduler.get_next_task() is None
+
+    def test_dependency_on_a_later_task_is_rejected(self, scheduler: TaskScheduler):
+        first = Task(task_id="a", job_id="j", type=TaskType.UPLOAD, status=TaskStatus.PENDING, dependencies=["b"])
+        second = Task(task_id="b", job_id="j", type=TaskType.INTERPRET, status=TaskStatus.PENDING)
+
+        with pytest.raises(ValueError):
+            scheduler.schedule_tasks([first, second])
+
+    def test_schedule_cases_creates_jobs_in_one_call(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        mock_job_service.create_jobs.return_value = [
+            Job(job_id=f"job-{i}", case_id=f"case-{i}", status=JobStatus.PENDING, gpu_allocation=[], priority=1, created_at=None)
+            for i in range(2)
+        ]
+
+        # When
+        scheduled = scheduler.schedule_cases(["case-0", "case-1"])
+
+        # Then
+        mock_job_service.create_jobs.assert_called_once_with(["case-0", "case-1"])
+        mock_job_service.create_job.assert_not_called()
+        assert sorted(scheduled) == ["case-0", "case-1"]
+        assert [task.job_id for task in scheduled["case-1"]] == ["job-1"] * 5
+        assert scheduler.get_next_task().job_id == "job-0"
+
+class TestBeamFanOut:
+    def test_one_beam_calc_per_beam_joined_before_convert(self, scheduler: TaskScheduler, mock_case_service):
+        # Given
+        mock_case_service.beam_counts.return_value = {"case-abc": 3}
+
+        # When
+        tasks = scheduler.schedule_case("case-abc")
+
+        # Then
+        beams = [task for task in tasks if task.type == TaskType.BEAM_CALC]
+        interpret = next(task for task in tasks if task.type == TaskType.INTERPRET)
+        convert = next(task for task in tasks if task.type == TaskType.CONVERT)
+        assert [task.parameters["beam"] for task in beams] == [1, 2, 3]
+        assert all(task.dependencies == [interpret.task_id] for task in beams)
+        assert convert.dependencies == [task.task_id for task in beams]
+
+    def test_beams_run_in_parallel_and_convert_waits_for_all(self, scheduler: TaskScheduler, mock_case_service):
+        # Given
+        mock_case_service.beam_counts.return_value = {"case-abc": 2}
+        scheduler.schedule_case("case-abc")
+        for _ in range(2):
+            scheduler.complete_task(scheduler.get_next_task().task_id)
+
+        # When
+        first = scheduler.get_next_task()
+        second = scheduler.get_next_task()
+        scheduler.complete_task(first.task_id)
+
+        # Then
+        assert {first.type, second.type} == {TaskType.BEAM_CALC}
+        assert scheduler.get_next_task() is None
+        scheduler.complete_task(second.task_id)
+        assert scheduler.get_next_task().type == TaskType.CONVERT
+
+    def test_beams_still_being_counted_are_fanned_out_later(self, scheduler: TaskScheduler, mock_case_service):
+        # Given
+        mock_case_service.beam_counts.return_value = {"case-abc": None}
+        tasks = scheduler.schedule_case("case-abc")
+        placeholder = next(task for task in tasks if task.type == TaskType.BEAM_CALC)
+        convert = next(task for task in tasks if task.type == TaskType.CONVERT)
+        for _ in range(2):
+            scheduler.complete_task(scheduler.get_next_task().task_id)
+        assert scheduler.get_next_task() is None
+
+        # When
+        mock_case_service.beam_counts.return_value = {"case-abc": 3}
+        beams = [scheduler.get_next_task() for _ in range(3)]
+
+        # Then
+        mock_case_service.extract_metadata.assert_not_called()
+        assert beams[0] is placeholder
+        assert sorted(task.parameters["beam"] for task in beams) == [1, 2, 3]
+        assert all(task.parameters["beam_count"] == 3 for task in beams)
+        assert sorted(convert.dependencies) == sorted(task.task_id for task in beams)
+        for task in beams[:2]:
+            scheduler.complete_task(task.task_id)
+        assert scheduler.get_next_task() is None
+        scheduler.complete_task(beams[2].task_id)
+        assert scheduler.get_next_task() is convert
+
+    def test_case_without_beams_gets_one_beam_calc(self, scheduler: TaskScheduler, mock_case_service):
+        mock_case_service.beam_counts.return_value = {"case-abc": 0}
+
+        tasks = scheduler.schedule_case("case-abc")
+
+        assert [task.type for task in tasks] == WORKFLOW
+
+class TestPriorityScheduling:
+    @pytest.fixture
+    def clock(self):
+        clock = MagicMock(return_value=0.0)
+        return clock
+
+    @pytest.fixture
+    def scheduler(self, mock_case_service, mock_job_service, clock) -> TaskScheduler:
+        return TaskScheduler(case_service=mock_case_service, job_service=mock_job_service, aging_interval=100.0, clock=clock)
+
+    def schedule(self, scheduler: TaskScheduler, mock_job_service, case_id: str, priority: int) -> List[Task]:
+        mock_job_service.create_job.return_value = Job(
+            job_id=f"job-{case_id}", case_id=case_id, status=JobStatus.PENDING, gpu_allocation=[], priority=priority, created_at=None
+        )
+        return scheduler.schedule_case(case_id)
+
+    def test_higher_priority_is_served_first(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        self.schedule(scheduler, mock_job_service, "routine", priority=1)
+        self.schedule(scheduler, mock_job_service, "urgent", priority=5)
+
+        # When / Then
+        assert scheduler.get_next_task().job_id == "job-urgent"
+        assert scheduler.get_next_task().job_id == "job-routine"
+
+    def test_equal_priority_is_fifo(self, scheduler: TaskScheduler, mock_job_service):
+        for case_id in ("a", "b", "c"):
+            self.schedule(scheduler, mock_job_service, case_id, priority=1)
+
+        assert [scheduler.get_next_task().job_id for _ in range(3)] == ["job-a", "job-b", "job-c"]
+
+    def test_waiting_tasks_age_past_newer_higher_priority_ones(self, scheduler: TaskScheduler, mock_job_service, clock):
+        # Given
+        # A low priority case has waited longer than two aging intervals
+        self.schedule(scheduler, mock_job_service, "old", priority=1)
+        clock.return_value = 250.0
+        self.schedule(scheduler, mock_job_service, "new", priority=3)
+
+        # When / Then
+        assert scheduler.get_next_task().job_id == "job-old"
+
+    def test_bump_moves_a_queued_case_ahead(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        self.schedule(scheduler, mock_job_service, "a", priority=1)
+        self.schedule(scheduler, mock_job_service, "b", priority=1)
+
+        # When
+        assert scheduler.bump_case_priority("b", 2)
+
+        # Then
+        assert scheduler.get_next_task().job_id == "job-b"
+        mock_job_service.set_priority.assert_called_once_with("job-b", 2)
+
+    def test_bump_applies_to_tasks_that_become_ready_later(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        self.schedule(scheduler, mock_job_service, "a", priority=1)
+        self.schedule(scheduler, mock_job_service, "b", priority=1)
+        upload_a = scheduler.get_next_task()
+        upload_b = scheduler.get_next_task()
+
+        # When
+        # Case a's INTERPRET is still waiting for its upload when a is bumped
+        scheduler.bump_case_priority("a", 9)
+        scheduler.complete_task(upload_b.task_id)
+        scheduler.complete_task(upload_a.task_id)
+
+        # Then
+        assert scheduler.get_next_task().job_id == "job-a"
+
+    def test_bump_of_unknown_or_finished_case(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        tasks = self.schedule(scheduler, mock_job_service, "a", priority=1)
+        for _ in tasks:
+            scheduler.complete_task(scheduler.get_next_task().task_id)
+
+        # When / Then
+        assert not scheduler.bump_case_priority("a", 5)
+        assert not scheduler.bump_case_priority("unknown", 5)
+        mock_job_service.set_priority.assert_not_called()
+
+    def test_repeated_bumps_keep_the_queue_small(self, scheduler: TaskScheduler, mock_job_service):
+        # Given
+        for i in range(10):
+            self.schedule(scheduler, mock_job_service, f"case-{i}", priority=1)
+
+        # When
+        for priority in range(200):
+            scheduler.bump_case_priority("case-3", priority)
+
+        # Then
+        # Stale entries are compacted away, and each case is still handed out once
+        assert len(scheduler._ready[TaskType.UPLOAD]) < 10 + 2 * 64
+        assert scheduler.get_next_task().job_id == "job-case-3"
+        assert sorted(scheduler.get_next_task().job_id for _ in range(9)) == sorted(f"job-case-{i}" for i in range(10) if i != 3)
+        assert scheduler.get_next_task() is None
+
+class TestTaskRecovery:
+    @pytest.fixture
+    def state_file(self, tmp_path: Path) -> Path:
+        return tmp_path / "state.json"
+
+    def restart(self, state_file: Path, case_service, job_service) -> TaskScheduler:
+        """A scheduler as it comes up after a restart, over the same state file."""
+        return TaskScheduler(
+            case_service=case_service, job_service=job_service,
+            task_repository=TaskRepository(JsonStateManager(state_file)),
+        )
+
+    @pytest.fixture
+    def job_service(self, mock_job_service):
+        job = mock_job_service.create_job.return_value
+        mock_job_service.get.side_effect = lambda job_id: job if job_id == job.job_id else None
+        return mock_job_service
+
+    @pytest.fixture
+    def case_service(self, mock_case_service):
+        mock_case_service.find_cases_by_status.return_value = []
+        return mock_case_service
+
+    def test_schedule_marks_the_case_queued(self, state_file, case_service, job_service):
+        scheduler = self.restart(state_file, case_service, job_service)
+
+        scheduler.schedule_case("case-abc")
+
+        case_service.update_case_status.assert_called_once_with("case-abc", CaseStatus.QUEUED)
+
+    def test_completed_stages_are_not_redone(self, state_file, case_service, job_service):
+        # Given
+        before = self.restart(state_file, case_service, job_service)
+        tasks = before.schedule_case("case-abc")
+        before.complete_task(before.get_next_task().task_id)
+
+        # When
+        after = self.restart(state_file, case_service, job_service)
+        restored = after.recover()
+
+        # Then
+        assert [task.type for task in restored] == [task.type for task in tasks[1:]]
+        assert after.get_next_task().task_id == tasks[1].task_id
+
+    def test_beams_counted_after_a_restart_are_fanned_out(self, state_file, case_service, job_service):
+        # Given
+        case_service.beam_counts.return_value = {"case-abc": None}
+        before = self.restart(state_file, case_service, job_service)
+        before.schedule_case("case-abc")
+        for _ in range(2):
+            before.complete_task(before.get_next_task().task_id)
+
+        # When
+        after = self.restart(state_file, case_service, job_service)
+        after.recover()
+        case_service.beam_counts.return_value = {"case-abc": 2}
+        beams = [after.get_next_task(), after.get_next_task()]
+
+        # Then
+        assert [task.parameters["beam"] for task in beams] == [1, 2]
+        restored = self.restart(state_file, case_service, job_service).recover()
+        assert sorted(task.parameters.get("beam", 0) for task in restored) == [0, 0, 1, 2]
+
+    def test_running_task_is_requeued(self, state_file, case_service, job_service):
+        # Given
+        before = self.restart(state_file, case_service, job_service)
+        tasks = before.schedule_case("case-abc")
+        before.get_next_task()
+
+        # When
+        after = self.restart(state_file, case_service, job_service)
+        after.recover()
+
+        # Then
+        requeued = after.get_next_task()
+        assert requeued.task_id == tasks[0].task_id
+        assert requeued.status == TaskStatus.RUNNING
+        assert after.get_next_task() is None
+
+    def test_running_task_reconciled_as_finished_is_not_rerun(self, state_file, case_service, job_service):
+        # Given
+        before = self.restart(state_file, case_service, job_service)
+        tasks = before.schedule_case("case-abc")
+        before.get_next_task()
+
+        # When
+        after = self.restart(state_file, case_service, job_service)
+        after.recover(reconcile=lambda task: task.type == TaskType.UPLOAD)
+
+        # Then
+        assert after.get_next_task().task_id == tasks[1].task_id
+
+    def test_every_interrupted_task_is_released(self, state_file, case_service, job_service):
+        # Given
+        # A running task whose job is gone by the restart
+        before = self.restart(state_file, case_service, job_service)
+        before.schedule_case("case-abc")
+        upload = before.get_next_task()
+        upload.parameters["gpu_ids"] = [1]
+        before.update_task(upload)
+        job_service.get.side_effect = lambda job_id: None
+        released = []
+
+        # When
+        after = self.restart(state_file, case_service, job_service)
+        after.recover(reconcile=lambda task: False, release=released.append)
+
+        # Then
+        assert [(task.task_id, task.parameters["gpu_ids"]) for task in released] == [(upload.task_id, [1])]
+
+    def test_tasks_of_missing_jobs_are_dropped(self, state_file, case_service, job_service):
+        # Given
+        self.restart(state_file, case_service, job_service).schedule_case("case-abc")
+        job_service.get.side_effect = lambda job_id: None
+
+        # When
+        after = self.restart(state_file, case_service, job_service)
+
+        # Then
+        assert after.recover() == []
+        assert after.get_next_task() is None
+        assert self.restart(state_file, case_service, job_service).recover() == []
+
+    def test_registered_but_unscheduled_cases_are_scheduled(self, state_file, case_service, job_service):
+        # Given
+        now = None
+        case_service.find_cases_by_status.return_value = [
+            Case(case_id="case-abc", status=CaseStatus.NEW, beam_count=1, created_at=now, updated_at=now)
+        ]
+
+        # When
+        scheduler = self.restart(state_file, case_service, job_service)
+        scheduler.recover()
+
+        # Then
+        job_service.create_jobs.assert_called_once_with(["case-abc"])
+
+    def test_case_status_follows_its_job(self, state_file, case_service, job_service):
+        # Given
+        scheduler = self.restart(state_file, case_service, job_service)
+        scheduler.schedule_case("case-abc")
+
+        # When
+        scheduler.complete_task(scheduler.get_next_task().task_id)
+        scheduler.fail_task(scheduler.get_next_task().task_id)
+
+        # Then
+        job_id = job_service.create_job.return_value.job_id
+        job_service.finish_jobs.assert_called_once_with({job_id: JobStatus.FAILED})
+        case_service.update_case_statuses.assert_called_once_with({"case-abc": CaseStatus.FAILED})
+        assert self.restart(state_file, case_service, job_service).recover() == []
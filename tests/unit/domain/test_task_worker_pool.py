@@ -0,0 +1,67 @@
+import pytest
+import threading
+
+# Domain models
+from mqi_communicator.domain.models import Task, TaskType, TaskStatus
+
+# Target for testing
+from mqi_communicator.domain.task_worker_pool import TaskWorkerPool
+
+def make_task(task_id: str, task_type: TaskType) -> Task:
+    return Task(task_id=task_id, job_id="job-1", type=task_type, status=TaskStatus.RUNNING)
+
+@pytest.fixture
+def pool():
+    pool = TaskWorkerPool({TaskType.UPLOAD: 2, TaskType.BEAM_CALC: 1})
+    yield pool
+    pool.shutdown()
+
+class TestTaskWorkerPool:
+    def test_limits_are_per_task_type(self, pool: TaskWorkerPool):
+        # Given
+        release = threading.Event()
+        done = []
+
+        # When
+        # One long calculation fills the BEAM_CALC slot
+        pool.submit(make_task("calc", TaskType.BEAM_CALC), lambda task: release.wait(5), lambda task, error: done.append(task.task_id))
+
+        # Then
+        # Uploads still have their own slots
+        assert TaskType.BEAM_CALC not in pool.available_types()
+        assert TaskType.UPLOAD in pool.available_types()
+        with pytest.raises(RuntimeError):
+            pool.submit(make_task("calc-2", TaskType.BEAM_CALC), lambda task: None, lambda task, error: None)
+
+        pool.submit(make_task("up", TaskType.UPLOAD), lambda task: None, lambda task, error: done.append(task.task_id))
+        assert pool.active_count() >= 1
+        release.set()
+        assert pool.wait_idle(timeout=5)
+        assert sorted(done) == ["calc", "up"]
+        assert TaskType.BEAM_CALC in pool.available_types()
+
+    def test_unlisted_types_get_the_default_limit(self, pool: TaskWorkerPool):
+        assert pool.limit(TaskType.CONVERT) == 1
+        assert pool.limit(TaskType.UPLOAD) == 2
+
+    def test_on_done_receives_the_error(self, pool: TaskWorkerPool):
+        # Given
+        finished = threading.Event()
+        results = []
+
+        def fail(task):
+            raise OSError("share unavailable")
+
+        def on_done(task, error):
+            results.append((task.task_id, error))
+            finished.set()
+
+        # When
+        pool.submit(make_task("up", TaskType.UPLOAD), fail, on_done)
+
+        # Then
+        assert finished.wait(5)
+        assert results[0][0] == "up"
+        assert isinstance(results[0][1], OSError)
+        # The slot is free again before on_done runs
+        assert pool.available_types().count(TaskType.UPLOAD) == 1
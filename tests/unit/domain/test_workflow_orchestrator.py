@@ -1,21 +1,27 @@
 import pytest
 from unittest.mock import MagicMock, patch
+import threading
 import time
 
 # Domain interfaces
 from mqi_communicator.domain.interfaces import ITaskScheduler, ISystemMonitor
-from mqi_communicator.domain.models import Task, TaskType, TaskStatus
+from mqi_communicator.domain.models import CaseStatus, Job, JobStatus, Task, TaskType, TaskStatus
 
 # Service interfaces
 from mqi_communicator.services.interfaces import ICaseService, ITransferService
 
 # Target for testing
 from mqi_communicator.domain.workflow_orchestrator import WorkflowOrchestrator
+from mqi_communicator.domain.task_scheduler import TaskScheduler
+from mqi_communicator.domain.task_worker_pool import TaskWorkerPool
+from mqi_communicator.services.resource_service import ResourceService
 
 @pytest.fixture
 def mock_case_service():
     service = MagicMock(spec=ICaseService)
     service.scan_for_new_cases.return_value = ["case_001"] # Found one new case
+    service.watch_for_new_cases.return_value = None # No watcher
+    service.beam_counts.return_value = {}
     return service
 
 @pytest.fixture
@@ -96,7 +102,7 @@ class TestWorkflowOrchestrator:
         mock_case_service.scan_for_new_cases.assert_called_once()
 
         # It should have scheduled the new case found ("case_001")
-        mock_task_scheduler.schedule_case.assert_called_once_with("case_001")
+        mock_task_scheduler.schedule_cases.assert_called_once_with(["case_001"])
 
         # It should have started processing tasks from the queue
         mock_task_scheduler.get_next_task.assert_called()
@@ -108,3 +114,265 @@ class TestWorkflowOrchestrator:
         # Then
         # The stop event should be set, which would terminate the main loop
         assert orchestrator._stop_event.is_set()
+
+    def test_state_is_flushed_after_each_completed_task(self, mock_case_service, mock_task_scheduler, mock_transfer_service, mock_system_monitor):
+        # Given
+        state_manager = MagicMock()
+        job_service = MagicMock()
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=job_service,
+            task_scheduler=mock_task_scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            state_manager=state_manager,
+        )
+        task = Task(task_id="t1", job_id="j1", type=TaskType.UPLOAD, status=TaskStatus.PENDING)
+
+        # When
+        orchestrator.execute_task(task)
+
+        # Then
+        mock_task_scheduler.complete_task.assert_called_once_with("t1")
+        state_manager.flush.assert_called_once()
+
+    def test_maintenance_archives_and_flushes(self, mock_case_service, mock_task_scheduler, mock_transfer_service, mock_system_monitor):
+        # Given
+        state_manager = MagicMock()
+        retention_service = MagicMock()
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=mock_task_scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            state_manager=state_manager,
+            retention_service=retention_service,
+        )
+
+        # When
+        orchestrator.run_maintenance()
+        retention_service.archive_expired.side_effect = OSError("disk full")
+        orchestrator.run_maintenance()
+
+        # Then
+        assert retention_service.archive_expired.call_count == 2
+        state_manager.flush.assert_called_once()
+
+    def test_start_recovers_unfinished_tasks_once(self, mock_case_service, mock_task_scheduler, mock_transfer_service, mock_system_monitor):
+        # Given
+        # Nothing is ready however often the main loop asks
+        mock_task_scheduler.get_next_task.side_effect = None
+        mock_task_scheduler.get_next_task.return_value = None
+        reconciler = MagicMock(return_value=False)
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=mock_task_scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            task_reconciler=reconciler,
+        )
+
+        # When
+        orchestrator.start()
+        orchestrator.stop()
+        orchestrator.start()
+        orchestrator.stop()
+
+        # Then
+        mock_task_scheduler.recover.assert_called_once()
+        [reconcile] = mock_task_scheduler.recover.call_args.args
+        interrupted = Task(task_id="t1", job_id="j1", type=TaskType.UPLOAD, status=TaskStatus.RUNNING)
+        assert reconcile(interrupted) is False
+        reconciler.assert_called_once_with(interrupted)
+        assert mock_task_scheduler.recover.call_args.kwargs["release"] == orchestrator._release_gpus
+
+    def test_recovery_frees_the_gpus_of_interrupted_tasks(self, mock_case_service, mock_task_scheduler, mock_transfer_service, mock_system_monitor):
+        # Given
+        resource_service = MagicMock()
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=mock_task_scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            resource_service=resource_service,
+        )
+        interrupted = Task(
+            task_id="t1", job_id="gone", type=TaskType.BEAM_CALC, status=TaskStatus.RUNNING,
+            parameters={"gpu_ids": [2], "gpu_share": 0.5, "gpu_memory_mb": 4000.0},
+        )
+        mock_task_scheduler.recover.side_effect = lambda reconcile, release: release(interrupted)
+        mock_task_scheduler.get_next_task.side_effect = None
+        mock_task_scheduler.get_next_task.return_value = None
+
+        # When
+        orchestrator.start()
+        orchestrator.stop()
+
+        # Then
+        resource_service.release_gpus.assert_called_once_with([2], memory_mb=4000.0, share=0.5)
+
+    def test_watched_cases_wake_the_main_loop(self, mock_case_service, mock_task_scheduler, mock_transfer_service, mock_system_monitor):
+        # Given
+        # The watcher reports one case; scanning finds nothing
+        def watch(timeout):
+            if not hasattr(watch, "called"):
+                watch.called = True
+                return ["case_009"]
+            time.sleep(0.01)
+            return []
+        mock_case_service.watch_for_new_cases.side_effect = watch
+        mock_case_service.scan_for_new_cases.return_value = []
+        mock_task_scheduler.get_next_task.side_effect = None
+        mock_task_scheduler.get_next_task.return_value = None
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=mock_task_scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            scan_interval=60,
+        )
+
+        # When
+        orchestrator.start()
+        deadline = time.monotonic() + 5
+        while not mock_task_scheduler.schedule_cases.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        orchestrator.stop()
+
+        # Then
+        # The case was scheduled long before the 60 s scan interval elapsed
+        mock_task_scheduler.schedule_cases.assert_called_once_with(["case_009"])
+
+    def test_case_processed_on_demand_is_claimed_from_the_scheduler(self, mock_case_service, mock_transfer_service, mock_system_monitor):
+        # Given
+        job = Job(job_id="j1", case_id="case_001", status=JobStatus.PENDING, gpu_allocation=[], priority=1, created_at=None)
+        job_service = MagicMock()
+        job_service.create_job.return_value = job
+        job_service.get.return_value = job
+        mock_case_service.beam_counts.return_value = {}
+        scheduler = TaskScheduler(case_service=mock_case_service, job_service=job_service)
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=job_service,
+            task_scheduler=scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+        )
+
+        # When
+        orchestrator.process_case("case_001")
+
+        # Then
+        # Nothing is left for the main loop to run again
+        mock_transfer_service.upload_case.assert_called_once_with("case_001")
+        mock_transfer_service.download_results.assert_called_once_with("case_001")
+        assert scheduler.get_next_task() is None
+        mock_case_service.update_case_statuses.assert_called_once_with({"case_001": CaseStatus.COMPLETED})
+        job_service.finish_jobs.assert_called_once_with({"j1": JobStatus.COMPLETED})
+
+    def test_failed_task_is_reported_to_the_scheduler(self, mock_case_service, mock_task_scheduler, mock_transfer_service, mock_system_monitor):
+        # Given
+        mock_transfer_service.upload_case.side_effect = OSError("share unavailable")
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=mock_task_scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+        )
+
+        # When
+        orchestrator.execute_task(Task(task_id="t1", job_id="j1", type=TaskType.UPLOAD, status=TaskStatus.RUNNING))
+        orchestrator.execute_task(Task(task_id="t2", job_id="j1", type=TaskType.INTERPRET, status=TaskStatus.RUNNING))
+
+        # Then
+        # The failed upload fails its successors; a task without a handler just completes
+        mock_task_scheduler.fail_task.assert_called_once_with("t1")
+        mock_task_scheduler.complete_task.assert_called_once_with("t2")
+
+    def test_transfers_run_while_a_calculation_is_running(self, mock_case_service, mock_transfer_service, mock_system_monitor):
+        # Given
+        # Case 1 is calculating when case 2's upload becomes ready
+        mock_case_service.scan_for_new_cases.return_value = []
+        scheduler = TaskScheduler(case_service=mock_case_service, job_service=MagicMock())
+        scheduler.schedule_tasks([
+            Task(task_id="calc-1", job_id="j1", type=TaskType.BEAM_CALC, status=TaskStatus.PENDING),
+            Task(task_id="upload-2", job_id="j2", type=TaskType.UPLOAD, status=TaskStatus.PENDING),
+        ])
+        calculation_done = threading.Event()
+        uploaded = threading.Event()
+        mock_transfer_service.upload_case.side_effect = lambda case_id: uploaded.set()
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            scan_interval=60,
+            worker_pool=TaskWorkerPool({TaskType.BEAM_CALC: 1, TaskType.UPLOAD: 4}),
+        )
+        orchestrator._task_handlers[TaskType.BEAM_CALC] = lambda task, job: calculation_done.wait(5)
+
+        # When
+        orchestrator.start()
+        try:
+            # Then
+            assert uploaded.wait(5)
+            assert not calculation_done.is_set()
+        finally:
+            calculation_done.set()
+            orchestrator.stop()
+
+    def test_each_beam_gets_its_own_gpu(self, mock_case_service, mock_transfer_service, mock_system_monitor):
+        # Given
+        # Three beams of one case, but only two GPUs
+        mock_case_service.scan_for_new_cases.return_value = []
+        allocated = []
+        repo = MagicMock()
+        repo.get_allocated_gpus.side_effect = lambda: list(allocated)
+        repo.set_allocated_gpus.side_effect = lambda gpu_ids: allocated.__setitem__(slice(None), gpu_ids)
+        resource_service = ResourceService(repo, total_gpu_count=2, min_disk_space_gb=0)
+        scheduler = TaskScheduler(case_service=mock_case_service, job_service=MagicMock())
+        scheduler.schedule_tasks([
+            Task(task_id=f"beam-{beam}", job_id="j1", type=TaskType.BEAM_CALC, status=TaskStatus.PENDING)
+            for beam in (1, 2, 3)
+        ])
+        running = {}
+        two_running = threading.Barrier(3)
+        release = threading.Event()
+        def calculate(task, job):
+            running[task.task_id] = list(task.parameters["gpu_ids"])
+            if len(running) <= 2:
+                two_running.wait(5)
+                release.wait(5)
+        orchestrator = WorkflowOrchestrator(
+            case_service=mock_case_service,
+            job_service=MagicMock(),
+            task_scheduler=scheduler,
+            transfer_service=mock_transfer_service,
+            system_monitor=mock_system_monitor,
+            worker_pool=TaskWorkerPool({TaskType.BEAM_CALC: 8}),
+            resource_service=resource_service,
+        )
+        orchestrator._task_handlers[TaskType.BEAM_CALC] = calculate
+
+        # When
+        orchestrator.start()
+        try:
+            two_running.wait(5)
+
+            # Then
+            assert sorted(gpu for gpus in running.values() for gpu in gpus) == [0, 1]
+            release.set()
+            deadline = time.monotonic() + 5
+            while (len(running) < 3 or allocated) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(running) == 3
+            assert allocated == []
+        finally:
+            release.set()
+            orchestrator.stop()
@@ -113,3 +113,32 @@ class TestConfigLoader:
         # When / Then
         with pytest.raises(ConfigurationError, match="Configuration file not found"):
             ConfigLoader.load_config("non_existent_file.yaml")
+
+    def test_load_config_scan_roots(self, tmp_path: Path):
+        # Given
+        content = {
+            "paths": {
+                "local_logdata": "/test/local",
+                "remote_workspace": "/test/remote",
+                "scan_roots": [
+                    {"path": "/rooms/a", "priority": 2},
+                    {"path": "/rooms/b", "weight": 0.5, "scan_interval_seconds": 120},
+                ],
+            },
+            "ssh": {
+                "host": "testhost",
+                "username": "testuser",
+            },
+        }
+        file_path = tmp_path / "config.yaml"
+        with open(file_path, "w") as f:
+            yaml.dump(content, f)
+
+        # When
+        config = ConfigLoader.load_config(str(file_path))
+
+        # Then
+        assert [root.path for root in config.paths.scan_roots] == ["/rooms/a", "/rooms/b"]
+        assert config.paths.scan_roots[0].priority == 2
+        assert config.paths.scan_roots[1].weight == 0.5
+        assert config.paths.scan_roots[1].scan_interval_seconds == 120
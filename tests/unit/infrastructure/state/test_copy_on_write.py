@@ -0,0 +1,86 @@
+import pytest
+
+# Target for testing
+from mqi_communicator.infrastructure.state.copy_on_write import CopyOnWriteState
+
+@pytest.fixture
+def base() -> dict:
+    return {
+        "cases": {"c1": {"status": "new"}, "c2": {"status": "new"}},
+        "jobs": {"j1": {"case_id": "c1"}},
+        "counter": 0,
+    }
+
+class TestCopyOnWriteState:
+    def test_untouched_commit_returns_base(self, base: dict):
+        view = CopyOnWriteState(base)
+        _ = view["cases"]["c1"]
+
+        new_state, changes = view.commit()
+
+        assert changes == {}
+        assert new_state is base
+
+    def test_entity_write_only_copies_its_section(self, base: dict):
+        view = CopyOnWriteState(base)
+        view["cases"]["c3"] = {"status": "new"}
+
+        new_state, changes = view.commit()
+
+        assert changes == {"cases": {"c3"}}
+        assert new_state["jobs"] is base["jobs"]
+        assert new_state["cases"]["c1"] is base["cases"]["c1"]
+        assert "c3" not in base["cases"]
+
+    def test_new_entities_keep_their_write_order(self, base: dict):
+        view = CopyOnWriteState(base)
+        new_ids = [f"c{i}" for i in range(50, 2, -1)]
+        for case_id in new_ids:
+            view["cases"][case_id] = {"status": "new"}
+
+        new_state, _ = view.commit()
+
+        assert list(new_state["cases"]) == ["c1", "c2"] + new_ids
+
+    def test_in_place_entity_edit_is_detected(self, base: dict):
+        view = CopyOnWriteState(base)
+        view["cases"]["c1"]["status"] = "queued"
+
+        new_state, changes = view.commit()
+
+        assert changes == {"cases": {"c1"}}
+        assert new_state["cases"]["c1"] == {"status": "queued"}
+        assert base["cases"]["c1"] == {"status": "new"}
+
+    def test_deletions(self, base: dict):
+        view = CopyOnWriteState(base)
+        del view["cases"]["c2"]
+        del view["counter"]
+
+        new_state, changes = view.commit()
+
+        assert changes == {"cases": {"c2"}, "counter": None}
+        assert "counter" not in new_state
+        assert set(new_state["cases"]) == {"c1"}
+        assert set(view["cases"]) == {"c1"}
+
+    def test_replacing_a_section(self, base: dict):
+        view = CopyOnWriteState(base)
+        _ = view["cases"]["c1"]
+        view["cases"] = {}
+
+        new_state, changes = view.commit()
+
+        assert changes == {"cases": None}
+        assert new_state["cases"] == {}
+
+    def test_mapping_behaviour(self, base: dict):
+        view = CopyOnWriteState(base)
+        view["extra"] = 1
+        del view["counter"]
+
+        assert "extra" in view
+        assert "counter" not in view
+        assert len(view) == 3
+        assert view.get("counter", "missing") == "missing"
+        assert sorted(view["cases"].keys()) == ["c1", "c2"]
@@ -0,0 +1,170 @@
+import pytest
+import json
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.infrastructure.state.journaled_state_manager import (
+    JournaledStateManager, operations_for_changes
+)
+
+@pytest.fixture
+def state_file(tmp_path: Path) -> Path:
+    return tmp_path / "state.json"
+
+def read_journal(state_file: Path) -> list:
+    journal = state_file.with_suffix(".json.journal")
+    with open(journal, "r") as f:
+        return [json.loads(line) for line in f]
+
+class TestJournaledStateManager:
+    def test_commit_appends_only_changed_entities(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file)
+        with manager.transaction() as tx:
+            tx.get_state()["cases"] = {"c1": {"status": "new"}, "c2": {"status": "new"}}
+
+        # When
+        with manager.transaction() as tx:
+            tx.get_state()["cases"]["c2"] = {"status": "queued"}
+
+        # Then
+        entries = read_journal(state_file)
+        assert entries[-1]["ops"] == [["set", ["cases", "c2"], {"status": "queued"}]]
+        manager.close()
+
+    def test_restart_replays_snapshot_and_journal(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file)
+        manager.set("counter", 1)
+        with manager.transaction() as tx:
+            tx.get_state()["jobs"] = {"j1": {"case_id": "c1"}}
+        manager.close()
+
+        # When
+        reopened = JournaledStateManager(state_file)
+
+        # Then
+        assert reopened.get("counter") == 1
+        assert reopened.get("jobs") == {"j1": {"case_id": "c1"}}
+        reopened.close()
+
+    def test_torn_journal_entry_is_discarded(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file)
+        manager.set("status", "initial")
+        manager.close()
+        with open(state_file.with_suffix(".json.journal"), "a") as f:
+            f.write('{"seq": 2, "ops": [["set", ["status"], "par')
+
+        # When
+        reopened = JournaledStateManager(state_file)
+        reopened.set("other", "value")
+        reopened.close()
+
+        # Then
+        again = JournaledStateManager(state_file)
+        assert again.get("status") == "initial"
+        assert again.get("other") == "value"
+        again.close()
+
+    def test_compaction_folds_journal_into_snapshot(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file)
+        for i in range(5):
+            manager.set(f"key{i}", i)
+
+        # When
+        manager.compact()
+
+        # Then
+        assert read_journal(state_file) == []
+        manager.close()
+        reopened = JournaledStateManager(state_file)
+        assert reopened.get("key4") == 4
+        reopened.close()
+
+    def test_journal_entries_already_in_snapshot_are_skipped(self, state_file: Path):
+        # Simulates a crash after the snapshot rename but before the journal rewrite.
+        # Given
+        manager = JournaledStateManager(state_file)
+        with manager.transaction() as tx:
+            tx.get_state()["items"] = {"a": 1}
+        journal_before = state_file.with_suffix(".json.journal").read_text()
+        manager.compact()
+        manager.close()
+        state_file.with_suffix(".json.journal").write_text(journal_before)
+
+        # When
+        reopened = JournaledStateManager(state_file)
+
+        # Then
+        assert reopened.get("items") == {"a": 1}
+        reopened.close()
+
+    def test_background_compaction_after_threshold(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file, compact_threshold_bytes=200)
+
+        # When
+        for i in range(20):
+            manager.set("counter", i)
+        manager.close()
+
+        # Then
+        reopened = JournaledStateManager(state_file)
+        assert reopened.get("counter") == 19
+        reopened.close()
+
+    def test_adopts_existing_json_state_file(self, state_file: Path):
+        # Given
+        with open(state_file, "w") as f:
+            json.dump({"key1": "value1"}, f)
+
+        # When
+        manager = JournaledStateManager(state_file)
+
+        # Then
+        assert manager.get("key1") == "value1"
+        manager.close()
+
+    def test_rollback_writes_nothing(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file)
+        manager.set("status", "initial")
+
+        # When
+        with pytest.raises(ValueError):
+            with manager.transaction() as tx:
+                tx.get_state()["status"] = "modified"
+                raise ValueError("Something went wrong")
+
+        # Then
+        assert manager.get("status") == "initial"
+        assert len(read_journal(state_file)) == 1
+        manager.close()
+
+    def test_write_behind_groups_commits_into_one_entry(self, state_file: Path):
+        # Given
+        manager = JournaledStateManager(state_file, write_behind=True, flush_interval=60.0)
+
+        # When
+        for i in range(10):
+            with manager.transaction() as tx:
+                tx.get_state().setdefault("cases", {})[f"c{i}"] = {"status": "new"}
+        manager.flush()
+
+        # Then
+        entries = read_journal(state_file)
+        assert len(entries) == 1
+        manager.close()
+        reopened = JournaledStateManager(state_file)
+        assert len(reopened.get("cases")) == 10
+        reopened.close()
+
+def test_operations_for_changes_reports_deletions():
+    state = {"cases": {"c1": {}}}
+    ops = operations_for_changes(state, {"old": None, "cases": {"c1", "c2"}})
+    assert ["del", ["old"]] in ops
+    assert ["del", ["cases", "c2"]] in ops
+    assert ["set", ["cases", "c1"], {}] in ops
+    assert len(ops) == 3
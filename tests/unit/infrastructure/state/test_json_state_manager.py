@@ -3,9 +3,11 @@ import json
 import threading
 from pathlib import Path
 import time
+import os
 
 # Target for testing
 from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+from mqi_communicator.infrastructure.state.interfaces import Durability
 
 @pytest.fixture
 def state_file(tmp_path: Path) -> Path:
@@ -134,3 +136,173 @@ class TestJsonStateManager:
         # The file should still contain the original data
         with open(state_file, "r") as f:
             assert json.load(f) == {"data": "original"}
+
+    def test_transaction_shares_untouched_entities(self, state_file: Path):
+        # Given
+        manager = JsonStateManager(state_file)
+        with manager.transaction() as tx:
+            tx.get_state()["cases"] = {"c1": {"status": "new"}, "c2": {"status": "new"}}
+        before = manager._state
+
+        # When
+        with manager.transaction() as tx:
+            tx.get_state()["cases"]["c2"]["status"] = "queued"
+
+        # Then
+        after = manager._state
+        assert after["cases"]["c1"] is before["cases"]["c1"]
+        assert after["cases"]["c2"] == {"status": "queued"}
+        assert before["cases"]["c2"] == {"status": "new"}
+
+    def test_read_only_transaction_does_not_persist(self, state_file: Path, monkeypatch):
+        # Given
+        manager = JsonStateManager(state_file)
+        manager.set("cases", {"c1": {"status": "new"}})
+        persist_calls = []
+        monkeypatch.setattr(manager, "_persist", lambda *args, **kwargs: persist_calls.append(1))
+
+        # When
+        with manager.transaction(read_only=True) as tx:
+            cases = tx.get_state()["cases"]
+
+        # Then
+        assert cases == {"c1": {"status": "new"}}
+        assert persist_calls == []
+
+    def test_unchanged_write_transaction_does_not_persist(self, state_file: Path, monkeypatch):
+        # Given
+        manager = JsonStateManager(state_file)
+        manager.set("cases", {"c1": {"status": "new"}})
+        persist_calls = []
+        monkeypatch.setattr(manager, "_persist", lambda *args, **kwargs: persist_calls.append(1))
+
+        # When
+        with manager.transaction() as tx:
+            state = tx.get_state()
+            if "cases" not in state:
+                state["cases"] = {}
+            _ = state["cases"]["c1"]["status"]
+
+        # Then
+        assert persist_calls == []
+
+    def test_reads_do_not_wait_for_file_io(self, state_file: Path, monkeypatch):
+        # Given
+        manager = JsonStateManager(state_file)
+        manager.set("key", "before")
+        writing = threading.Event()
+        release = threading.Event()
+        original_write = manager._write
+        def slow_write(*args, **kwargs):
+            writing.set()
+            release.wait(5)
+            return original_write(*args, **kwargs)
+        monkeypatch.setattr(manager, "_write", slow_write)
+        writer = threading.Thread(target=manager.set, args=("key", "after"))
+
+        # When
+        writer.start()
+        writing.wait(5)
+        value = manager.get("key")
+        with manager.transaction(read_only=True) as tx:
+            snapshot_value = tx.get_state()["key"]
+        release.set()
+        writer.join()
+
+        # Then
+        # The new state is visible as soon as it is swapped in, before the write finishes.
+        assert value == "after"
+        assert snapshot_value == "after"
+        stats = manager.lock_stats()
+        assert stats["read"].acquisitions == 2
+        assert stats["write"].acquisitions >= 2
+        assert stats["io"].total_hold > 0
+
+class TestWriteBehind:
+    def test_commits_are_coalesced_into_one_write(self, state_file: Path, monkeypatch):
+        # Given
+        manager = JsonStateManager(state_file, write_behind=True, flush_interval=10.0)
+        writes = []
+        original_persist = manager._persist
+        def counting_persist(*args, **kwargs):
+            writes.append(1)
+            return original_persist(*args, **kwargs)
+        monkeypatch.setattr(manager, "_persist", counting_persist)
+
+        # When
+        for i in range(50):
+            with manager.transaction() as tx:
+                tx.get_state().setdefault("cases", {})[f"case{i}"] = {"status": "new"}
+        manager.flush()
+
+        # Then
+        assert len(writes) == 1
+        with open(state_file, "r") as f:
+            assert len(json.load(f)["cases"]) == 50
+        manager.close()
+
+    def test_flush_happens_after_window(self, state_file: Path):
+        # Given
+        manager = JsonStateManager(state_file, write_behind=True, flush_interval=0.01)
+
+        # When
+        manager.set("key", "value")
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with open(state_file, "r") as f:
+                if json.load(f).get("key") == "value":
+                    break
+            time.sleep(0.01)
+
+        # Then
+        with open(state_file, "r") as f:
+            assert json.load(f)["key"] == "value"
+        manager.close()
+
+    def test_max_commits_triggers_flush(self, state_file: Path):
+        # Given
+        manager = JsonStateManager(
+            state_file, write_behind=True, flush_interval=60.0, flush_max_commits=3
+        )
+
+        # When
+        for i in range(3):
+            manager.set(f"key{i}", i)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with open(state_file, "r") as f:
+                if "key2" in json.load(f):
+                    break
+            time.sleep(0.01)
+
+        # Then
+        with open(state_file, "r") as f:
+            assert json.load(f)["key2"] == 2
+        manager.close()
+
+    def test_close_writes_pending_commits(self, state_file: Path):
+        # Given
+        manager = JsonStateManager(state_file, write_behind=True, flush_interval=60.0)
+        manager.set("key", "value")
+
+        # When
+        manager.close()
+
+        # Then
+        with open(state_file, "r") as f:
+            assert json.load(f)["key"] == "value"
+
+    def test_commit_durability_writes_synchronously_with_fsync(self, state_file: Path, monkeypatch):
+        # Given
+        manager = JsonStateManager(state_file, write_behind=True, durability=Durability.COMMIT)
+        fsyncs = []
+        original_fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: (fsyncs.append(fd), original_fsync(fd)))
+
+        # When
+        manager.set("key", "value")
+
+        # Then
+        assert fsyncs
+        with open(state_file, "r") as f:
+            assert json.load(f)["key"] == "value"
@@ -0,0 +1,99 @@
+import pytest
+import threading
+import time
+
+# Target for testing
+from mqi_communicator.infrastructure.state.rw_lock import ReadWriteLock, InstrumentedLock
+
+class TestReadWriteLock:
+    def test_readers_share_the_lock(self):
+        # Given
+        lock = ReadWriteLock()
+        inside = threading.Barrier(3, timeout=5)
+
+        def reader():
+            with lock.read():
+                inside.wait()  # Only passes if all three hold the read lock at once
+
+        # When
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Then
+        assert lock.stats()["read"].acquisitions == 3
+
+    def test_writer_excludes_readers(self):
+        # Given
+        lock = ReadWriteLock()
+        events = []
+        writer_holds = threading.Event()
+
+        def reader():
+            writer_holds.wait()
+            with lock.read():
+                events.append("read")
+
+        t = threading.Thread(target=reader)
+        t.start()
+
+        # When
+        with lock.write():
+            writer_holds.set()
+            time.sleep(0.05)
+            events.append("write done")
+        t.join()
+
+        # Then
+        assert events == ["write done", "read"]
+        assert lock.stats()["read"].contended == 1
+
+    def test_write_lock_is_reentrant_and_allows_reads(self):
+        lock = ReadWriteLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        assert lock.stats()["write"].acquisitions == 1
+
+    def test_upgrade_is_rejected(self):
+        lock = ReadWriteLock()
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                with lock.write():
+                    pass
+
+    def test_hold_time_is_recorded(self):
+        lock = ReadWriteLock()
+        with lock.write():
+            time.sleep(0.01)
+        assert lock.stats()["write"].total_hold >= 0.01
+
+class TestInstrumentedLock:
+    def test_records_wait_and_hold(self):
+        # Given
+        lock = InstrumentedLock()
+        holder_in = threading.Event()
+
+        def holder():
+            with lock:
+                holder_in.set()
+                time.sleep(0.05)
+
+        t = threading.Thread(target=holder)
+        t.start()
+        holder_in.wait()
+
+        # When
+        with lock:
+            pass
+        t.join()
+
+        # Then
+        stats = lock.stats()
+        assert stats.acquisitions == 2
+        assert stats.contended == 1
+        assert stats.max_wait > 0
+        assert stats.total_hold >= 0.05
@@ -0,0 +1,150 @@
+import pytest
+import io
+import json
+from pathlib import Path
+
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+from mqi_communicator.infrastructure.state.journaled_state_manager import JournaledStateManager
+
+# Target for testing
+from mqi_communicator.infrastructure.state import serializers
+from mqi_communicator.infrastructure.state.lazy_section import LazySection
+from mqi_communicator.infrastructure.state.serializers import (
+    CorruptStateError, get_serializer, load_state, open_state
+)
+from mqi_communicator.domain.models import CaseStatus
+from mqi_communicator.domain.repositories.json_repositories import CaseRepository
+
+STATE = {
+    "cases": {"c1": {"status": "new", "beam_count": 2, "metadata": {"files": [1, 2.5, None, True]}}},
+    "résumé": "ünïcode",
+}
+
+def encode(name: str) -> bytes:
+    buffer = io.BytesIO()
+    get_serializer(name).dump(STATE, buffer)
+    return buffer.getvalue()
+
+class TestSerializers:
+    @pytest.mark.parametrize("name", ["json", "pretty_json", "orjson", "pickle5", "marshal", "indexed"])
+    def test_round_trip_with_auto_detection(self, name: str):
+        assert load_state(encode(name)) == STATE
+
+    def test_compact_json_is_smaller_than_pretty_json(self):
+        compact = encode("json")
+        assert json.loads(compact) == STATE
+        assert len(compact) < len(encode("pretty_json"))
+
+    def test_orjson_falls_back_to_json_when_missing(self, monkeypatch):
+        monkeypatch.setattr(serializers, "orjson", None)
+        assert get_serializer("orjson").name == "json"
+        assert load_state(encode("orjson")) == STATE
+
+    @pytest.mark.parametrize("data", [b"", b"  \n", b'{"cases": ', b"\x00MQISTATE marshal", b"\x00MQISTATE nope\n{}",
+                                      b"\x00MQISTATE indexed\n00000000000000000003"])
+    def test_corrupt_data_raises(self, data: bytes):
+        with pytest.raises(CorruptStateError):
+            load_state(data)
+
+    def test_unknown_serializer_name(self):
+        with pytest.raises(ValueError):
+            get_serializer("yaml")
+
+class TestStateManagerSerializers:
+    @pytest.mark.parametrize("name", ["pickle5", "marshal", "orjson"])
+    def test_state_survives_restart(self, tmp_path: Path, name: str):
+        state_file = tmp_path / "state.json"
+        manager = JsonStateManager(state_file, serializer=name)
+        manager.set("cases", STATE["cases"])
+
+        assert JsonStateManager(state_file).get("cases") == STATE["cases"]
+
+    def test_switching_serializer_rewrites_in_new_format(self, tmp_path: Path):
+        state_file = tmp_path / "state.json"
+        JsonStateManager(state_file, serializer="pretty_json").set("counter", 1)
+
+        manager = JsonStateManager(state_file, serializer="marshal")
+        assert manager.get("counter") == 1
+        manager.set("counter", 2)
+
+        assert state_file.read_bytes().startswith(b"\x00MQISTATE marshal\n")
+        assert JsonStateManager(state_file).get("counter") == 2
+
+    def test_journal_snapshot_uses_serializer(self, tmp_path: Path):
+        state_file = tmp_path / "state.json"
+        manager = JournaledStateManager(state_file, serializer="pickle5")
+        manager.set("counter", 5)
+        manager.compact()
+        manager.close()
+
+        assert state_file.read_bytes().startswith(b"\x00MQISTATE pickle5\n")
+        reopened = JournaledStateManager(state_file)
+        assert reopened.get("counter") == 5
+        reopened.close()
+
+def write_cases(state_file: Path, count: int):
+    cases = {f"c{i}": {"case_id": f"c{i}", "status": "new", "created_at": f"2024-01-{i % 28 + 1:02d}"}
+             for i in range(count)}
+    with state_file.open("wb") as f:
+        get_serializer("indexed").dump({"cases": cases, "resources": {"allocated_gpus": [1]}}, f)
+    return cases
+
+class TestIndexedStateFile:
+    def test_open_decodes_nothing_until_accessed(self, tmp_path: Path):
+        state_file = tmp_path / "state.json"
+        cases = write_cases(state_file, 100)
+
+        state = open_state(state_file)
+        section = state["cases"]
+        assert isinstance(section, LazySection)
+        assert section._entries is None
+        assert state["resources"] == {"allocated_gpus": [1]}
+
+        assert section["c7"] == cases["c7"]
+        assert section["c7"] is section["c7"]
+        assert section.raw("c7") is None
+        assert section.raw("c8") == json.dumps(cases["c8"], separators=(",", ":")).encode()
+
+    def test_transaction_keeps_untouched_entities_encoded(self, tmp_path: Path):
+        state_file = tmp_path / "state.json"
+        cases = write_cases(state_file, 50)
+        manager = JsonStateManager(state_file, serializer="indexed")
+
+        with manager.transaction() as tx:
+            tx.get_state()["cases"]["c1"]["status"] = "processing"
+            tx.get_state()["cases"]["c99"] = {"case_id": "c99", "status": "new"}
+
+        with manager.transaction(read_only=True) as tx:
+            section = tx.get_state()["cases"]
+            assert isinstance(section, LazySection)
+            assert section.raw("c2") is not None
+            assert len(section) == 51
+
+        reopened = JsonStateManager(state_file)
+        stored = reopened.get("cases")
+        assert stored["c1"]["status"] == "processing"
+        assert stored["c99"] == {"case_id": "c99", "status": "new"}
+        assert stored["c2"] == cases["c2"]
+
+    def test_snapshot_survives_file_replacement(self, tmp_path: Path):
+        state_file = tmp_path / "state.json"
+        cases = write_cases(state_file, 10)
+        manager = JsonStateManager(state_file, serializer="indexed")
+        with manager.transaction(read_only=True) as tx:
+            snapshot = tx.get_state()["cases"]
+
+        manager.set("cases", {})
+
+        assert snapshot.to_dict() == cases
+
+    def test_repository_does_not_decode_on_construction(self, tmp_path: Path):
+        state_file = tmp_path / "state.json"
+        write_cases(state_file, 20)
+        manager = JsonStateManager(state_file, serializer="indexed")
+
+        repository = CaseRepository(manager)
+        with manager.transaction(read_only=True) as tx:
+            assert tx.get_state()["cases"]._entries is None
+
+        assert len(repository.get_all_case_ids()) == 20
+        assert repository.count_by_status(CaseStatus.NEW) == 20
@@ -0,0 +1,210 @@
+import pytest
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.infrastructure.state.sharded_state_manager import ShardedJsonStateManager
+
+@pytest.fixture
+def state_file(tmp_path: Path) -> Path:
+    return tmp_path / "state.json"
+
+def shard_dir(state_file: Path) -> Path:
+    return state_file.with_suffix(".shards")
+
+def mtimes(directory: Path) -> dict:
+    return {p.relative_to(directory).as_posix(): p.stat().st_mtime_ns for p in directory.rglob("*.json")}
+
+class TestShardedJsonStateManager:
+    def test_sections_and_entities_get_their_own_files(self, state_file: Path):
+        # Given
+        manager = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+
+        # When
+        with manager.transaction() as tx:
+            state = tx.get_state()
+            state["cases"] = {"c1": {"status": "new"}, "case/2": {"status": "new"}}
+            state["resources"] = {"allocated_gpus": []}
+
+        # Then
+        files = set(mtimes(shard_dir(state_file)))
+        assert files == {"manifest.json", "resources.json", "cases/c1.json", "cases/case%2F2.json"}
+        with open(shard_dir(state_file) / "cases" / "case%2F2.json") as f:
+            assert json.load(f) == {"status": "new"}
+
+    def test_commit_rewrites_only_changed_shards(self, state_file: Path):
+        # Given
+        manager = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+        with manager.transaction() as tx:
+            state = tx.get_state()
+            state["cases"] = {f"c{i}": {"status": "new"} for i in range(5)}
+            state["resources"] = {"allocated_gpus": []}
+        for path in shard_dir(state_file).rglob("*.json"):
+            os.utime(path, ns=(0, 0))
+
+        # When
+        with manager.transaction() as tx:
+            tx.get_state()["resources"]["allocated_gpus"] = [0, 1]
+        with manager.transaction() as tx:
+            tx.get_state()["cases"]["c3"]["status"] = "queued"
+
+        # Then
+        changed = {name for name, mtime in mtimes(shard_dir(state_file)).items() if mtime != 0}
+        assert changed == {"resources.json", "cases/c3.json"}
+
+    def test_restart_reads_shards_and_deleted_entities_stay_deleted(self, state_file: Path):
+        # Given
+        manager = ShardedJsonStateManager(state_file, entity_sections=["jobs"])
+        manager.set("jobs", {"j1": {"case_id": "c1"}, "j2": {"case_id": "c2"}})
+        with manager.transaction() as tx:
+            del tx.get_state()["jobs"]["j1"]
+        manager.set("counter", 3)
+        manager.close()
+
+        # When
+        reopened = ShardedJsonStateManager(state_file, entity_sections=["jobs"])
+
+        # Then
+        assert reopened.get("jobs") == {"j2": {"case_id": "c2"}}
+        assert reopened.get("counter") == 3
+        assert not (shard_dir(state_file) / "jobs" / "j1.json").exists()
+
+    def test_existing_state_file_is_imported(self, state_file: Path):
+        # Given
+        with open(state_file, "w") as f:
+            json.dump({"cases": {"c1": {"status": "new"}}, "resources": {"allocated_gpus": [2]}}, f)
+
+        # When
+        manager = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+
+        # Then
+        assert manager.get("cases") == {"c1": {"status": "new"}}
+        assert (shard_dir(state_file) / "cases" / "c1.json").exists()
+        assert (shard_dir(state_file) / "resources.json").exists()
+
+    def test_interrupted_multi_shard_commit_is_finished_on_load(self, state_file: Path, monkeypatch):
+        # Given
+        manager = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+        manager.set("cases", {"c1": {"status": "new"}, "c2": {"status": "new"}})
+
+        # Crash right after the manifest has recorded the commit.
+        def crash(*args):
+            raise OSError("simulated crash")
+        monkeypatch.setattr(os, "replace", crash)
+        with pytest.raises(OSError):
+            with manager.transaction() as tx:
+                cases = tx.get_state()["cases"]
+                cases["c1"] = {"status": "queued"}
+                cases["c2"] = {"status": "queued"}
+        monkeypatch.undo()
+
+        # When
+        reopened = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+
+        # Then
+        assert reopened.get("cases") == {"c1": {"status": "queued"}, "c2": {"status": "queued"}}
+        assert not list(shard_dir(state_file).rglob("*.tmp"))
+
+    def test_commit_without_manifest_record_is_discarded(self, state_file: Path):
+        # Given
+        manager = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+        manager.set("cases", {"c1": {"status": "new"}})
+        # A staged shard whose commit never reached the manifest.
+        with open(shard_dir(state_file) / "cases" / "c1.json.9.tmp", "w") as f:
+            json.dump({"status": "queued"}, f)
+
+        # When
+        reopened = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+
+        # Then
+        assert reopened.get("cases") == {"c1": {"status": "new"}}
+        assert not list(shard_dir(state_file).rglob("*.tmp"))
+
+    def test_changing_entity_sections_moves_the_section(self, state_file: Path):
+        # Given
+        manager = ShardedJsonStateManager(state_file)
+        manager.set("cases", {"c1": {"status": "new"}})
+        manager.close()
+
+        # When
+        reopened = ShardedJsonStateManager(state_file, entity_sections=["cases"])
+
+        # Then
+        assert reopened.get("cases") == {"c1": {"status": "new"}}
+        assert (shard_dir(state_file) / "cases" / "c1.json").exists()
+        assert not (shard_dir(state_file) / "cases.json").exists()
+
+def increment_counter(state_file: Path, times: int):
+    manager = ShardedJsonStateManager(state_file, multi_process=True)
+    for _ in range(times):
+        with manager.transaction() as tx:
+            state = tx.get_state()
+            state["counter"] = state.get("counter", 0) + 1
+
+class TestMultiProcessSharing:
+    def test_other_instance_sees_commits_without_restart(self, state_file: Path):
+        # Given
+        writer = ShardedJsonStateManager(state_file, entity_sections=["cases"], multi_process=True)
+        reader = ShardedJsonStateManager(state_file, entity_sections=["cases"], multi_process=True)
+        writer.set("cases", {"c1": {"status": "new"}})
+
+        # When / Then
+        assert reader.get("cases") == {"c1": {"status": "new"}}
+        with writer.transaction() as tx:
+            tx.get_state()["cases"]["c2"] = {"status": "queued"}
+        with reader.transaction(read_only=True) as tx:
+            assert dict(tx.get_state()["cases"]) == {"c1": {"status": "new"}, "c2": {"status": "queued"}}
+
+    def test_reload_reads_only_changed_entities(self, state_file: Path, monkeypatch):
+        # Given
+        writer = ShardedJsonStateManager(state_file, entity_sections=["cases"], multi_process=True)
+        writer.set("cases", {f"c{i}": {"status": "new"} for i in range(20)})
+        reader = ShardedJsonStateManager(state_file, entity_sections=["cases"], multi_process=True)
+        seen = []
+        reader.add_reload_listener(seen.append)
+        with writer.transaction() as tx:
+            tx.get_state()["cases"]["c7"] = {"status": "queued"}
+            del tx.get_state()["cases"]["c8"]
+
+        opened = []
+        original_open = Path.open
+        monkeypatch.setattr(Path, "open", lambda self, *args, **kwargs: (opened.append(self.name), original_open(self, *args, **kwargs))[1])
+
+        # When
+        cases = reader.get("cases")
+
+        # Then
+        assert cases["c7"] == {"status": "queued"} and "c8" not in cases and len(cases) == 19
+        assert sorted(name for name in opened if name != "manifest.json") == ["c7.json", "c8.json"]
+        assert seen == [{"cases": {"c7", "c8"}}]
+
+    def test_reader_far_behind_reloads_everything(self, state_file: Path, monkeypatch):
+        # Given
+        monkeypatch.setattr("mqi_communicator.infrastructure.state.sharded_state_manager._LOG_GENERATIONS", 2)
+        writer = ShardedJsonStateManager(state_file, multi_process=True)
+        reader = ShardedJsonStateManager(state_file, multi_process=True)
+
+        # When
+        for i in range(5):
+            writer.set(f"key{i}", i)
+
+        # Then
+        assert [reader.get(f"key{i}") for i in range(5)] == [0, 1, 2, 3, 4]
+
+    def test_concurrent_processes_do_not_lose_commits(self, state_file: Path):
+        # Given
+        ShardedJsonStateManager(state_file, multi_process=True)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=increment_counter, args=(state_file, 10)) for _ in range(3)]
+
+        # When
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # Then
+        assert all(worker.exitcode == 0 for worker in workers)
+        assert ShardedJsonStateManager(state_file, multi_process=True).get("counter") == 30
@@ -0,0 +1,66 @@
+import pytest
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.infrastructure.state.sqlite_state_manager import SqliteStateManager
+
+@pytest.fixture
+def manager(tmp_path: Path):
+    sm = SqliteStateManager(tmp_path / "state.db")
+    yield sm
+    sm.close()
+
+class TestSqliteStateManager:
+    def test_uses_wal_mode(self, manager: SqliteStateManager):
+        with manager.connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_get_and_set_persist(self, tmp_path: Path, manager: SqliteStateManager):
+        # When
+        manager.set("name", "Jules")
+        manager.close()
+
+        # Then
+        reopened = SqliteStateManager(tmp_path / "state.db")
+        assert reopened.get("name") == "Jules"
+        assert reopened.get("missing", "default_val") == "default_val"
+        reopened.close()
+
+    def test_transaction_success(self, manager: SqliteStateManager):
+        # When
+        with manager.transaction() as tx:
+            state = tx.get_state()
+            state["counter"] = 1
+            state["section"] = {"a": 1}
+
+        # Then
+        assert manager.get("counter") == 1
+        assert manager.get("section") == {"a": 1}
+
+    def test_transaction_rollback_on_exception(self, manager: SqliteStateManager):
+        # Given
+        manager.set("status", "initial")
+
+        # When
+        with pytest.raises(ValueError):
+            with manager.transaction() as tx:
+                tx.get_state()["status"] = "modified"
+                raise ValueError("Something went wrong")
+
+        # Then
+        assert manager.get("status") == "initial"
+
+    def test_connection_write_rolls_back_on_exception(self, manager: SqliteStateManager):
+        # Given
+        with manager.connection(write=True) as conn:
+            conn.execute("CREATE TABLE items (id TEXT PRIMARY KEY)")
+
+        # When
+        with pytest.raises(RuntimeError):
+            with manager.connection(write=True) as conn:
+                conn.execute("INSERT INTO items (id) VALUES ('a')")
+                raise RuntimeError("fail")
+
+        # Then
+        with manager.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
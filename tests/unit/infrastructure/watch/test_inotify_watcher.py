@@ -0,0 +1,90 @@
+import pytest
+import time
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.infrastructure.watch.inotify_watcher import InotifyWatcher, inotify_available
+
+pytestmark = pytest.mark.skipif(not inotify_available(), reason="inotify is only available on Linux")
+
+@pytest.fixture
+def watched_dir(tmp_path: Path) -> Path:
+    path = tmp_path / "logdata"
+    path.mkdir()
+    return path
+
+@pytest.fixture
+def watcher(watched_dir: Path):
+    watcher = InotifyWatcher(str(watched_dir))
+    yield watcher
+    watcher.close()
+
+def read_until(watcher: InotifyWatcher, predicate, timeout: float = 2.0):
+    """Collects events until `predicate` holds for what has been seen so far."""
+    created, overflowed = [], []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = watcher.read_events(0.1)
+        created += events.created
+        overflowed += events.overflowed
+        if predicate(created, overflowed):
+            break
+    return created, overflowed
+
+class TestInotifyWatcher:
+    def test_reports_new_and_moved_in_directories(self, watcher: InotifyWatcher, watched_dir: Path, tmp_path: Path):
+        # When
+        (watched_dir / "case_001").mkdir()
+        (watched_dir / "notes.txt").write_text("not a case")
+        (tmp_path / "staged").mkdir()
+        (tmp_path / "staged").rename(watched_dir / "case_002")
+
+        # Then
+        created, overflowed = read_until(watcher, lambda created, _: len(created) == 2)
+        assert created == [(str(watched_dir), "case_001"), (str(watched_dir), "case_002")]
+        assert not overflowed
+
+    def test_times_out_without_events(self, watcher: InotifyWatcher):
+        events = watcher.read_events(0.05)
+
+        assert events.created == []
+        assert not events.overflowed
+
+    def test_removed_directory_is_watched_again_once_recreated(self, watcher: InotifyWatcher, watched_dir: Path):
+        # When the watched directory is removed
+        watched_dir.rmdir()
+
+        # Then the caller is told to fall back to a listing
+        _, overflowed = read_until(watcher, lambda _, overflowed: overflowed)
+        assert overflowed == [str(watched_dir)]
+
+        # When it is recreated, the watch is re-added and reported as a gap
+        watched_dir.mkdir()
+        assert watcher.read_events(0.05).overflowed == [str(watched_dir)]
+        (watched_dir / "case_003").mkdir()
+        created, _ = read_until(watcher, lambda created, _: created)
+        assert created == [(str(watched_dir), "case_003")]
+
+    def test_missing_directory_is_not_an_error(self, tmp_path: Path):
+        watcher = InotifyWatcher(str(tmp_path / "missing"))
+        try:
+            assert not watcher.read_events(0.01).overflowed
+        finally:
+            watcher.close()
+
+    def test_watches_several_directories_at_once(self, tmp_path: Path):
+        rooms = [tmp_path / "room_a", tmp_path / "room_b"]
+        for room in rooms:
+            room.mkdir()
+        watcher = InotifyWatcher([str(room) for room in rooms])
+        try:
+            # When
+            (rooms[1] / "case_b1").mkdir()
+            (rooms[0] / "case_a1").mkdir()
+
+            # Then
+            created, overflowed = read_until(watcher, lambda created, _: len(created) == 2)
+            assert created == [(str(rooms[1]), "case_b1"), (str(rooms[0]), "case_a1")]
+            assert not overflowed
+        finally:
+            watcher.close()
@@ -0,0 +1,80 @@
+import pytest
+import os
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.services import case_manifest
+from mqi_communicator.services.case_manifest import ManifestBuilder, hash_file
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    path = tmp_path / "case_001"
+    (path / "beams").mkdir(parents=True)
+    (path / "beams" / "beam_1.log").write_bytes(b"a" * 100)
+    (path / "beams" / "beam_2.log").write_bytes(b"b" * 200)
+    (path / "plan.dcm").write_bytes(b"")
+    return path
+
+@pytest.fixture
+def builder():
+    builder = ManifestBuilder(max_workers=2)
+    yield builder
+    builder.close()
+
+class TestManifestBuilder:
+    def test_records_every_file(self, builder: ManifestBuilder, case_dir: Path):
+        # When
+        manifest = builder.build(str(case_dir))
+
+        # Then
+        assert list(manifest["files"]) == ["beams/beam_1.log", "beams/beam_2.log", "plan.dcm"]
+        assert manifest["file_count"] == 3
+        assert manifest["total_size"] == 300
+        entry = manifest["files"]["beams/beam_1.log"]
+        assert entry["size"] == 100
+        assert entry["mtime_ns"] == (case_dir / "beams" / "beam_1.log").stat().st_mtime_ns
+        assert entry["blake2b"] == hash_file(str(case_dir / "beams" / "beam_1.log"), 100)
+
+    def test_reuses_hashes_while_size_and_mtime_are_unchanged(self, builder: ManifestBuilder, case_dir: Path):
+        # Given
+        first = builder.build(str(case_dir))
+        assert builder.hashed_files == 3
+
+        # When one file changes
+        changed = case_dir / "beams" / "beam_2.log"
+        changed.write_bytes(b"c" * 200)
+        os.utime(changed, ns=(0, 1_000_000_000))
+        second = builder.build(str(case_dir))
+
+        # Then only that file is hashed again, and the overall digest changes
+        assert builder.hashed_files == 4
+        assert second["digest"] != first["digest"]
+        assert second["files"]["beams/beam_1.log"] == first["files"]["beams/beam_1.log"]
+
+    def test_previous_manifest_seeds_the_cache(self, builder: ManifestBuilder, case_dir: Path):
+        # Given a manifest built by another process
+        previous = ManifestBuilder().build(str(case_dir))
+
+        # When
+        manifest = builder.build(str(case_dir), previous=previous)
+
+        # Then
+        assert builder.hashed_files == 0
+        assert manifest["digest"] == previous["digest"]
+
+    def test_large_files_are_hashed_through_mmap(self, builder: ManifestBuilder, case_dir: Path, monkeypatch):
+        # Given
+        monkeypatch.setattr(case_manifest, "MMAP_THRESHOLD", 150)
+
+        # When
+        mmap_digest = builder.build(str(case_dir))["files"]["beams/beam_2.log"]["blake2b"]
+
+        # Then
+        monkeypatch.setattr(case_manifest, "MMAP_THRESHOLD", 1 << 30)
+        assert mmap_digest == hash_file(str(case_dir / "beams" / "beam_2.log"), 200)
+
+    def test_missing_directory_gives_an_empty_manifest(self, builder: ManifestBuilder, tmp_path: Path):
+        manifest = builder.build(str(tmp_path / "missing"))
+
+        assert manifest["files"] == {}
+        assert manifest["file_count"] == 0
@@ -0,0 +1,105 @@
+import pytest
+import os
+import threading
+import time
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.services.case_metadata import (
+    BeamCountExtractor, CaseDirectory, CaseMetadataPipeline, FileStatsExtractor, TreatmentDateExtractor
+)
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    path = tmp_path / "case_001"
+    for beam in ("Beam01", "Beam02", "Beam03"):
+        (path / beam).mkdir(parents=True)
+        (path / beam / "spots.log").write_bytes(b"Treatment log\nDate: 2024/03/07 10:15\n")
+    (path / "plan.dcm").write_bytes(b"x" * 50)
+    return path
+
+class TestExtractors:
+    def test_file_stats(self, case_dir: Path):
+        stats = FileStatsExtractor().extract(CaseDirectory("case_001", str(case_dir)))
+
+        assert stats["file_count"] == 4
+        assert stats["total_size"] == 50 + 3 * len(b"Treatment log\nDate: 2024/03/07 10:15\n")
+
+    def test_beam_count_from_names(self, case_dir: Path):
+        (case_dir / "Beam02" / "beam_2_dose.log").write_bytes(b"")
+
+        assert BeamCountExtractor().extract(CaseDirectory("case_001", str(case_dir))) == {"beam_count": 3}
+
+    def test_beam_count_falls_back_to_subdirectories(self, tmp_path: Path):
+        for field in ("G000", "G090"):
+            (tmp_path / field).mkdir()
+            (tmp_path / field / "data.bin").write_bytes(b"")
+        (tmp_path / "summary.txt").write_bytes(b"")
+
+        assert BeamCountExtractor().extract(CaseDirectory("c", str(tmp_path))) == {"beam_count": 2}
+        assert BeamCountExtractor().extract(CaseDirectory("c", str(tmp_path / "missing"))) == {}
+
+    def test_treatment_date_from_log_header(self, case_dir: Path):
+        extracted = TreatmentDateExtractor().extract(CaseDirectory("case_001", str(case_dir)))
+
+        assert extracted == {"treatment_date": "2024-03-07"}
+
+    def test_treatment_date_falls_back_to_oldest_file(self, tmp_path: Path):
+        (tmp_path / "a.bin").write_bytes(b"")
+        os.utime(tmp_path / "a.bin", (0, time.mktime((2023, 5, 1, 12, 0, 0, 0, 0, -1))))
+
+        extracted = TreatmentDateExtractor().extract(CaseDirectory("c", str(tmp_path)))
+
+        assert extracted == {"treatment_date": "2023-05-01"}
+
+class TestCaseMetadataPipeline:
+    def test_failing_extractor_is_skipped(self, case_dir: Path):
+        class Broken:
+            def extract(self, directory):
+                raise RuntimeError("unreadable header")
+
+        pipeline = CaseMetadataPipeline(extractors=[Broken(), FileStatsExtractor()])
+
+        assert pipeline.extract("case_001", str(case_dir))["file_count"] == 4
+
+    def test_background_results_are_taken_once(self, case_dir: Path):
+        pipeline = CaseMetadataPipeline(max_workers=2)
+        try:
+            future = pipeline.submit("case_001", str(case_dir))
+            assert pipeline.submit("case_001", str(case_dir)) is future
+            future.result(timeout=5)
+
+            completed = pipeline.take_completed()
+            assert completed["case_001"]["beam_count"] == 3
+            assert pipeline.take_completed() == {}
+        finally:
+            pipeline.close()
+
+    def test_result_waits_for_running_extraction(self, case_dir: Path):
+        pipeline = CaseMetadataPipeline()
+        try:
+            pipeline.submit("case_001", str(case_dir))
+
+            assert pipeline.result("case_001", str(case_dir))["treatment_date"] == "2024-03-07"
+            assert pipeline.take_completed() == {}
+        finally:
+            pipeline.close()
+
+    def test_poll_does_not_wait_for_running_extraction(self, case_dir: Path):
+        release = threading.Event()
+
+        class Slow:
+            def extract(self, directory):
+                release.wait(5)
+                return {"beam_count": 3}
+
+        pipeline = CaseMetadataPipeline(extractors=[Slow()])
+        try:
+            assert pipeline.poll("case_001", str(case_dir)) is None
+            release.set()
+            pipeline.submit("case_001", str(case_dir)).result(timeout=5)
+
+            assert pipeline.poll("case_001", str(case_dir)) == {"beam_count": 3}
+            assert pipeline.take_completed() == {"case_001": {"beam_count": 3}}
+        finally:
+            pipeline.close()
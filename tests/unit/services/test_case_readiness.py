@@ -0,0 +1,108 @@
+import pytest
+import os
+from pathlib import Path
+
+# Target for testing
+from mqi_communicator.services.case_readiness import CaseReadinessTracker
+from mqi_communicator.services.case_service import FileSystem
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class CountingFileSystem(FileSystem):
+    def __init__(self):
+        self.walks = 0
+
+    def fingerprint(self, path: str):
+        self.walks += 1
+        return super().fingerprint(path)
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+@pytest.fixture
+def file_system() -> CountingFileSystem:
+    return CountingFileSystem()
+
+def make_case(root: Path, case_id: str) -> Path:
+    path = root / case_id
+    (path / "beams").mkdir(parents=True)
+    (path / "beams" / "beam_1.log").write_bytes(b"x" * 10)
+    return path
+
+class TestCaseReadinessTracker:
+    def test_ready_after_quiet_period(self, tmp_path: Path, clock: FakeClock, file_system: CountingFileSystem):
+        # Given
+        case_dir = make_case(tmp_path, "case_001")
+        tracker = CaseReadinessTracker(file_system, str(tmp_path), quiet_period=30, clock=clock)
+        tracker.track(["case_001"])
+
+        # When / Then
+        assert tracker.poll() == []
+        clock.now += 10
+        assert tracker.poll() == []
+        # Still being written
+        clock.now += 25
+        (case_dir / "beams" / "beam_2.log").write_bytes(b"y")
+        assert tracker.poll() == []
+        clock.now += 29
+        assert tracker.poll() == []
+        clock.now += 1
+        assert tracker.poll() == ["case_001"]
+        assert tracker.pending() == []
+
+    def test_pending_cases_are_walked_once_per_quiet_period(self, tmp_path: Path, clock: FakeClock, file_system: CountingFileSystem):
+        # Given
+        for i in range(200):
+            make_case(tmp_path, f"case_{i:03d}")
+        tracker = CaseReadinessTracker(file_system, str(tmp_path), quiet_period=30, clock=clock)
+        tracker.track(os.listdir(tmp_path))
+
+        # When
+        tracker.poll()
+        for _ in range(10):
+            clock.now += 1
+            tracker.poll()
+
+        # Then
+        assert file_system.walks == 200
+        clock.now += 30
+        assert len(tracker.poll()) == 200
+
+    def test_marker_file_makes_a_case_ready_immediately(self, tmp_path: Path, clock: FakeClock, file_system: CountingFileSystem):
+        # Given
+        case_dir = make_case(tmp_path, "case_001")
+        tracker = CaseReadinessTracker(file_system, str(tmp_path), quiet_period=None, marker_file="COMPLETE", clock=clock)
+        tracker.track(["case_001"])
+        clock.now += 3600
+        assert tracker.poll() == []
+
+        # When
+        (case_dir / "COMPLETE").touch()
+
+        # Then
+        assert tracker.poll() == ["case_001"]
+        assert file_system.walks == 0
+
+    def test_vanished_directories_are_dropped(self, tmp_path: Path, clock: FakeClock, file_system: CountingFileSystem):
+        tracker = CaseReadinessTracker(file_system, str(tmp_path), quiet_period=30, clock=clock)
+        tracker.track(["case_gone"])
+
+        assert tracker.poll() == []
+        assert tracker.pending() == []
+
+class TestFingerprint:
+    def test_changes_when_files_change(self, tmp_path: Path):
+        case_dir = make_case(tmp_path, "case_001")
+        before = FileSystem().fingerprint(str(case_dir))
+        assert before[:2] == (1, 10)
+
+        (case_dir / "beams" / "beam_1.log").write_bytes(b"x" * 20)
+
+        assert FileSystem().fingerprint(str(case_dir))[:2] == (1, 20)
+        assert FileSystem().fingerprint(str(tmp_path / "missing")) is None
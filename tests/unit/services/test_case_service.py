@@ -1,13 +1,19 @@
 import pytest
+import threading
+import time
 from unittest.mock import MagicMock, patch
 from datetime import datetime
 
 # Domain models and repository interfaces
 from mqi_communicator.domain.models import Case, CaseStatus
 from mqi_communicator.domain.repositories.interfaces import ICaseRepository
+from mqi_communicator.domain.repositories.json_repositories import CaseRepository
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
 
 # Target for testing
-from mqi_communicator.services.case_service import CaseService
+from mqi_communicator.infrastructure.watch.interfaces import DirectoryEvents
+from mqi_communicator.services.case_metadata import CaseMetadataPipeline
+from mqi_communicator.services.case_service import CaseService, FileSystem, ScanRoot, interleave_by_root
 
 @pytest.fixture
 def mock_case_repo():
@@ -21,6 +27,8 @@ def mock_file_system():
     fs = MagicMock()
     # Simulate some directories found on the file system
     fs.list_directories.return_value = ["case_001", "case_002", "case_003_new"]
+    # No mtime: every scan lists the directory
+    fs.directory_mtime.return_value = None
     return fs
 
 @pytest.fixture
@@ -41,15 +49,13 @@ class TestCaseService:
         mock_file_system.list_directories.assert_called_once_with("/fake/scan/path")
         assert new_cases == ["case_003_new"]
 
-        # Check that the new case was saved to the repository
-        # We can inspect the calls to mock_case_repo.save
-        # This is a bit more complex, we'd check that save was called with a Case object
-        # with case_id = "case_003_new"
-        assert mock_case_repo.save.call_count == 1
-        saved_case_arg = mock_case_repo.save.call_args[0][0]
-        assert isinstance(saved_case_arg, Case)
-        assert saved_case_arg.case_id == "case_003_new"
-        assert saved_case_arg.status == CaseStatus.NEW
+        # Check that the new cases were saved to the repository in one batch
+        assert mock_case_repo.save_many.call_count == 1
+        saved_cases_arg = mock_case_repo.save_many.call_args[0][0]
+        assert len(saved_cases_arg) == 1
+        assert isinstance(saved_cases_arg[0], Case)
+        assert saved_cases_arg[0].case_id == "case_003_new"
+        assert saved_cases_arg[0].status == CaseStatus.NEW
 
     def test_scan_no_new_cases(self, case_service: CaseService, mock_case_repo, mock_file_system):
         # Given
@@ -62,6 +68,341 @@ class TestCaseService:
         # Then
         assert new_cases == []
         mock_case_repo.save.assert_not_called()
+        mock_case_repo.save_many.assert_not_called()
+
+    def test_scan_skips_listing_while_mtime_is_unchanged(self, case_service: CaseService, mock_case_repo, mock_file_system):
+        # Given
+        # An mtime well in the past, so it can be trusted as a watermark
+        mock_file_system.directory_mtime.return_value = 1_000_000_000
+
+        # When
+        first = case_service.scan_for_new_cases()
+        second = case_service.scan_for_new_cases()
+
+        # Then
+        assert first == ["case_003_new"]
+        assert second == []
+        mock_file_system.list_directories.assert_called_once()
+
+        # When the directory changes, it is listed again and diffed against the known IDs
+        mock_file_system.directory_mtime.return_value = 2_000_000_000
+        mock_file_system.list_directories.return_value = ["case_001", "case_002", "case_003_new", "case_004"]
+        assert case_service.scan_for_new_cases() == ["case_004"]
+        mock_case_repo.get_all_case_ids.assert_called_once()
+
+    def test_scan_does_not_trust_a_recent_mtime(self, case_service: CaseService, mock_file_system):
+        # Given
+        mock_file_system.directory_mtime.return_value = time.time_ns()
+
+        # When
+        case_service.scan_for_new_cases()
+        case_service.scan_for_new_cases()
+
+        # Then
+        assert mock_file_system.list_directories.call_count == 2
+
+    def test_case_registered_by_another_process_is_not_saved_again(self, tmp_path):
+        # Given
+        # Two services share the state; the first has loaded its known case IDs already
+        (tmp_path / "cases").mkdir()
+        repo = CaseRepository(JsonStateManager(tmp_path / "state.json"))
+        first = CaseService(repo, FileSystem(), str(tmp_path / "cases"))
+        second = CaseService(repo, FileSystem(), str(tmp_path / "cases"))
+        assert first.scan_for_new_cases() == []
+        (tmp_path / "cases" / "case_001").mkdir()
+        assert second.scan_for_new_cases() == ["case_001"]
+        second.update_case_status("case_001", CaseStatus.QUEUED)
+
+        # When
+        found = first.scan_for_new_cases()
+
+        # Then
+        assert found == []
+        assert repo.get("case_001").status == CaseStatus.QUEUED
+
+    def test_watch_without_watcher_returns_none(self, case_service: CaseService):
+        assert case_service.watch_for_new_cases(timeout=0.1) is None
+
+    def test_watch_registers_new_directories_once(self, mock_case_repo, mock_file_system):
+        # Given
+        watcher = MagicMock()
+        watcher.read_events.return_value = DirectoryEvents(created=[("/fake/scan/path", "case_002"), ("/fake/scan/path", "case_010")])
+        service = CaseService(mock_case_repo, mock_file_system, "/fake/scan/path", watcher=watcher)
+
+        # When
+        found = service.watch_for_new_cases(timeout=1.0)
+
+        # Then
+        assert found == ["case_010"]
+        assert [case.case_id for case in mock_case_repo.save_many.call_args[0][0]] == ["case_010"]
+        mock_file_system.list_directories.assert_not_called()
+
+        # A scan that lists the directory afterwards does not register it again
+        mock_file_system.list_directories.return_value = ["case_001", "case_002", "case_010"]
+        assert service.scan_for_new_cases() == []
+
+    def test_watch_overflow_falls_back_to_a_listing(self, mock_case_repo, mock_file_system):
+        # Given
+        watcher = MagicMock()
+        watcher.read_events.return_value = DirectoryEvents(overflowed=["/fake/scan/path"])
+        mock_file_system.directory_mtime.return_value = 1_000_000_000
+        service = CaseService(mock_case_repo, mock_file_system, "/fake/scan/path", watcher=watcher)
+        service.scan_for_new_cases()
+
+        # When
+        found = service.watch_for_new_cases(timeout=1.0)
+
+        # Then
+        # The unchanged mtime would normally skip the listing; an overflow forces it
+        assert found == []
+        assert mock_file_system.list_directories.call_count == 2
+
+    def test_scan_registers_cases_once_ready(self, mock_case_repo, mock_file_system):
+        # Given
+        readiness = MagicMock()
+        readiness.poll.side_effect = [[], ["case_003_new"]]
+        mock_file_system.directory_mtime.return_value = 1_000_000_000
+        service = CaseService(mock_case_repo, mock_file_system, "/fake/scan/path", readiness=readiness)
+
+        # When
+        first = service.scan_for_new_cases()
+        # The directory is unchanged, but pending cases are still polled
+        second = service.scan_for_new_cases()
+
+        # Then
+        assert first == []
+        assert second == ["case_003_new"]
+        readiness.track.assert_any_call(["case_003_new"], "/fake/scan/path")
+        saved = mock_case_repo.save_many.call_args[0][0]
+        assert [case.case_id for case in saved] == ["case_003_new"]
+
+    def test_scan_roots_are_listed_concurrently(self, mock_case_repo, mock_file_system):
+        # Given
+        # Room B's share hangs until room A has been listed
+        room_a_listed = threading.Event()
+
+        def list_directories(path):
+            if path == "/rooms/a":
+                room_a_listed.set()
+                return ["case_a1"]
+            assert room_a_listed.wait(timeout=5)
+            return ["case_b1"]
+
+        mock_file_system.list_directories.side_effect = list_directories
+        service = CaseService(
+            mock_case_repo, mock_file_system,
+            scan_roots=[ScanRoot("/rooms/b"), ScanRoot("/rooms/a")],
+        )
+
+        # When
+        found = service.scan_for_new_cases()
+
+        # Then
+        assert sorted(found) == ["case_a1", "case_b1"]
+        saved = {case.case_id: case.metadata["scan_root"] for case in mock_case_repo.save_many.call_args[0][0]}
+        assert saved == {"case_a1": "/rooms/a", "case_b1": "/rooms/b"}
+
+    def test_slow_scan_root_does_not_delay_the_others(self, mock_case_repo, mock_file_system):
+        # Given
+        release = threading.Event()
+
+        def list_directories(path):
+            if path == "/rooms/slow":
+                release.wait(timeout=5)
+                return ["case_s1"]
+            return ["case_f1"]
+
+        mock_file_system.list_directories.side_effect = list_directories
+        service = CaseService(
+            mock_case_repo, mock_file_system, scan_timeout=0.05,
+            scan_roots=[ScanRoot("/rooms/slow"), ScanRoot("/rooms/fast")],
+        )
+
+        # When
+        first = service.scan_for_new_cases()
+        release.set()
+        time.sleep(0.1)
+        second = service.scan_for_new_cases()
+
+        # Then
+        # The slow listing finishes in the background and is picked up by the next scan
+        assert first == ["case_f1"]
+        assert second == ["case_s1"]
+        assert mock_file_system.list_directories.call_args_list.count((("/rooms/slow",),)) == 1
+
+    def test_scan_root_interval_limits_listings(self, mock_case_repo, mock_file_system):
+        # Given
+        service = CaseService(
+            mock_case_repo, mock_file_system,
+            scan_roots=[ScanRoot("/rooms/a"), ScanRoot("/rooms/b", scan_interval=3600)],
+        )
+
+        # When
+        service.scan_for_new_cases()
+        service.scan_for_new_cases()
+
+        # Then
+        listed = [c[0][0] for c in mock_file_system.list_directories.call_args_list]
+        assert listed.count("/rooms/a") == 2
+        assert listed.count("/rooms/b") == 1
+
+    def test_same_case_in_two_roots_is_registered_once(self, mock_case_repo, mock_file_system):
+        # Given
+        mock_file_system.list_directories.return_value = ["case_x"]
+        service = CaseService(mock_case_repo, mock_file_system, scan_roots=[ScanRoot("/rooms/a"), ScanRoot("/rooms/b")])
+
+        # When
+        found = service.scan_for_new_cases()
+
+        # Then
+        assert found == ["case_x"]
+        assert len(mock_case_repo.save_many.call_args[0][0]) == 1
+
+    def test_watch_maps_events_to_their_scan_root(self, mock_case_repo, mock_file_system):
+        # Given
+        watcher = MagicMock()
+        watcher.read_events.return_value = DirectoryEvents(created=[("/rooms/b", "case_b2"), ("/elsewhere", "case_z")])
+        service = CaseService(
+            mock_case_repo, mock_file_system, watcher=watcher,
+            scan_roots=[ScanRoot("/rooms/a"), ScanRoot("/rooms/b")],
+        )
+
+        # When
+        found = service.watch_for_new_cases(timeout=1.0)
+
+        # Then
+        assert found == ["case_b2"]
+        assert mock_case_repo.save_many.call_args[0][0][0].metadata["scan_root"] == "/rooms/b"
+
+    def test_interleave_by_root_orders_by_priority_then_weight(self):
+        urgent = ScanRoot("/rooms/urgent", priority=5)
+        heavy = ScanRoot("/rooms/heavy", weight=2.0)
+        light = ScanRoot("/rooms/light")
+
+        merged = interleave_by_root({
+            light: ["l1", "l2"],
+            heavy: ["h1", "h2", "h3", "h4"],
+            urgent: ["u1"],
+        })
+
+        assert merged == ["u1", "h1", "l1", "h2", "h3", "l2", "h4"]
+
+    def test_scan_root_needs_a_positive_weight(self):
+        with pytest.raises(ValueError):
+            ScanRoot("/rooms/a", weight=0)
+
+    def test_build_manifest_stores_it_in_case_metadata(self, mock_case_repo, mock_file_system, tmp_path):
+        # Given
+        (tmp_path / "case001").mkdir()
+        (tmp_path / "case001" / "beam_1.log").write_bytes(b"data")
+        now = datetime.utcnow()
+        case = Case(case_id="case001", status=CaseStatus.NEW, beam_count=0, created_at=now, updated_at=now)
+        mock_case_repo.get.return_value = case
+        service = CaseService(mock_case_repo, mock_file_system, str(tmp_path))
+
+        # When
+        manifest = service.build_manifest("case001")
+
+        # Then
+        assert list(manifest["files"]) == ["beam_1.log"]
+        saved = mock_case_repo.save.call_args[0][0]
+        assert saved.metadata["manifest"] == manifest
+        assert service.get_manifest("case001") == manifest
+
+        # An unchanged directory does not save the case again
+        service.build_manifest("case001")
+        assert mock_case_repo.save.call_count == 1
+
+    def test_extracted_metadata_is_saved_to_the_case(self, mock_case_repo, mock_file_system, tmp_path):
+        # Given
+        (tmp_path / "case001" / "beam_1").mkdir(parents=True)
+        (tmp_path / "case001" / "beam_2").mkdir()
+        (tmp_path / "case001" / "beam_1" / "spots.log").write_bytes(b"2024-02-01")
+        pipeline = CaseMetadataPipeline()
+        service = CaseService(mock_case_repo, mock_file_system, str(tmp_path), metadata_pipeline=pipeline)
+
+        # When
+        registered = service.register_cases(["case001"])
+        pipeline.submit("case001", "").result(timeout=5)
+        mock_case_repo.get_many.return_value = registered
+        service.scan_for_new_cases()
+
+        # Then
+        # The next scan saves what was extracted in the background
+        saved = mock_case_repo.save_many.call_args_list[-2][0][0]
+        assert saved[0].beam_count == 1
+        assert saved[0].metadata["extracted"]["treatment_date"] == "2024-02-01"
+        pipeline.close()
+
+    def test_extract_metadata_runs_on_demand(self, mock_case_repo, mock_file_system, tmp_path):
+        # Given
+        (tmp_path / "case001").mkdir()
+        (tmp_path / "case001" / "Beam3.log").write_bytes(b"")
+        now = datetime.utcnow()
+        mock_case_repo.get.return_value = Case(
+            case_id="case001", status=CaseStatus.NEW, beam_count=0, created_at=now, updated_at=now
+        )
+        service = CaseService(mock_case_repo, mock_file_system, str(tmp_path))
+
+        # When
+        extracted = service.extract_metadata("case001")
+
+        # Then
+        assert extracted["beam_count"] == 1
+        assert mock_case_repo.save.call_args[0][0].beam_count == 1
+
+    def test_beam_counts_do_not_wait_or_save(self, mock_case_repo, mock_file_system, tmp_path):
+        # Given
+        now = datetime.utcnow()
+        counted = Case(
+            case_id="counted", status=CaseStatus.NEW, beam_count=4, created_at=now, updated_at=now,
+            metadata={"extracted": {"beam_count": 4}},
+        )
+        pending = Case(case_id="pending", status=CaseStatus.NEW, beam_count=0, created_at=now, updated_at=now)
+        mock_case_repo.get_many.return_value = [counted, pending]
+        pipeline = MagicMock(spec=CaseMetadataPipeline)
+        pipeline.poll.return_value = None
+        service = CaseService(mock_case_repo, mock_file_system, str(tmp_path), metadata_pipeline=pipeline)
+
+        # When
+        counts = service.beam_counts(["counted", "pending"])
+
+        # Then
+        assert counts == {"counted": 4, "pending": None}
+        pipeline.poll.assert_called_once_with("pending", str(tmp_path / "pending"))
+        pipeline.result.assert_not_called()
+        pipeline.poll.return_value = {"beam_count": 2}
+        assert service.beam_counts(["pending"])["pending"] == 2
+        mock_case_repo.save.assert_not_called()
+        mock_case_repo.save_many.assert_not_called()
+
+    def test_register_cases_saves_one_batch(self, case_service: CaseService, mock_case_repo):
+        # When
+        cases = case_service.register_cases(["a", "b", "c"])
+
+        # Then
+        assert [case.case_id for case in cases] == ["a", "b", "c"]
+        mock_case_repo.save_many.assert_called_once_with(cases)
+        mock_case_repo.save.assert_not_called()
+
+    def test_update_case_statuses(self, case_service: CaseService, mock_case_repo):
+        # Given
+        now = datetime.utcnow()
+        cases = [
+            Case(case_id=case_id, status=CaseStatus.NEW, beam_count=0, created_at=now, updated_at=now)
+            for case_id in ("case001", "case002")
+        ]
+        mock_case_repo.get_many.return_value = cases
+
+        # When
+        case_service.update_case_statuses({
+            "case001": CaseStatus.QUEUED, "case002": CaseStatus.FAILED, "missing": CaseStatus.QUEUED
+        })
+
+        # Then
+        mock_case_repo.get_many.assert_called_once_with(["case001", "case002", "missing"])
+        saved = mock_case_repo.save_many.call_args[0][0]
+        assert [case.status for case in saved] == [CaseStatus.QUEUED, CaseStatus.FAILED]
 
     def test_update_case_status(self, case_service: CaseService, mock_case_repo):
         # Given
@@ -93,3 +434,16 @@ class TestCaseService:
         # This is a design decision. For now, we'll just check that save is not called.
         case_service.update_case_status("non_existent", CaseStatus.QUEUED)
         mock_case_repo.save.assert_not_called()
+
+class TestFileSystem:
+    def test_lists_only_directories(self, tmp_path):
+        (tmp_path / "case_a").mkdir()
+        (tmp_path / "case_b").mkdir()
+        (tmp_path / "notes.txt").write_text("x")
+
+        assert sorted(FileSystem().list_directories(str(tmp_path))) == ["case_a", "case_b"]
+        assert FileSystem().list_directories(str(tmp_path / "missing")) == []
+
+    def test_directory_mtime(self, tmp_path):
+        assert FileSystem().directory_mtime(str(tmp_path)) == tmp_path.stat().st_mtime_ns
+        assert FileSystem().directory_mtime(str(tmp_path / "missing")) is None
@@ -0,0 +1,74 @@
+from mqi_communicator.domain.interfaces import GPUStatus
+from mqi_communicator.services.gpu_placement import GpuSlot, place_gpus
+
+
+def idle(gpu_id: int, memory_total: float = 16000.0) -> GpuSlot:
+    return GpuSlot(gpu_id=gpu_id, status=GPUStatus(id=gpu_id, load=0.0, memory_usage=0.0, memory_total=memory_total))
+
+
+class TestPlaceGpus:
+    def test_small_placements_share_a_partly_used_gpu(self):
+        # Given
+        slots = [idle(0), idle(1)]
+        slots[1].share = 0.5
+
+        # When / Then
+        assert place_gpus(slots, 1, share=0.25) == [1]
+
+    def test_whole_gpu_needs_an_unshared_one(self):
+        slots = [GpuSlot(gpu_id=0, share=0.25), GpuSlot(gpu_id=1, share=1.0)]
+
+        assert place_gpus(slots, 1) == []
+        assert place_gpus(slots, 1, share=0.75) == [0]
+
+    def test_gpu_busy_outside_our_control_is_avoided(self):
+        # Given
+        # GPU 0 already ran at 80% when we took a quarter of it; GPU 2 is not ours at all
+        slots = [idle(0), idle(1), idle(2)]
+        slots[0].share = 0.25
+        slots[0].status.load = 90.0
+        slots[0].base_load = 80.0
+        slots[1].share = 0.25
+        slots[1].status.load = 25.0
+        slots[2].status.load = 50.0
+
+        # When / Then
+        assert place_gpus(slots, 2, share=0.25, busy_load_percent=30.0) == []
+        assert place_gpus(slots, 1, share=0.25, busy_load_percent=30.0) == [1]
+
+    def test_gpu_we_share_at_full_utilization_takes_more_of_our_work(self):
+        # Given
+        # A quarter share of GPU 0 drives it at 100%; it was idle before
+        slots = [idle(0), idle(1)]
+        slots[0].share = 0.25
+        slots[0].status.load = 100.0
+        slots[0].base_load = 0.0
+
+        # When / Then
+        assert place_gpus(slots, 1, share=0.25, busy_load_percent=30.0) == [0]
+
+    def test_placement_packs_by_memory(self):
+        # Given
+        # GPU 0 has 4 GB free, GPU 1 has 10 GB free; neither is shared
+        slots = [idle(0), idle(1)]
+        slots[0].status.memory_usage = 12000.0
+        slots[1].status.memory_usage = 6000.0
+
+        # When / Then
+        assert place_gpus(slots, 1, share=0.5, memory_mb=3000.0) == [0]
+        assert place_gpus(slots, 1, share=0.5, memory_mb=5000.0) == [1]
+        assert place_gpus(slots, 1, share=0.5, memory_mb=11000.0) == []
+
+    def test_reserved_memory_counts_before_it_is_used(self):
+        # Given
+        slot = idle(0)
+        slot.share = 0.5
+        slot.memory_mb = 10000.0
+
+        # When / Then
+        assert place_gpus([slot], 1, share=0.5, memory_mb=8000.0) == []
+        assert place_gpus([slot], 1, share=0.5, memory_mb=6000.0) == [0]
+
+    def test_several_gpus_are_distinct(self):
+        assert place_gpus([GpuSlot(gpu_id=i) for i in range(4)], 3) == [0, 1, 2]
+        assert place_gpus([GpuSlot(gpu_id=i) for i in range(2)], 3) == []
@@ -47,6 +47,17 @@ class TestJobService:
         # Verify that the new job was saved
         mock_job_repo.save.assert_called_once_with(new_job)
 
+    def test_create_jobs_saves_one_batch(self, job_service: JobService, mock_job_repo):
+        # When
+        jobs = job_service.create_jobs(["case001", "case002"], priority=2)
+
+        # Then
+        assert [job.case_id for job in jobs] == ["case001", "case002"]
+        assert all(job.status == JobStatus.PENDING and job.priority == 2 for job in jobs)
+        assert len({job.job_id for job in jobs}) == 2
+        mock_job_repo.save_many.assert_called_once_with(jobs)
+        mock_job_repo.save.assert_not_called()
+
     def test_allocate_resources_success(self, job_service: JobService, mock_resource_service):
         # Given
         job = Job(
@@ -115,3 +126,32 @@ class TestJobService:
         assert job.status == JobStatus.COMPLETED
         assert job.completed_at is not None
         mock_job_repo.save.assert_called_once_with(job)
+
+    def test_set_priority_saves_the_job(self, job_service: JobService, mock_job_repo):
+        # Given
+        job = Job(job_id="job1", case_id="case1", status=JobStatus.PENDING, gpu_allocation=[], priority=1, created_at=datetime.utcnow())
+        mock_job_repo.get.return_value = job
+
+        # When
+        job_service.set_priority("job1", 4)
+        job_service.set_priority("job1", 4)
+
+        # Then
+        assert job.priority == 4
+        mock_job_repo.save.assert_called_once_with(job)
+
+    def test_finish_jobs_saves_final_statuses_together(self, job_service: JobService, mock_job_repo, mock_resource_service):
+        # Given
+        done = Job(job_id="job1", case_id="case1", status=JobStatus.PENDING, gpu_allocation=[], priority=1, created_at=datetime.utcnow())
+        failed = Job(job_id="job2", case_id="case2", status=JobStatus.RUNNING, gpu_allocation=[3], priority=1, created_at=datetime.utcnow())
+        jobs = {job.job_id: job for job in (done, failed)}
+        mock_job_repo.get.side_effect = jobs.get
+
+        # When
+        job_service.finish_jobs({"job1": JobStatus.COMPLETED, "job2": JobStatus.FAILED, "gone": JobStatus.COMPLETED})
+
+        # Then
+        assert done.status == JobStatus.COMPLETED and done.completed_at is not None
+        assert failed.status == JobStatus.FAILED and failed.gpu_allocation == []
+        mock_resource_service.release_gpus.assert_called_once_with([3])
+        mock_job_repo.save_many.assert_called_once_with([done, failed])
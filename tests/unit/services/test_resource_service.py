@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import MagicMock, patch
 
+from mqi_communicator.domain.interfaces import GPUStatus
+
 # Target for testing
 from mqi_communicator.services.resource_service import ResourceService
 
@@ -77,3 +79,98 @@ class TestResourceService:
 
         # Then
         assert result is False
+
+    def test_available_gpu_count(self):
+        # Given
+        repo = MagicMock()
+        repo.get_allocated_gpus.return_value = [1, 3]
+        service = ResourceService(repo, total_gpu_count=4, min_disk_space_gb=100)
+
+        # When / Then
+        assert service.available_gpu_count() == 2
+
+class TestGpuPlacement:
+    @pytest.fixture
+    def repo(self):
+        allocated = []
+        repo = MagicMock()
+        repo.get_allocated_gpus.side_effect = lambda: list(allocated)
+        repo.set_allocated_gpus.side_effect = lambda gpu_ids: allocated.__setitem__(slice(None), gpu_ids)
+        return repo
+
+    @pytest.fixture
+    def monitor(self):
+        monitor = MagicMock()
+        monitor.get_gpu_status.return_value = [
+            GPUStatus(id=0, load=0.0, memory_usage=0.0, memory_total=16000.0),
+            GPUStatus(id=1, load=0.0, memory_usage=0.0, memory_total=16000.0),
+        ]
+        return monitor
+
+    def test_fractional_allocations_share_a_gpu(self, repo, monitor):
+        # Given
+        service = ResourceService(repo, total_gpu_count=2, min_disk_space_gb=0, system_monitor=monitor)
+
+        # When
+        placements = [service.allocate_gpus(1, share=0.25) for _ in range(5)]
+
+        # Then
+        assert placements == [[0], [0], [0], [0], [1]]
+        assert repo.get_allocated_gpus() == [0, 1]
+        for gpu_ids in placements:
+            service.release_gpus(gpu_ids, share=0.25)
+        assert repo.get_allocated_gpus() == []
+
+    def test_busy_gpu_is_skipped_and_telemetry_is_cached(self, repo, monitor):
+        # Given
+        monitor.get_gpu_status.return_value[0].load = 95.0
+        clock = MagicMock(return_value=0.0)
+        service = ResourceService(
+            repo, total_gpu_count=2, min_disk_space_gb=0, system_monitor=monitor, telemetry_ttl=5.0, clock=clock
+        )
+
+        # When / Then
+        assert service.allocate_gpus(1) == [1]
+        assert not service.can_allocate_gpus(1)
+        monitor.get_gpu_status.return_value[0].load = 0.0
+        clock.return_value = 6.0
+        assert service.allocate_gpus(1) == [0]
+        assert monitor.get_gpu_status.call_count == 2
+
+    def test_beams_pack_onto_a_gpu_they_run_at_full_load(self, repo, monitor):
+        # Given
+        service = ResourceService(repo, total_gpu_count=2, min_disk_space_gb=0, system_monitor=monitor, telemetry_ttl=0.0)
+        assert service.allocate_gpus(1, share=0.25) == [0]
+
+        # When
+        # Our quarter share now keeps GPU 0 fully busy; GPU 1 is busy with someone else's work
+        monitor.get_gpu_status.return_value[0].load = 100.0
+        monitor.get_gpu_status.return_value[1].load = 60.0
+
+        # Then
+        assert service.allocate_gpus(1, share=0.25) == [0]
+        service.release_gpus([0], share=0.25)
+        service.release_gpus([0], share=0.25)
+        assert not service.can_allocate_gpus(1, share=0.25)
+
+    def test_memory_footprint_limits_placement(self, repo, monitor):
+        service = ResourceService(repo, total_gpu_count=2, min_disk_space_gb=0, system_monitor=monitor)
+
+        assert service.allocate_gpus(1, memory_mb=10000.0, share=0.5) == [0]
+        assert service.allocate_gpus(1, memory_mb=10000.0, share=0.5) == [1]
+        assert service.allocate_gpus(1, memory_mb=6000.0, share=0.5) == [0]
+        assert not service.can_allocate_gpus(1, memory_mb=7000.0, share=0.5)
+        assert service.can_allocate_gpus(1, memory_mb=6000.0, share=0.5)
+
+    def test_allocations_found_on_startup_count_until_released(self, repo):
+        # Given
+        repo.set_allocated_gpus([1])
+        service = ResourceService(repo, total_gpu_count=2, min_disk_space_gb=0)
+
+        # When / Then
+        # GPU 1 is taken whole, since the share it was allocated with is unknown
+        assert service.allocate_gpus(1, share=0.5) == [0]
+        assert service.allocate_gpus(1, share=0.5) == [0]
+        assert not service.can_allocate_gpus(1, share=0.5)
+        service.release_gpus([1], share=0.5)
+        assert service.allocate_gpus(1) == [1]
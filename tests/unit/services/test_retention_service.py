@@ -0,0 +1,113 @@
+import pytest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from mqi_communicator.domain.models import Case, CaseStatus, Job, JobStatus
+from mqi_communicator.domain.repositories.archive import CaseArchive
+from mqi_communicator.domain.repositories.json_repositories import CaseRepository, JobRepository
+from mqi_communicator.domain.task_scheduler import TaskScheduler
+from mqi_communicator.infrastructure.state.json_state_manager import JsonStateManager
+from mqi_communicator.services.case_service import CaseService, FileSystem
+from mqi_communicator.services.interfaces import IResourceService
+from mqi_communicator.services.job_service import JobService
+
+# Target for testing
+from mqi_communicator.services.retention_service import RetentionService
+
+@pytest.fixture
+def repositories(tmp_path: Path):
+    state_manager = JsonStateManager(tmp_path / "state.json")
+    return CaseRepository(state_manager), JobRepository(state_manager)
+
+def add_case(case_repo, job_repo, case_id: str, status: CaseStatus, age_days: int, job_status=JobStatus.COMPLETED):
+    updated = datetime.utcnow() - timedelta(days=age_days)
+    case_repo.save(Case(case_id=case_id, status=status, beam_count=1, created_at=updated, updated_at=updated))
+    job_repo.save(Job(
+        job_id=f"{case_id}-job", case_id=case_id, status=job_status,
+        gpu_allocation=[], priority=1, created_at=updated
+    ))
+
+class TestRetentionService:
+    def test_archives_only_old_finished_cases(self, repositories, tmp_path: Path):
+        # Given
+        case_repo, job_repo = repositories
+        add_case(case_repo, job_repo, "old_done", CaseStatus.COMPLETED, 40)
+        add_case(case_repo, job_repo, "old_failed", CaseStatus.FAILED, 40, JobStatus.FAILED)
+        add_case(case_repo, job_repo, "recent_done", CaseStatus.COMPLETED, 1)
+        add_case(case_repo, job_repo, "old_processing", CaseStatus.PROCESSING, 40, JobStatus.RUNNING)
+        add_case(case_repo, job_repo, "old_with_running_job", CaseStatus.COMPLETED, 40, JobStatus.RUNNING)
+        archive = CaseArchive(tmp_path / "archive")
+        service = RetentionService(case_repo, job_repo, archive, max_age=timedelta(days=30))
+
+        # When
+        archived = service.archive_expired()
+
+        # Then
+        assert sorted(archived) == ["old_done", "old_failed"]
+        assert sorted(case_repo.get_all_case_ids()) == ["old_processing", "old_with_running_job", "recent_done"]
+        assert job_repo.find_by_case_id("old_done") == []
+        record = service.get_archived_case("old_done")
+        assert record.case.status is CaseStatus.COMPLETED
+        assert [job.job_id for job in record.jobs] == ["old_done-job"]
+
+    def test_batch_size_limits_each_run(self, repositories, tmp_path: Path):
+        # Given
+        case_repo, job_repo = repositories
+        for i in range(5):
+            add_case(case_repo, job_repo, f"case{i}", CaseStatus.COMPLETED, 40 + i)
+        service = RetentionService(
+            case_repo, job_repo, CaseArchive(tmp_path / "archive"), max_age=timedelta(days=30), batch_size=2
+        )
+
+        # When / Then
+        assert service.archive_expired() == ["case4", "case3"]
+        assert len(service.archive_expired()) == 2
+        assert service.archive_expired() == ["case0"]
+        assert service.archive_expired() == []
+
+    def test_archived_case_is_not_found_again(self, repositories, tmp_path: Path):
+        # Given
+        case_repo, job_repo = repositories
+        scan_root = tmp_path / "cases"
+        (scan_root / "caseA").mkdir(parents=True)
+        archive = CaseArchive(tmp_path / "archive")
+        assert CaseService(case_repo, FileSystem(), str(scan_root), archive=archive).scan_for_new_cases() == ["caseA"]
+        case = case_repo.get("caseA")
+        case.status = CaseStatus.COMPLETED
+        case.updated_at = datetime.utcnow() - timedelta(days=40)
+        case_repo.save(case)
+        RetentionService(case_repo, job_repo, archive, max_age=timedelta(days=30)).archive_expired()
+
+        # When
+        rescanned = CaseService(case_repo, FileSystem(), str(scan_root), archive=archive).scan_for_new_cases()
+
+        # Then
+        assert rescanned == []
+        assert case_repo.get("caseA") is None
+
+    def test_case_processed_end_to_end_is_archived(self, repositories, tmp_path: Path):
+        # Given
+        case_repo, job_repo = repositories
+        scan_root = tmp_path / "cases"
+        (scan_root / "caseA").mkdir(parents=True)
+        archive = CaseArchive(tmp_path / "archive")
+        case_service = CaseService(case_repo, FileSystem(), str(scan_root), archive=archive)
+        scheduler = TaskScheduler(case_service, JobService(job_repo, MagicMock(spec=IResourceService)))
+        scheduler.schedule_cases(case_service.scan_for_new_cases())
+        task = scheduler.get_next_task()
+        while task is not None:
+            scheduler.complete_task(task.task_id)
+            task = scheduler.get_next_task()
+        assert case_repo.get("caseA").status is CaseStatus.COMPLETED
+        assert [job.status for job in job_repo.find_by_case_id("caseA")] == [JobStatus.COMPLETED]
+        case = case_repo.get("caseA")
+        case.updated_at = datetime.utcnow() - timedelta(days=40)
+        case_repo.save(case)
+
+        # When
+        archived = RetentionService(case_repo, job_repo, archive, max_age=timedelta(days=30)).archive_expired()
+
+        # Then
+        assert archived == ["caseA"]
+        assert case_repo.get("caseA") is None